@@ -0,0 +1,24 @@
+"""Benchmarks for face, run against synthetic command trees.
+
+Regressions in parsing, preparation, dispatch, and help rendering
+tend to be invisible until a big enough CLI comes along. This package
+generates synthetic :class:`~face.Command` trees of configurable size
+(see :mod:`bench.synth`), times each phase of a command's lifecycle,
+and compares the results against a stored baseline.
+
+Run from the repository root, no network or extra dependencies
+required::
+
+  python -m bench run --depth 3 --fanout 4 --output results.json
+  python -m bench run --baseline results.json --threshold 0.1
+
+The second command exits nonzero if any phase got more than 10%
+slower than the baseline.
+
+Synthetic trees only go so far. Runs of a real command, recorded with
+its ``--record`` flag (see :mod:`face.recording`), can be replayed
+against it, with handlers stubbed out, to get latency percentiles for
+parsing and dispatch on a realistic workload::
+
+  python -m bench replay --target mytool.cli:get_command --repeat 10 runs.jsonl
+"""
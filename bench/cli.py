@@ -0,0 +1,222 @@
+"""The benchmark runner. Times each phase of a synthetic command's
+lifecycle with :mod:`timeit`, records the results as JSON, and
+compares them against a baseline.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import timeit
+import platform
+import tempfile
+
+from face import Command, ListParam, UsageError, ERROR, echo, echo_table, StoutHelpFormatter
+from face.helpers import _wrap_text
+from face.spec import get_spec, load_spec
+from face.codegen import compile_parser
+
+from bench import synth
+from bench import replay as replay_mod
+
+
+PHASES = ('construct', 'prepare', 'parse', 'parse_flagfile', 'run', 'help', 'wrap', 'load_spec', 'parse_compiled', 'table')
+DEFAULT_THRESHOLD = 0.1
+
+
+def _time_func(func, repeat):
+    "Returns the best and median seconds per call of *func*"
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {'best': times[0], 'median': times[len(times) // 2], 'number': number, 'repeat': repeat}
+
+
+def run_benchmarks(depth=3, fanout=4, flag_count=10, mw_count=2, flagfile_lines=100,
+                   repeat=5, phases=PHASES):
+    """Time each of *phases* against a synthetic command tree of the
+    given shape. Returns a JSON-serializable dict of parameters,
+    environment info, and per-phase timings.
+    """
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        raise ValueError(f'unknown phases {sorted(unknown)!r}, expected some of {PHASES!r}')
+    shape = {'depth': depth, 'fanout': fanout, 'flag_count': flag_count, 'mw_count': mw_count}
+    cmd = synth.make_command(**shape)
+    cmd.prepare()
+    argv = synth.make_argv(**shape)
+    leaf_path = synth.get_leaf_path(depth, fanout)
+    formatter = StoutHelpFormatter(width=100)
+    docs = synth.make_docs()
+    rows = synth.make_rows()
+    spec = get_spec(cmd)
+    compiled_cmd = synth.make_command(**shape)
+    compile_parser(compiled_cmd)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ff_path = os.path.join(tmp_dir, 'bench.flags')
+        with open(ff_path, 'w') as f:
+            f.write(synth.make_flagfile_text(flagfile_lines))
+        ff_argv = synth.make_argv(flagfile_path=ff_path, **shape)
+
+        def _help():
+            formatter.get_help_text(cmd)
+            formatter.get_help_text(cmd, subcmds=leaf_path)
+
+        def _wrap():
+            for doc in docs:
+                _wrap_text(doc, 60)
+
+        def _prepare():
+            # time a cold prepare, not a lookup of the already-prepared paths
+            cmd._reset_prepared()
+            cmd._chain_cache.clear()
+            cmd.prepare()
+
+        def _table():
+            echo_table(rows, file=io.StringIO(), width=100)
+
+        phase_funcs = {'construct': lambda: synth.make_command(**shape),
+                       'prepare': _prepare,
+                       'parse': lambda: cmd.parse(argv),
+                       'parse_flagfile': lambda: cmd.parse(ff_argv),
+                       'run': lambda: cmd.run(argv),
+                       'help': _help,
+                       'wrap': _wrap,
+                       'load_spec': lambda: load_spec(spec),
+                       'parse_compiled': lambda: compiled_cmd.parse(argv),
+                       'table': _table}
+        timings = {}
+        for phase in phases:
+            timings[phase] = _time_func(phase_funcs[phase], repeat=repeat)
+
+    return {'params': dict(shape, flagfile_lines=flagfile_lines),
+            'env': {'python': platform.python_version(),
+                    'implementation': platform.python_implementation(),
+                    'platform': platform.platform(),
+                    'timestamp': time.time()},
+            'timings': timings}
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare the best timings of *results* against *baseline*, both
+    dicts as returned by :func:`run_benchmarks`. Returns a list of
+    (phase, baseline_secs, current_secs, ratio, is_regression) tuples
+    for phases present in both.
+    """
+    ret = []
+    base_timings = baseline['timings']
+    for phase, timing in results['timings'].items():
+        if phase not in base_timings:
+            continue
+        base_secs, cur_secs = base_timings[phase]['best'], timing['best']
+        ratio = cur_secs / base_secs if base_secs else float('inf')
+        ret.append((phase, base_secs, cur_secs, ratio, ratio > 1 + threshold))
+    return ret
+
+
+def _format_secs(secs):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if secs * scale >= 1:
+            return f'{secs * scale:.3f}{unit}'
+    return f'{secs * 1e9:.1f}ns'
+
+
+def run(depth, fanout, flags, middlewares, flagfile_lines, repeat, phases,
+        output, baseline, threshold):
+    "Run benchmarks on a synthetic command tree"
+    results = run_benchmarks(depth=depth, fanout=fanout, flag_count=flags,
+                             mw_count=middlewares, flagfile_lines=flagfile_lines,
+                             repeat=repeat, phases=phases or PHASES)
+    for phase, timing in results['timings'].items():
+        echo(f"{phase:<16}{_format_secs(timing['best']):>12} best"
+             f"{_format_secs(timing['median']):>12} median")
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if not baseline:
+        return
+    try:
+        with open(baseline) as f:
+            baseline_results = json.load(f)
+    except (OSError, ValueError) as e:
+        raise UsageError(f'could not load baseline {baseline!r}: {e}')
+    if baseline_results['params'] != results['params']:
+        echo.err(f"warning: baseline params differ: {baseline_results['params']!r}")
+
+    echo('')
+    regressions = []
+    for phase, base_secs, cur_secs, ratio, is_regression in compare_results(
+            results, baseline_results, threshold):
+        mark = '  REGRESSION' if is_regression else ''
+        echo(f'{phase:<16}{_format_secs(base_secs):>12} -> {_format_secs(cur_secs):>12}'
+             f'  ({ratio:.2f}x){mark}')
+        if is_regression:
+            regressions.append(phase)
+    if regressions:
+        raise UsageError(f"{len(regressions)} phase(s) slower than baseline by more than"
+                         f" {threshold:.0%}: {', '.join(regressions)}")
+    return
+
+
+def replay(posargs_, target, repeat, live, output):
+    "Replay runs recorded with --record against a command, reporting latency percentiles"
+    cmd = replay_mod.load_target(target)
+    records = []
+    for path in posargs_:
+        try:
+            records.extend(replay_mod.load_records(path))
+        except (OSError, ValueError) as e:
+            raise UsageError(f'could not load records from {path!r}: {e}')
+    if not records:
+        raise UsageError('no records to replay')
+    results = replay_mod.replay_records(cmd, records, repeat=repeat, dry=not live)
+    summary = replay_mod.summarize_timings(results['timings'])
+    echo(f"replayed {len(records)} records x {repeat}, {results['error_count']} errors,"
+         f" {results['changed_flagfile_count']} with changed flagfiles")
+    for phase, phase_summary in summary.items():
+        stats = ''.join(f'{_format_secs(v):>12} {k}' for k, v in phase_summary.items() if k != 'count')
+        echo(f'{phase:<16}{stats}')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(dict(results, summary=summary), f, indent=2, sort_keys=True)
+    return
+
+
+def get_command():
+    cmd = Command(None, 'bench', doc=__doc__)
+    run_cmd = Command(run)
+    run_cmd.add('--depth', parse_as=int, missing=3, doc='levels of subcommands')
+    run_cmd.add('--fanout', parse_as=int, missing=4, doc='subcommands per non-leaf command')
+    run_cmd.add('--flags', parse_as=int, missing=10, doc='flags added at each level')
+    run_cmd.add('--middlewares', parse_as=int, missing=2, doc='middlewares on the root command')
+    run_cmd.add('--flagfile-lines', parse_as=int, missing=100, doc='lines in the benchmarked flagfile')
+    run_cmd.add('--repeat', parse_as=int, missing=5, doc='timing repetitions per phase')
+    run_cmd.add('--phases', parse_as=ListParam(strip=True),
+                doc=f"comma-separated phases to run, from: {', '.join(PHASES)}")
+    run_cmd.add('--output', doc='path to write JSON results to')
+    run_cmd.add('--baseline', doc='path of JSON results to compare against')
+    run_cmd.add('--threshold', parse_as=float, missing=DEFAULT_THRESHOLD,
+                doc='slowdown ratio above which a phase is considered a regression')
+    cmd.add(run_cmd)
+
+    replay_cmd = Command(replay, posargs={'min_count': 1, 'display': 'record_file'})
+    replay_cmd.add('--target', missing=ERROR,
+                   doc='the command to replay against, as "package.module:name"')
+    replay_cmd.add('--repeat', parse_as=int, missing=1, doc='times to replay each record')
+    replay_cmd.add('--live', parse_as=True,
+                   doc='call the real handlers, instead of stubs which do nothing')
+    replay_cmd.add('--output', doc='path to write JSON timings and summary to')
+    cmd.add(replay_cmd)
+    return cmd
+
+
+def main(argv=None):
+    cmd = get_command()
+    try:
+        cmd.run(argv)
+    except ValueError as ve:
+        echo.err(f'error: {ve}')
+        return 1
+    return 0
@@ -0,0 +1,95 @@
+"""Replays runs recorded with face's ``--record`` flag (see
+:mod:`face.recording`) against a Command, and reports per-phase
+latency percentiles. Where :mod:`bench.synth` trees show how face
+scales, replays show how it performs on a real workload.
+"""
+
+import io
+import importlib
+from contextlib import redirect_stdout
+
+from face import Command
+from face.recording import Recorder, PHASES, stub_handlers, get_file_digest, load_records
+
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+def load_target(target):
+    """Load a Command from a *target* string like ``"package.module:name"``,
+    where *name* is a Command, or a function taking no arguments which
+    returns one.
+    """
+    module_name, sep, attr = target.partition(':')
+    if not sep or not module_name or not attr:
+        raise ValueError(f'expected target like "package.module:name", not: {target!r}')
+    ret = getattr(importlib.import_module(module_name), attr)
+    if not isinstance(ret, Command) and callable(ret):
+        ret = ret()
+    if not isinstance(ret, Command):
+        raise ValueError(f'expected {target!r} to be a Command, or return one, not: {ret!r}')
+    return ret
+
+
+def get_percentile(sorted_values, percentile):
+    "Nearest-rank percentile of a sorted, non-empty list of values"
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def replay_records(cmd, records, repeat=1, dry=True):
+    """Rerun the argv of each of *records* against *cmd*, *repeat*
+    times. With *dry* set, handlers are replaced by stubs, so only
+    parsing and the middleware chain run. Output and error messages
+    are discarded.
+
+    Returns a dict with per-phase lists of timings in seconds
+    (``'timings'``), the number of runs which exited with an error
+    (``'error_count'``), and the number of records whose flagfiles
+    have changed since recording (``'changed_flagfile_count'``).
+    """
+    timings = {phase: [] for phase in PHASES}
+    error_count = 0
+    changed_flagfile_count = sum(1 for record in records
+                                 if any(get_file_digest(ff['path']) != ff['sha256']
+                                        for ff in record.get('flagfiles', ())))
+
+    def _replay():
+        nonlocal error_count
+        for _ in range(repeat):
+            for record in records:
+                recorder = Recorder(None, record['argv'], cmd.name)
+                try:
+                    # _run(), so the --record flag in recorded argvs
+                    # doesn't append replays to the recording
+                    recorder.run(cmd._run, record['argv'], None, False)
+                except (SystemExit, Exception):
+                    error_count += 1
+                for phase, secs in recorder.get_timings().items():
+                    timings[phase].append(secs)
+
+    with redirect_stdout(io.StringIO()):
+        if dry:
+            with stub_handlers(cmd):
+                _replay()
+        else:
+            _replay()
+    return {'timings': timings,
+            'error_count': error_count,
+            'changed_flagfile_count': changed_flagfile_count}
+
+
+def summarize_timings(timings, percentiles=DEFAULT_PERCENTILES):
+    """Returns a dict mapping each phase with timings to a dict of
+    ``count``, ``max``, and ``p<N>`` for each of *percentiles*."""
+    ret = {}
+    for phase, values in timings.items():
+        if not values:
+            continue
+        values = sorted(values)
+        summary = {'count': len(values)}
+        for percentile in percentiles:
+            summary[f'p{percentile}'] = get_percentile(values, percentile)
+        summary['max'] = values[-1]
+        ret[phase] = summary
+    return ret
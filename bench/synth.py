@@ -0,0 +1,117 @@
+"""Generators for synthetic command trees, argvs, and flagfiles, sized
+by depth, fan-out, flags per level, and middleware count.
+"""
+
+from face import Command, Flag, ListParam, ChoicesParam, face_middleware
+
+
+_CHOICES = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+
+
+def _leaf_handler(args_):
+    return args_
+
+
+def _make_middleware(index):
+    provides = f'mw_{index}_value'
+
+    @face_middleware(provides=[provides], flags=[Flag(f'--mw-{index}-flag', parse_as=True)])
+    def _mw(next_):
+        return next_(**{provides: index})
+
+    _mw.__name__ = f'mw_{index}'
+    return _mw
+
+
+def get_flag_spec(level, index):
+    """Returns (Flag, example_value_text) for the *index*-th flag at
+    *level*. Cycles through a representative mix of flag types. An
+    example_value_text of None means the flag takes no argument.
+    """
+    name = f'--l{level}-flag-{index}'
+    doc = f'synthetic flag {index} at level {level}, of middling doc length for wrapping'
+    kind = index % 5
+    if kind == 0:
+        return Flag(name, doc=doc), f'value{index}'
+    elif kind == 1:
+        return Flag(name, parse_as=int, missing=0, doc=doc), str(index)
+    elif kind == 2:
+        return Flag(name, parse_as=True, doc=doc), None
+    elif kind == 3:
+        return Flag(name, parse_as=ListParam(int), doc=doc), '1,2,3,4,5'
+    return Flag(name, parse_as=ChoicesParam(_CHOICES), doc=doc), _CHOICES[index % len(_CHOICES)]
+
+
+_DOC_WORDS = ('synthetic', 'help', 'text', 'of', 'a', 'flag', 'with', 'several', 'words',
+              'wrapped', 'to', 'the', 'terminal', 'width', 'on', 'each', 'render')
+
+
+def make_docs(count=100, word_count=40):
+    "Returns *count* synthetic docstrings of *word_count* words each, for wrapping"
+    ret = []
+    for i in range(count):
+        words = [_DOC_WORDS[(i + j * 7) % len(_DOC_WORDS)] for j in range(word_count)]
+        ret.append(' '.join(words))
+    return ret
+
+
+def make_rows(count=1000):
+    "Returns *count* synthetic dict rows of mixed values, for table output"
+    return [{'id': i, 'name': _DOC_WORDS[i % len(_DOC_WORDS)] * (1 + i % 3),
+             'size': i * 37 % 10007, 'desc': ' '.join(_DOC_WORDS[i % 5:i % 5 + 6])}
+            for i in range(count)]
+
+
+def make_command(depth=3, fanout=4, flag_count=10, mw_count=2):
+    """Build a Command tree *depth* levels of subcommands deep, where
+    each non-leaf command has *fanout* subcommands, each command adds
+    *flag_count* flags, and the root has *mw_count* middlewares.
+
+    Leaf handlers accept ``args_`` so every flag is parsed.
+    """
+    def _build(level, name):
+        if level == depth:
+            cmd = Command(_leaf_handler, name, doc=f'synthetic leaf command {name}')
+        else:
+            cmd = Command(None, name, doc=f'synthetic command {name} at level {level}')
+        for i in range(flag_count):
+            cmd.add(get_flag_spec(level, i)[0])
+        # multi flag for flagfiles to target
+        cmd.add(f'--l{level}-item', multi=True, doc='repeatable synthetic flag')
+        if level < depth:
+            for i in range(fanout):
+                cmd.add(_build(level + 1, f'sub{level + 1}-{i}'))
+        return cmd
+
+    root = _build(0, 'root')
+    for i in range(mw_count):
+        root.add(_make_middleware(i))
+    return root
+
+
+def get_leaf_path(depth, fanout):
+    "The subcommand path of the last leaf in a tree built by make_command()"
+    return tuple(f'sub{level}_{fanout - 1}' for level in range(1, depth + 1))
+
+
+def make_argv(depth=3, fanout=4, flag_count=10, mw_count=2, flagfile_path=None):
+    "An argv reaching the last leaf, passing every flag in its path"
+    argv = ['root'] + [p.replace('_', '-') for p in get_leaf_path(depth, fanout)]
+    for level in range(depth + 1):
+        for i in range(flag_count):
+            flag, value = get_flag_spec(level, i)
+            argv.append(f'--l{level}-flag-{i}')
+            if value is not None:
+                argv.append(value)
+    for i in range(mw_count):
+        argv.append(f'--mw-{i}-flag')
+    if flagfile_path:
+        argv.extend(['--flagfile', flagfile_path])
+    return argv
+
+
+def make_flagfile_text(line_count=100, level=0):
+    "Text of a flagfile with *line_count* values for a repeatable flag"
+    lines = ['# synthetic flagfile']
+    lines.extend(f'--l{level}-item "item {i}"' for i in range(line_count))
+    return '\n'.join(lines) + '\n'
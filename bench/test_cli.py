@@ -0,0 +1,40 @@
+from bench.cli import compare_results, DEFAULT_THRESHOLD
+
+
+def _make_results(**best_map):
+    return {'timings': {phase: {'best': best, 'median': best * 2, 'number': 10, 'repeat': 5}
+                        for phase, best in best_map.items()}}
+
+
+def test_compare_results_threshold():
+    baseline = _make_results(parse=1.0, run=1.0, help=1.0, wrap=2.0)
+    results = _make_results(parse=1.05, run=1.2, help=0.5, wrap=2.2)
+
+    cmp_map = {phase: rest for phase, *rest in compare_results(results, baseline)}
+    assert cmp_map['parse'] == [1.0, 1.05, 1.05, False]  # within the default 10%
+    assert cmp_map['run'][3] is True
+    assert cmp_map['help'] == [1.0, 0.5, 0.5, False]  # faster is never a regression
+    # exactly at the threshold is not a regression
+    assert cmp_map['wrap'][2] == 1.1
+    assert cmp_map['wrap'][3] is False
+
+    # a tighter threshold catches smaller slowdowns, a looser one fewer
+    def _regressed(threshold):
+        return [c[0] for c in compare_results(results, baseline, threshold=threshold) if c[4]]
+    assert _regressed(0.01) == ['parse', 'run', 'wrap']
+    assert _regressed(0.5) == []
+    assert DEFAULT_THRESHOLD == 0.1
+
+
+def test_compare_results_mismatched_phases():
+    baseline = _make_results(construct=1.0, parse=1.0)
+    results = _make_results(parse=1.0, table=1.0)
+
+    # only phases timed in both are compared, in the order of results
+    assert compare_results(results, baseline) == [('parse', 1.0, 1.0, 1.0, False)]
+    assert compare_results(_make_results(), baseline) == []
+    assert compare_results(results, _make_results()) == []
+
+    # a baseline too fast to measure makes any time a regression
+    cmp = compare_results(_make_results(parse=1e-9), _make_results(parse=0.0))
+    assert cmp == [('parse', 0.0, 1e-9, float('inf'), True)]
@@ -4,6 +4,7 @@ from face.parser import (Flag,
                          Parser,
                          PosArgSpec,
                          PosArgDisplay,
+                         PosArgIterator,
                          CommandParseResult)
 
 from face.errors import (FaceException,
@@ -15,9 +16,23 @@ from face.errors import (FaceException,
                          InvalidFlagArgument,
                          UsageError)
 
-from face.parser import (ListParam, ChoicesParam)
+from face.parser import (ListParam, ChoicesParam, FilePathParam, FileValueParam)
+from face.config import ConfigFile
 from face.command import Command
-from face.middleware import face_middleware
+from face.middleware import face_middleware, MiddlewareCache
 from face.helpers import HelpHandler, StoutHelpFormatter
-from face.testing import CommandChecker, CheckError
+from face.testing import CommandChecker, CheckError, ForkedRunError
 from face.utils import echo, echo_err, prompt, prompt_secret
+
+# imported on first use, to keep startup fast for CLIs which don't
+_LAZY_ATTRS = {'Repl': 'face.repl', 'echo_table': 'face.table'}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
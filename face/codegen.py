@@ -0,0 +1,357 @@
+"""Ahead-of-time generation of a parser module specialized to one
+:class:`Command` tree.
+
+:meth:`Parser.parse` is generic: for every argv, it walks the
+subcommand tree, filters each subcommand's flags by what its handler
+uses, and looks up how to treat each flag. For a given Command, all of
+that is known in advance. :func:`get_parser_source` takes a finished
+Command and writes out the source of a standalone Python module, with
+a straight-line parse function for each subcommand path, with flag
+lookup tables, required flag checks, default values, and *multi*
+handling inlined. Like :mod:`face.sinter`'s middleware chains, but
+written ahead of time, as a build step::
+
+  with open('myapp/_cli_parser.py', 'w') as f:
+      f.write(get_parser_source(cmd))
+
+Then, when the CLI starts up::
+
+  from myapp import _cli_parser
+  install_parser(cmd, _cli_parser)
+
+after which :meth:`Command.parse()`, and so :meth:`Command.run()`,
+use the generated module. The module must be regenerated whenever the
+command tree changes, so add a test which installs it with
+``check=True``::
+
+  def test_cli_parser_current():
+      install_parser(cmd, _cli_parser, check=True)
+
+which raises ValueError if the tree has changed since the module was
+generated. The check compares a fingerprint of the tree's structure
+(subcommands, flags, and handler and middleware signatures). That's
+much cheaper than generating the source, but for large trees, still
+costs more than a single parse saves, so it's off by default.
+
+The generated code handles the common case: flags and positional
+arguments on the command line. For anything else, including flagfiles,
+flags set by environment variables, config files, traced runs, and all
+parse errors, it hands off to :meth:`Parser.parse`, so results and
+error messages are always the same as without it.
+:func:`compile_parser` generates and installs a module in one step,
+without writing it to disk, which is handy for testing.
+"""
+
+import types
+import inspect
+import hashlib
+import linecache
+
+from face.utils import ERROR
+from face.parser import _multi_error, _multi_extend, _multi_override, _Fallback
+from face.sinter import _INDENT
+
+
+_FINGERPRINT_PREFIX = 'FINGERPRINT = '
+
+
+def _get_flag_spellings(flag):
+    ret = ['--' + flag.name.replace('_', '-')]
+    if '_' in flag.name:
+        ret.append('--' + flag.name)
+    if flag.char:
+        ret.append('-' + flag.char)
+    return ret
+
+
+def _get_callable_sig(func):
+    "Identifies *func*'s signature from its code object, without inspect."
+    func = inspect.unwrap(func)
+    code = getattr(func, '__code__', None)
+    if code is None:
+        code = getattr(getattr(func, '__call__', None), '__code__', None)
+    if code is None:
+        return getattr(func, '__qualname__', type(func).__qualname__)
+    arg_count = code.co_argcount + code.co_kwonlyargcount
+    return (code.co_varnames[:arg_count], code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS),
+            len(getattr(func, '__defaults__', None) or ()),
+            sorted(getattr(func, '__kwdefaults__', None) or ()))
+
+
+def _get_multi_kind(flag):
+    for kind, multi in (('error', _multi_error), ('extend', _multi_extend),
+                        ('override', _multi_override)):
+        if flag.multi is multi:
+            return kind
+    return 'custom'
+
+
+def _get_fingerprint(cmd):
+    """Returns a hash of everything about *cmd* the generated source
+    depends on: subcommand paths, flags, positional arguments, and the
+    signatures which determine the flags each path's handler uses."""
+    # subcommands share most of their flags, so each is described once
+    slot_map, flag_parts = {}, []
+    parts = [cmd.configfile is None, flag_parts]
+    for path in [()] + list(cmd.subprs_map):
+        prs = cmd.subprs_map[path] if path else cmd
+        slots = []
+        for flag in cmd._path_flag_map[path].values():
+            slot = slot_map.get(id(flag))
+            if slot is None:
+                slot = slot_map[id(flag)] = len(flag_parts)
+                flag_parts.append((flag.name, flag.char, flag is cmd.flagfile_flag,
+                                   callable(flag.parse_as), flag.env, flag.missing is ERROR,
+                                   _get_multi_kind(flag)))
+            slots.append(slot)
+        func = cmd._path_func_map[path]
+        mw_parts = [(_get_callable_sig(mw), mw._face_provides, mw._face_optional)
+                    for mw in cmd._path_mw_map[path]]
+        parts.append((path, prs.posargs.parse_as is ERROR, bool(prs.subprs_map), slots,
+                      _get_callable_sig(func) if func else None, mw_parts))
+    return hashlib.sha256(repr(parts).encode('utf8')).hexdigest()
+
+
+def _indent(lines, level):
+    return [(_INDENT * level + line) if line else line for line in lines]
+
+
+def _get_path_lines(index, path, path_flags, slot_map, cmd):
+    "Returns the lines of the specialized parse function for one path."
+    flag_slots = [slot_map[id(flag)] for flag in path_flags]
+    keys = {}
+    for i, flag in enumerate(path_flags):
+        if flag is cmd.flagfile_flag:
+            continue  # flagfiles are left to the generic parser
+        for spelling in _get_flag_spellings(flag):
+            keys[spelling] = i
+    convs = ', '.join(f'conv_{s}' if callable(f.parse_as) else 'None'
+                      for s, f in zip(flag_slots, path_flags))
+    consts = ', '.join('None' if callable(f.parse_as) else f'flag_{s}.parse_as'
+                       for s, f in zip(flag_slots, path_flags))
+    names = ', '.join(repr(f.name) for f in path_flags)
+    func_name = f'parse_{index}'
+    ret = [f'# path: {path!r}',
+           f'prs_{index} = ' + (f'cmd.subprs_map[{path!r}]' if path else 'cmd'),
+           f'keys_{index} = {keys!r}',
+           f'convs_{index} = ({convs}{"," if len(path_flags) == 1 else ""})',
+           f'consts_{index} = ({consts}{"," if len(path_flags) == 1 else ""})',
+           f'names_{index} = ({names}{"," if len(path_flags) == 1 else ""})',
+           f'def {func_name}(cpr, args):',
+           f'    keys, convs, consts = keys_{index}, convs_{index}, consts_{index}',
+           f'    vals = [None] * {len(path_flags)}',
+           '    order = []',
+           '    i, n = 0, len(args)',
+           '    while i < n:',
+           '        arg = args[i]',
+           "        if not arg or arg[0] != '-' or arg == '-' or arg == '--':",
+           '            break',
+           "        name, eq, text = arg.partition('=')",
+           '        k = keys.get(name)',
+           '        if k is None:',
+           '            raise _Fallback',
+           '        conv = convs[k]',
+           '        if conv is None:',
+           '            if text:',
+           '                raise _Fallback',
+           '            value = consts[k]',
+           '        else:',
+           '            if not eq:',
+           '                i += 1',
+           '                if i == n:',
+           '                    raise _Fallback',
+           '                text = args[i]',
+           '            try:',
+           '                value = conv(text)',
+           '            except Exception:',
+           '                raise _Fallback',
+           '        if vals[k] is None:',
+           '            vals[k] = [value]',
+           '            order.append(k)',
+           '        else:',
+           '            vals[k].append(value)',
+           '        i += 1',
+           '    flags, sources = OrderedDict(), OrderedDict()',
+           '    for k in order:',
+           f'        flags[names_{index}[k]] = vals[k]',
+           f"        sources[names_{index}[k]] = 'argv'"]
+
+    for i, (slot, flag) in enumerate(zip(flag_slots, path_flags)):
+        name = repr(flag.name)
+        ret.append(f'    v = vals[{i}]')
+        ret.append('    if v is None:')
+        if flag.env:
+            ret.append(f'        if {flag.env!r} in environ:')
+            ret.append('            raise _Fallback')
+        if flag.missing is ERROR:
+            ret.append('        raise _Fallback')
+        else:
+            if flag.multi is _multi_extend:
+                ret.append(f'        flags[{name}] = []')
+            elif flag.multi in (_multi_error, _multi_override):
+                ret.append(f'        flags[{name}] = missing_{slot}')
+            else:
+                ret.extend(['        try:',
+                            f'            flags[{name}] = multi_{slot}(flag_{slot}, [missing_{slot}])',
+                            '        except Exception:',
+                            '            raise _Fallback'])
+            ret.append(f"        sources[{name}] = 'missing'")
+        ret.append('    else:')
+        if flag.multi is _multi_error:
+            ret.append('        if len(v) > 1:')
+            ret.append('            raise _Fallback')
+            ret.append(f'        flags[{name}] = v[0]')
+        elif flag.multi is _multi_extend:
+            ret.append(f'        flags[{name}] = [x for x in v if x is not missing_{slot}]')
+        elif flag.multi is _multi_override:
+            ret.append(f'        flags[{name}] = v[-1]')
+        else:
+            ret.extend(['        try:',
+                        f'            flags[{name}] = multi_{slot}(flag_{slot}, v)',
+                        '        except Exception:',
+                        '            raise _Fallback'])
+
+    ret.extend(['    cpr.flags, cpr.flag_sources = flags, sources',
+                '    posargs = args[i:]',
+                '    cpr.posargs = tuple(posargs)',
+                "    if '--' in posargs:",
+                "        posargs, post_posargs = split(posargs, '--', 1)",
+                '        cpr.posargs, cpr.post_posargs = posargs, post_posargs',
+                f'        cpr.post_posargs = _freeze_posargs(prs_{index}.post_posargs.parse(post_posargs))',
+                f'    cpr.posargs = _freeze_posargs(prs_{index}.posargs.parse(posargs))',
+                '    return cpr'])
+    return ret
+
+
+def _get_source_body(cmd):
+    paths = [()] + list(cmd.subprs_map)
+    path_flags_map = {path: list(cmd.get_flags(path)) for path in paths}
+    slot_map, slot_lines = {}, []
+    for path in paths:
+        for flag in path_flags_map[path]:
+            if id(flag) in slot_map:
+                continue
+            slot = slot_map[id(flag)] = len(slot_map)
+            slot_lines.append(f'flag_{slot} = cmd._path_flag_map[{path!r}][{flag.name!r}]')
+            if callable(flag.parse_as):
+                slot_lines.append(f'conv_{slot} = flag_{slot}.parse_as')
+            slot_lines.append(f'missing_{slot} = flag_{slot}.missing')
+            if flag.multi not in (_multi_error, _multi_extend, _multi_override):
+                slot_lines.append(f'multi_{slot} = flag_{slot}.multi')
+
+    func_names, subcmd_map, posarg_paths, path_lines = {}, {}, [], []
+    for i, path in enumerate(paths):
+        func_names[path] = f'parse_{i}'
+        prs = cmd.subprs_map[path] if path else cmd
+        path_lines.extend(_get_path_lines(i, path, path_flags_map[path], slot_map, cmd))
+        path_lines.append('')
+        if path:
+            subcmd_map.setdefault(path[:-1], {})[path[-1]] = path
+        if prs.posargs.parse_as is not ERROR or not prs.subprs_map:
+            posarg_paths.append(path)
+
+    lines = ['def make_parse(cmd):',
+             '    """Returns a parse function specialized to *cmd*, which raises',
+             '    _Fallback for anything it leaves to the generic parser."""']
+    lines.extend(_indent(slot_lines, 1))
+    lines.append('')
+    lines.extend(_indent(path_lines, 1))
+    path_funcs = ', '.join(f'{path!r}: {name}' for path, name in func_names.items())
+    parse_lines = [f'subcmd_map = {subcmd_map!r}',
+                   f'posarg_paths = frozenset({posarg_paths!r})',
+                   f'path_funcs = {{{path_funcs}}}',
+                   '',
+                   'def parse(argv):',
+                   '    if not argv or _ACTIVE_TRACER.get() is not None:',
+                   '        raise _Fallback',
+                   '    for arg in argv:',
+                   '        if not isinstance(arg, str):',
+                   '            raise _Fallback']
+    if cmd.configfile is not None:
+        parse_lines.append('    raise _Fallback  # config files are left to the generic parser')
+    parse_lines.extend(['    cpr = CommandParseResult(parser=cmd, argv=argv)',
+                        '    args = list(argv)[1:]',
+                        '    cpr.name = argv[0]',
+                        '    path, count = (), 0',
+                        '    for arg in args:',
+                        "        if arg.startswith('-'):",
+                        '            break',
+                        "        subpath = subcmd_map.get(path, {}).get(arg.lower().replace('-', '_'))",
+                        '        if subpath is None:',
+                        '            if path in posarg_paths:',
+                        '                break',
+                        '            raise _Fallback',
+                        '        path, count = subpath, count + 1',
+                        '    cpr.subcmds = path',
+                        '    try:',
+                        '        return path_funcs[path](cpr, args[count:])',
+                        '    except ArgumentParseError as ape:',
+                        '        ape.prs_res = cpr',
+                        '        raise',
+                        '',
+                        'return parse'])
+    lines.extend(_indent(parse_lines, 1))
+    return '\n'.join(lines) + '\n'
+
+
+def get_parser_source(cmd):
+    """Returns the source of a Python module with a parser specialized
+    to *cmd*, a finished :class:`Command` tree, for installing with
+    :func:`install_parser`.
+    """
+    from face.command import Command  # avoid a circular import
+    if not isinstance(cmd, Command):
+        raise TypeError(f'expected Command, not: {cmd!r}')
+    body = _get_source_body(cmd)
+    fingerprint = _get_fingerprint(cmd)
+    header = [f'"""Parser specialized to the {cmd.name!r} command, generated by face.codegen.',
+              '',
+              'Do not edit. Regenerate whenever the command changes."""',
+              '',
+              'from os import environ',
+              'from collections import OrderedDict',
+              '',
+              'from boltons.iterutils import split',
+              '',
+              'from face.errors import ArgumentParseError',
+              'from face.parser import CommandParseResult, _ACTIVE_TRACER, _freeze_posargs',
+              'from face.codegen import _Fallback',
+              '',
+              '',
+              f'{_FINGERPRINT_PREFIX}{fingerprint!r}',
+              '',
+              '',
+              '']
+    return '\n'.join(header) + body
+
+
+def install_parser(cmd, module, check=False):
+    """Make *cmd* parse with *module*, generated by
+    :func:`get_parser_source`. With *check* set, raises ValueError if
+    *cmd*'s structure has changed since the module was generated. Best
+    done in tests, rather than on every startup.
+
+    Adding to *cmd* uninstalls the parser.
+    """
+    if check:
+        if module.FINGERPRINT != _get_fingerprint(cmd):
+            raise ValueError(f'parser module {module.__name__!r} was generated from a different'
+                             f' version of the {cmd.name!r} command, expected it regenerated'
+                             ' with face.codegen.get_parser_source()')
+    cmd._compiled_parse = module.make_parse(cmd)
+    return
+
+
+def compile_parser(cmd):
+    """Generate a parser module for *cmd*, and install it, without
+    writing it to disk. Returns the module."""
+    source = get_parser_source(cmd)
+    code_hash = hashlib.sha1(source.encode('utf8')).hexdigest()[:16]
+    filename = f'<face generated parser {cmd.name} {code_hash}>'
+    module = types.ModuleType(f'face_parser_{cmd.name}')
+    module.__file__ = filename
+    exec(compile(source, filename, 'exec'), module.__dict__)
+    # so tracebacks through generated code show the source
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    install_parser(cmd, module)
+    return module
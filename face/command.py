@@ -1,11 +1,14 @@
 import sys
+from importlib import import_module
 from collections import OrderedDict
-from typing import Callable, List, Optional, Union
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
 
 from face.utils import unwrap_text, get_rdep_map, echo
 from face.errors import ArgumentParseError, CommandLineError, UsageError
-from face.parser import Parser, Flag, PosArgSpec
+from face.parser import Parser, Flag, PosArgSpec, _ACTIVE_TRACER, _Fallback
+from face.config import ConfigFile
 from face.helpers import HelpHandler
+from face.sinter import get_fb
 from face.middleware import (inject,
                              get_arg_names,
                              is_middleware,
@@ -17,6 +20,12 @@ from face.middleware import (inject,
 from boltons.strutils import camel2under
 from boltons.iterutils import unique
 
+if TYPE_CHECKING:  # the builtin handlers are imported when enabled
+    from face.profiling import ProfileHandler
+    from face.tracing import TraceHandler
+    from face.rusage import RusageHandler
+    from face.recording import RecordHandler
+
 
 def _get_default_name(func):
     from functools import partial
@@ -45,6 +54,34 @@ def _docstring_to_doc(func):
     return ret
 
 
+def _get_scope_names(func):
+    "The names *func* can be injected with, or None if it takes any (**kwargs)."
+    fb = get_fb(func)
+    if fb.varkw:
+        return None
+    return fb.get_arg_names()
+
+
+# Command argument name -> module and type of its builtin handler,
+# imported only when enabled
+_BUILTIN_HANDLER_TYPES = {'profile': ('face.profiling', 'ProfileHandler'),
+                          'trace': ('face.tracing', 'TraceHandler'),
+                          'rusage': ('face.rusage', 'RusageHandler'),
+                          'record': ('face.recording', 'RecordHandler')}
+
+
+def _get_builtin_handler(arg_name, value):
+    if not value:
+        return None
+    module_name, type_name = _BUILTIN_HANDLER_TYPES[arg_name]
+    handler_type = getattr(import_module(module_name), type_name)
+    if value is True:
+        return handler_type()
+    if not isinstance(value, handler_type):
+        raise TypeError(f'expected bool or {type_name} instance for {arg_name}, not: {value!r}')
+    return value
+
+
 def default_print_error(msg):
     return echo.err(msg)
 
@@ -75,11 +112,37 @@ class Command(Parser):
         post_posargs: Pass True if the command takes
            additional positional arguments after a conventional '--'
            specifier.
+        configfile: A path, or list of paths, of TOML or INI files
+           from which to read flag values not otherwise set. Also
+           accepts a ConfigFile instance.
         help: Pass False to disable the automatically added
            --help flag. Defaults to True. Also accepts a HelpHandler
            instance.
         middlewares: A list of @face_middleware decorated
            callables which participate in dispatch.
+        profile: Pass True to add hidden ``--profile`` and
+           ``--profile-sample`` flags, which profile the whole run and
+           write the results to a file. Defaults to False. Also accepts
+           a ProfileHandler instance.
+        trace: Pass True to add a hidden ``--trace`` flag, which
+           records nested spans for the run (parsing, each middleware,
+           and the handler) and writes them to a file as JSON. Defaults
+           to False. Also accepts a TraceHandler instance.
+        rusage: Pass True to add a hidden ``--rusage`` flag (also
+           set by the ``FACE_RUSAGE`` environment variable), which
+           reports the CPU time, memory, and I/O used by the run to
+           stderr or a JSONL file. Defaults to False. Also accepts a
+           RusageHandler instance.
+        record: Pass True to add a hidden ``--record`` flag (also set
+           by the ``FACE_RECORD`` environment variable), which appends
+           the argv and phase timings of the run to a JSONL file, for
+           replay as a benchmark. Defaults to False. Also accepts a
+           RecordHandler instance.
+        builtin_handlers: A list of other handlers which, like the
+           above, wrap the whole run. Each has a ``flags`` list, added
+           to the Command, and a ``wrap_run(argv, cmd, run)`` method,
+           which returns *run*, or a callable taking the same
+           arguments which calls it.
     """
     def __init__(self, 
                  func: Optional[Callable],
@@ -90,18 +153,36 @@ class Command(Parser):
                  posargs: Optional[Union[bool, PosArgSpec]] = None,
                  post_posargs: Optional[bool] = None,
                  flagfile: bool = True,
+                 configfile: Optional[Union[str, List[str], ConfigFile]] = None,
                  help: Union[bool, HelpHandler] = DEFAULT_HELP_HANDLER,
-                 middlewares: Optional[List[Callable]] = None) -> None:
+                 middlewares: Optional[List[Callable]] = None,
+                 profile: Union[bool, 'ProfileHandler'] = False,
+                 trace: Union[bool, 'TraceHandler'] = False,
+                 rusage: Union[bool, 'RusageHandler'] = False,
+                 record: Union[bool, 'RecordHandler'] = False,
+                 builtin_handlers: Optional[List[object]] = None) -> None:
         name = name if name is not None else _get_default_name(func)
         if doc is None:
             doc = _docstring_to_doc(func)
 
+        # paths whose middleware chains are compiled and current, reset
+        # on any add(). set first, as Parser.__init__() adds flags.
+        self._prepared_paths = set()
+        self._path_traced_map = {}
+        # set by face.codegen.install_parser(), reset on any add()
+        self._compiled_parse = None
+        # compiled chains by handler, middlewares, and provides, shared
+        # by paths (and clones) with the same middleware stack
+        self._chain_cache = {}
+        self._mw_resources = {}  # id(mw): live setups of lifetime='process' middlewares
+
         # TODO: default posargs if none by inspecting func
         super().__init__(name, doc,
                         flags=flags,
                         posargs=posargs,
                         post_posargs=post_posargs,
-                        flagfile=flagfile)
+                        flagfile=flagfile,
+                        configfile=configfile)
 
         self.help_handler = help
 
@@ -129,6 +210,22 @@ class Command(Parser):
             raise ValueError('Command requires a handler function or help handler'
                              ' to be set, not: %r' % func)
 
+        # applied in order, each wrapping the run of the ones before
+        self.builtin_handlers = []
+        for arg_name, value in (('rusage', rusage), ('trace', trace),
+                                ('record', record), ('profile', profile)):
+            handler = _get_builtin_handler(arg_name, value)
+            if handler:
+                self.builtin_handlers.append(handler)
+        for handler in builtin_handlers or []:
+            if not callable(getattr(handler, 'wrap_run', None)):
+                raise TypeError(f'expected builtin handler with flags and a wrap_run() method,'
+                                f' not: {handler!r}')
+            self.builtin_handlers.append(handler)
+        for handler in self.builtin_handlers:
+            for flag in handler.flags:
+                self.add(flag)
+
         return
 
     @property
@@ -159,6 +256,8 @@ class Command(Parser):
         """
         # TODO: need to check for middleware provides names + flag names
         # conflict
+        self._reset_prepared()
+        self._compiled_parse = None
 
         target = a[0]
 
@@ -190,6 +289,9 @@ class Command(Parser):
         """
         if not isinstance(subcmd, Command):
             raise TypeError(f'expected Command instance, not: {subcmd!r}')
+        self._unshare()
+        self._reset_prepared()
+        self._compiled_parse = None
         self_mw = self._path_mw_map[()]
         super().add(subcmd)
         # map in new functions
@@ -208,6 +310,9 @@ class Command(Parser):
         if not is_middleware(mw):
             mw = face_middleware(mw)
         check_middleware(mw)
+        self._unshare()
+        self._reset_prepared()
+        self._compiled_parse = None
 
         for flag in mw._face_flags:
             self.add(flag)
@@ -219,6 +324,36 @@ class Command(Parser):
 
     # TODO: add_flag()
 
+    _cow_attrs = Parser._cow_attrs + ('_path_func_map', '_path_mw_map', '_path_wrapped_map')
+
+    def clone(self, name=None, doc=None):
+        """Returns a copy of this command, with a new *name* and *doc*,
+        if passed. Use clones to add the same subcommand under more
+        than one name, or to more than one parent::
+
+          cmd.add(admin_cmd)
+          cmd.add(admin_cmd.clone('adm'))
+
+        Clones share their subcommands, flags, middlewares, and
+        compiled middleware chains with the original until either is
+        changed with :meth:`add()`, so cloning is cheap, even for large
+        subcommand trees. The exception is a command with
+        ``lifetime='process'`` middlewares, whose clones set up and
+        :meth:`close()` their own.
+        """
+        ret = super().clone(name=name, doc=doc)
+        ret._prepared_paths = set(self._prepared_paths)
+        ret._path_traced_map = dict(self._path_traced_map)
+        ret._compiled_parse = None  # bound to this command
+        if any(getattr(mw, '_face_lifetime', None) == 'process'
+               for mws in self._path_mw_map.values() for mw in mws):
+            # compiled chains hold their command's process-lifetime
+            # setups, so the clone compiles its own, closed separately
+            ret._mw_resources, ret._chain_cache = {}, {}
+            ret._path_wrapped_map = OrderedDict(self._path_wrapped_map)
+            ret._prepared_paths, ret._path_traced_map = set(), {}
+        return ret
+
     def get_flag_map(self, path=(), with_hidden=True):
         """Command's get_flag_map differs from Parser's in that it filters
         the flag map to just the flags used by the endpoint at the
@@ -242,8 +377,30 @@ class Command(Parser):
             # accepts these arguments and doesn't use them all.
             return OrderedDict(flag_map)
 
+        builtin_flags = self._get_builtin_flags()
         return OrderedDict([(k, f) for k, f in flag_map.items() if f.name in dep_names
-                            or f is self.flagfile_flag or f is self.help_handler.flag])
+                            or f in builtin_flags])
+
+    def _get_builtin_flags(self):
+        ret = super()._get_builtin_flags()
+        if self.help_handler and self.help_handler.flag:
+            ret.append(self.help_handler.flag)
+        for handler in self.builtin_handlers:
+            ret.extend(handler.flags)
+        return ret
+
+    def parse(self, argv):
+        """Parses *argv*, just like :meth:`Parser.parse()`, but using the
+        specialized parser installed with
+        :func:`face.codegen.install_parser()`, if any.
+        """
+        compiled_parse = self._compiled_parse
+        if compiled_parse is not None:
+            try:
+                return compiled_parse(argv)
+            except _Fallback:
+                pass  # not handled by the specialized parser
+        return super().parse(argv)
 
     def get_dep_names(self, path=()):
         """Get a list of the names of all required arguments of a command (and
@@ -284,6 +441,10 @@ class Command(Parser):
         conscientious users may want to call this method with no
         arguments to validate that all subcommands are ready for
         execution.
+
+        Compiled middleware chains are kept until the next call to
+        .add(), so repeated runs in the same process (as in
+        :meth:`repl()`) only prepare each subcommand once.
         """
         # TODO: also pre-execute help formatting to make sure all
         # values are sane there, too
@@ -291,35 +452,67 @@ class Command(Parser):
             paths = self._path_func_map.keys()
 
         for path in paths:
+            if path in self._prepared_paths:
+                continue
             func = self._path_func_map[path]
             if func is None:
                 continue  # handled by run()
 
-            prs = self.subprs_map[path] if path else self
-            provides = []
-            if prs.posargs.provides:
-                provides += [prs.posargs.provides]
-            if prs.post_posargs.provides:
-                provides += [prs.post_posargs.provides]
-
-            deps = self.get_dep_names(path)
-            flag_names = [f.name for f in self.get_flags(path=path)]
-            all_mws = self._path_mw_map[path]
-
-            # filter out unused middlewares
-            mws = [mw for mw in all_mws if not mw._face_optional
-                   or [p for p in mw._face_provides if p in deps]]
-            provides += _BUILTIN_PROVIDES + flag_names
-            try:
-                wrapped = get_middleware_chain(mws, func, provides)
-            except NameError as ne:
-                ne.args = (ne.args[0] + f' (in path: {path!r})',)
-                raise
-
-            self._path_wrapped_map[path] = wrapped
+            self._path_wrapped_map[path] = self._get_middleware_chain(path)
+            self._prepared_paths.add(path)
 
         return
 
+    def _get_middleware_chain(self, path, trace=False):
+        func = self._path_func_map[path]
+        prs = self.subprs_map[path] if path else self
+        provides = []
+        if prs.posargs.provides:
+            provides += [prs.posargs.provides]
+        if prs.post_posargs.provides:
+            provides += [prs.post_posargs.provides]
+
+        flag_names = [f.name for f in self.get_flags(path=path)]
+        all_mws = self._path_mw_map[path]
+        provides += _BUILTIN_PROVIDES + flag_names
+
+        cache_key = (func, tuple(all_mws), tuple(provides), trace)
+        try:
+            return self._chain_cache[cache_key]
+        except KeyError:
+            pass
+        except TypeError:
+            cache_key = None  # unhashable handler, don't cache
+
+        deps = self.get_dep_names(path)
+        # filter out unused middlewares
+        mws = [mw for mw in all_mws if not mw._face_optional
+               or [p for p in mw._face_provides if p in deps]]
+        try:
+            ret = get_middleware_chain(mws, func, provides, trace=trace,
+                                       resources=self._mw_resources)
+        except NameError as ne:
+            ne.args = (ne.args[0] + f' (in path: {path!r})',)
+            raise
+        # kept on the chain, so runs needn't inspect it again
+        ret._face_scope_names = _get_scope_names(ret)
+        if cache_key is not None:
+            self._chain_cache[cache_key] = ret
+        return ret
+
+    def _get_traced_chain(self, path):
+        # compiled separately, on first traced run, so that untraced
+        # runs never pay for span wrappers
+        try:
+            return self._path_traced_map[path]
+        except KeyError:
+            ret = self._path_traced_map[path] = self._get_middleware_chain(path, trace=True)
+            return ret
+
+    def _reset_prepared(self):
+        self._prepared_paths.clear()
+        self._path_traced_map.clear()
+
     def run(self, argv=None, extras=None, print_error=None):
         """Parses arguments and dispatches to the appropriate subcommand
         handler. If there is a parse error due to invalid user input,
@@ -347,6 +540,53 @@ class Command(Parser):
            configured properly, call :meth:`prepare()`.
 
         """
+        run, full_argv = self._run, sys.argv if argv is None else argv
+        for handler in self.builtin_handlers:
+            run = handler.wrap_run(full_argv, self, run)
+        return run(argv, extras, print_error)
+
+    def repl(self, prompt=None, extras=None, **kw):
+        """Run this command interactively, reading lines of arguments
+        from a prompt and running each, until the user enters
+        ``exit``. Errors in user input are printed without ending the
+        session. Returns the exit code of the last line run.
+
+        Takes the same arguments as :class:`~face.repl.Repl`.
+        """
+        from face.repl import Repl
+        return Repl(self, prompt=prompt, extras=extras, **kw).run()
+
+    def close(self):
+        """Tear down the values provided by this command's
+        middlewares declared with ``lifetime='process'``, innermost
+        first. The next run sets them up again. Called automatically at
+        interpreter exit, and when a Command is used as a context
+        manager.
+
+        Raises the first exception raised during teardown, after
+        attempting all of them.
+        """
+        mws = unique(mw for mws in self._path_mw_map.values() for mw in mws)
+        first_exc = None
+        for mw in reversed(mws):
+            resources = self._mw_resources.get(id(mw))
+            if resources is None:
+                continue
+            try:
+                resources.close()
+            except Exception as e:
+                first_exc = first_exc or e
+        if first_exc is not None:
+            raise first_exc
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _run(self, argv, extras, print_error):
         if print_error is None or print_error is True:
             print_error = default_print_error
         elif print_error and not callable(print_error):
@@ -355,49 +595,88 @@ class Command(Parser):
         kwargs = dict(extras) if extras else {}
         kwargs['print_error_'] = print_error  # TODO: print_error_ in builtin provides?
 
+        tracer = _ACTIVE_TRACER.get()
         try:
-            prs_res = self.parse(argv=argv)
+            if tracer is None:
+                prs_res = self.parse(argv=argv)
+            else:
+                with tracer.span('parse', 'parse'):
+                    prs_res = self.parse(argv=argv)
         except ArgumentParseError as ape:
             prs_res = ape.prs_res
 
             # even if parsing failed, check if the caller was trying to access the help flag
-            cmd = prs_res.to_cmd_scope()['subcommand_']
+            cmd = prs_res.get_subparser()
             if cmd.help_handler and prs_res.flags and prs_res.flags.get(cmd.help_handler.flag.name):
-                kwargs.update(prs_res.to_cmd_scope())
+                kwargs.update(prs_res.to_cmd_scope(names=_get_scope_names(cmd.help_handler.func)))
                 return inject(cmd.help_handler.func, kwargs)
 
-            msg = 'error: ' + (prs_res.name or self.name)
-            if prs_res.subcmds:
-                msg += ' ' + ' '.join(prs_res.subcmds or ())
-
-            # args attribute, nothing to do with cmdline args this is
-            # the standard-issue Exception
-            e_msg = ape.args[0]
-            if e_msg:
-                msg += ': ' + e_msg
-            cle = CommandLineError(msg)
-            if print_error:
-                print_error(msg)
-            raise cle
-
-        kwargs.update(prs_res.to_cmd_scope())
+            raise self._get_parse_error(prs_res, ape, print_error)
 
         # default in case no middlewares have been installed
         func = self._path_func_map[prs_res.subcmds]
 
-        cmd = kwargs['subcommand_']
+        cmd = prs_res.get_subparser()
         if cmd.help_handler and (not func or (prs_res.flags and prs_res.flags.get(cmd.help_handler.flag.name))):
+            kwargs.update(prs_res.to_cmd_scope(names=_get_scope_names(cmd.help_handler.func)))
             return inject(cmd.help_handler.func, kwargs)
         elif not func:  # pragma: no cover
             raise RuntimeError('expected command handler or help handler to be set')
 
-        self.prepare(paths=[prs_res.subcmds])
-        wrapped = self._path_wrapped_map.get(prs_res.subcmds, func)
+        if tracer is None:
+            self.prepare(paths=[prs_res.subcmds])
+            wrapped = self._path_wrapped_map.get(prs_res.subcmds, func)
+        else:
+            with tracer.span('prepare', 'command'):
+                self.prepare(paths=[prs_res.subcmds])
+                if tracer.trace_chain:
+                    wrapped = self._get_traced_chain(prs_res.subcmds)
+                else:
+                    wrapped = self._path_wrapped_map.get(prs_res.subcmds, func)
+        # only compute the builtins the chain will actually use
+        try:
+            scope_names = wrapped._face_scope_names
+        except AttributeError:
+            scope_names = _get_scope_names(wrapped)
+        kwargs.update(prs_res.to_cmd_scope(names=scope_names))
+        progress = None
+        if 'progress_' not in kwargs and (scope_names is None or 'progress_' in scope_names):
+            from face.progress import Progress
+            progress = kwargs['progress_'] = Progress()
 
         try:
-            ret = inject(wrapped, kwargs)
+            if tracer is None:
+                ret = inject(wrapped, kwargs)
+            else:
+                with tracer.span('dispatch', 'command'):
+                    ret = inject(wrapped, kwargs)
         except UsageError as ue:
             if print_error:
                 print_error(ue.format_message())
             raise
+        except ArgumentParseError as ape:
+            # only errors from lazy positional arguments, consumed by
+            # the handler, are this command's usage errors
+            posarg_iter = getattr(ape, 'posarg_iter', None)
+            if posarg_iter is None or posarg_iter not in (prs_res.posargs, prs_res.post_posargs):
+                raise
+            raise self._get_parse_error(prs_res, ape, print_error) from ape
+        finally:
+            if progress is not None:
+                progress.close()
         return ret
+
+    def _get_parse_error(self, prs_res, ape, print_error):
+        msg = 'error: ' + (prs_res.name or self.name)
+        if prs_res.subcmds:
+            msg += ' ' + ' '.join(prs_res.subcmds or ())
+
+        # args attribute, nothing to do with cmdline args this is
+        # the standard-issue Exception
+        e_msg = ape.args[0]
+        if e_msg:
+            msg += ': ' + e_msg
+        cle = CommandLineError(msg)
+        if print_error:
+            print_error(msg)
+        return cle
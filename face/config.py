@@ -0,0 +1,189 @@
+"""Structured config files as a source of flag values.
+
+Where flagfiles are line-based fragments of argv, config files map
+keys to flags, with one section per subcommand. In TOML::
+
+  verbose = true        # flags for the root command
+
+  [deploy]              # flags for the "deploy" subcommand
+  region = "us-east-1"
+
+  [deploy.canary]       # and for "deploy canary"
+  percent = 5
+
+In INI files, the root command's flags go in the ``[DEFAULT]``
+section, and subcommand sections are named the same way as in TOML.
+
+Sections inherit down the subcommand tree, so the values in
+``[deploy]`` also apply to ``deploy canary``, unless overridden there.
+Values on the command line, in flagfiles, and in environment variables
+all take precedence over config files.
+"""
+
+import os
+import configparser
+from collections import OrderedDict
+
+try:
+    import tomllib
+except ImportError:  # pragma: no cover
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from boltons.funcutils import format_exp_repr
+
+from face.errors import ArgumentParseError
+
+
+_FORMAT_EXTS = {'.toml': 'toml', '.ini': 'ini', '.cfg': 'ini', '.conf': 'ini'}
+_INI_ROOT_SECTION = 'DEFAULT'
+
+
+def _normalize_key(key):
+    return key.strip().lower().replace('-', '_')
+
+
+def _section_name_to_path(name):
+    if name == _INI_ROOT_SECTION:
+        return ()
+    return tuple(_normalize_key(part) for part in name.split('.'))
+
+
+def _get_section_label(path):
+    return '.'.join(path) if path else '(root)'
+
+
+class ConfigFile:
+    """Reads flag values from one or more TOML or INI config files. Pass
+    an instance (or simply a path, or list of paths) as the
+    *configfile* argument of :class:`Parser` or :class:`Command`.
+
+    Args:
+       paths: A path or list of paths. Files which do not exist are
+          skipped. When a flag is set in more than one file, the value
+          from the later file is used, making it easy to layer
+          user-level config on top of system-level config.
+       format (str): ``'toml'`` or ``'ini'``. By default, inferred from
+          each file's extension, with TOML files ending in ``.toml``,
+          and INI files ending in ``.ini``, ``.cfg``, or ``.conf``.
+
+    TOML support uses the standard library's :mod:`tomllib` (Python
+    3.11+), or the `tomli`_ package on older versions.
+
+    Config files are read only when a command has flags left unset
+    after argv, flagfiles, and environment variables are applied, and
+    parsed contents are cached, keyed on each file's stat, so
+    repeated parses in a long-lived process don't re-read unchanged
+    files.
+
+    .. _tomli: https://pypi.org/project/tomli/
+    """
+    def __init__(self, paths, format=None):
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        self.paths = [os.path.abspath(os.path.expanduser(p)) for p in paths]
+        if not self.paths:
+            raise ValueError('expected at least one config file path')
+        if format not in (None, 'toml', 'ini'):
+            raise ValueError(f"expected format to be 'toml', 'ini', or None, not: {format!r}")
+        self.format = format
+        for path in self.paths:
+            fmt = self._get_format(path)
+            if fmt == 'toml' and tomllib is None:
+                raise ImportError('reading TOML config files requires Python 3.11+'
+                                  f' or the tomli package: {path!r}')
+        self._cache = {}
+
+    def _get_format(self, path):
+        if self.format:
+            return self.format
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            return _FORMAT_EXTS[ext]
+        except KeyError:
+            raise ValueError('could not infer config file format from extension,'
+                             f' expected one of {sorted(_FORMAT_EXTS)!r}: {path!r}')
+
+    def _parse_toml(self, data):
+        sections = OrderedDict()
+
+        def _add_section(path, table):
+            values = sections[path] = OrderedDict()
+            for key, value in table.items():
+                if isinstance(value, dict):
+                    _add_section(path + (_normalize_key(key),), value)
+                else:
+                    values[_normalize_key(key)] = value
+
+        _add_section((), tomllib.loads(data.decode('utf-8')))
+        return sections
+
+    def _parse_ini(self, data):
+        # no default_section, so that [DEFAULT] values are inherited
+        # by subcommand path, like TOML, and not by every section
+        cp = configparser.ConfigParser(interpolation=None, default_section='\x00')
+        cp.read_string(data.decode('utf-8'))
+        sections = OrderedDict()
+        for name in cp.sections():
+            values = sections.setdefault(_section_name_to_path(name), OrderedDict())
+            for key, value in cp.items(name, raw=True):
+                values[_normalize_key(key)] = value
+        return sections
+
+    def load(self, path):
+        """Returns a mapping of subcommand path tuples to mappings of
+        flag names to values, for the file at *path*. Returns ``None``
+        if the file does not exist.
+        """
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                stat_key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+                cached = self._cache.get(path)
+                if cached is not None and cached[0] == stat_key:
+                    return cached[1]
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as ose:
+            raise ArgumentParseError(f'failed to read config file "{path}": {ose.strerror}')
+
+        fmt = self._get_format(path)
+        try:
+            if fmt == 'toml':
+                sections = self._parse_toml(data)
+            else:
+                sections = self._parse_ini(data)
+        except (ValueError, configparser.Error) as e:
+            # tomllib.TOMLDecodeError and UnicodeDecodeError are ValueErrors
+            raise ArgumentParseError(f'failed to parse config file "{path}", got: {e!r}')
+
+        self._cache[path] = (stat_key, sections)
+        return sections
+
+    def get_values(self, subcmds=()):
+        """Returns an OrderedDict mapping each flag name set for the
+        subcommand path *subcmds* to a tuple of its value, the path of
+        the subcommand section where it was set, and the config file
+        path.
+        """
+        subcmds = tuple(subcmds)
+        section_paths = [subcmds[:i] for i in range(len(subcmds) + 1)]
+        ret = OrderedDict()
+        for path in self.paths:
+            sections = self.load(path)
+            if not sections:
+                continue
+            for section_path in section_paths:
+                for key, value in sections.get(section_path, {}).items():
+                    ret[key] = (value, section_path, path)
+        return ret
+
+    def get_origin_label(self, section_path, path):
+        "A description of where a value was set, for error messages."
+        return f'section {_get_section_label(section_path)} of config file "{path}"'
+
+    def __repr__(self):
+        return format_exp_repr(self, ['paths'], [], ['format'])
@@ -91,6 +91,19 @@ class InvalidPositionalArgument(ArgumentParseError):
         return cls('positional argument failed to parse %s'
                    ' %s: %r (got error: %r)' % (prep, type_desc, arg, exc))
 
+    @classmethod
+    def from_parse_many(cls, posargspec, failures, max_listed=5):
+        """Combines several failed positional arguments, as (arg,
+        exception) pairs, into a single error."""
+        if len(failures) == 1:
+            return cls.from_parse(posargspec, *failures[0])
+        prep, type_desc = face.utils.get_type_desc(posargspec.parse_as)
+        details = [f'{arg!r} (got error: {exc!r})' for arg, exc in failures[:max_listed]]
+        if len(failures) > max_listed:
+            details.append(f'and {len(failures) - max_listed} more')
+        return cls('%s positional arguments failed to parse %s %s: %s'
+                   % (len(failures), prep, type_desc, ', '.join(details)))
+
 
 class MissingRequiredFlags(ArgumentParseError):
     """
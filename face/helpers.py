@@ -1,51 +1,167 @@
 import os
 import sys
 import array
+import signal
 import textwrap
+import threading
+import contextlib
+from contextvars import ContextVar
+from unicodedata import combining, east_asian_width
 
 from boltons.iterutils import unique, split
+from boltons.typeutils import make_sentinel
+from boltons.strutils import strip_ansi
 
-from face.utils import format_flag_label, format_flag_post_doc, format_posargs_label, echo
+from face.utils import format_flag_label, format_flag_post_doc, format_posargs_label, echo, isatty
 from face.parser import Flag
 
 DEFAULT_HELP_FLAG = Flag('--help', parse_as=True, char='-h', doc='show this help message and exit')
 DEFAULT_MAX_WIDTH = 120
 
 
-def _get_termios_winsize():
+def _get_termios_winsize(stream=None):
     # TLPI, 62.9 (p. 1319)
     import fcntl
     import termios
 
+    stream = sys.stdout if stream is None else stream
     winsize = array.array('H', [0, 0, 0, 0])
 
-    assert not fcntl.ioctl(sys.stdout, termios.TIOCGWINSZ, winsize)
+    assert not fcntl.ioctl(stream, termios.TIOCGWINSZ, winsize)
 
     ws_row, ws_col, _, _ = winsize
+    assert ws_col, 'terminal reported zero width'
 
     return ws_row, ws_col
 
 
-def _get_environ_winsize():
+def _probe_termios_winsize():
+    # stdout is the one being formatted for, but when it's piped,
+    # another stream may still be attached to the user's terminal, as
+    # with progress lines drawn on stderr. probed once, then cached.
+    for stream in (sys.stdout, sys.stderr, sys.stdin):
+        if not isatty(stream):
+            continue  # no need to raise and catch an ioctl error
+        try:
+            return _get_termios_winsize(stream)
+        except Exception:
+            pass
+    try:
+        fd = os.open('/dev/tty', os.O_RDONLY)
+    except Exception:
+        return None
+    try:
+        return _get_termios_winsize(fd)
+    except Exception:
+        return None
+    finally:
+        os.close(fd)
+
+
+def _get_environ_winsize(environ=None):
     # the argparse approach. not sure which systems this works or
     # worked on, if any. ROWS/COLUMNS are special shell variables.
+    environ = os.environ if environ is None else environ
     try:
-        rows, columns = int(os.environ['ROWS']), int(os.environ['COLUMNS'])
-    except (KeyError, ValueError):
+        rows, columns = int(environ['ROWS']), int(environ['COLUMNS'])
+    except (KeyError, ValueError, TypeError):
         rows, columns = None, None
     return rows, columns
 
 
-def get_winsize():
-    rows, cols = None, None
+_NO_TERMINAL = make_sentinel('_NO_TERMINAL')
+_WINSIZE = None  # None (unknown), _NO_TERMINAL, or (rows, cols)
+_PREV_SIGWINCH_HANDLER = None
+# set by CommandChecker runs. process-wide, except for runs isolated by
+# context, whose variable is only read while any of them is pinning
+_PINNED_WINSIZE = None
+_CONTEXT_PINNED_WINSIZE = ContextVar('face_pinned_winsize', default=None)
+_CONTEXT_PIN_COUNT = 0
+_CONTEXT_PIN_LOCK = threading.Lock()
+
+
+def _handle_sigwinch(signum, frame):
+    invalidate_winsize()
+    if callable(_PREV_SIGWINCH_HANDLER):
+        _PREV_SIGWINCH_HANDLER(signum, frame)
+
+
+def _install_sigwinch_handler():
+    "Returns True if resizes will invalidate the cached window size."
+    global _PREV_SIGWINCH_HANDLER
+    sigwinch = getattr(signal, 'SIGWINCH', None)
+    if sigwinch is None:
+        return False
+    cur_handler = signal.getsignal(sigwinch)
+    if cur_handler is _handle_sigwinch:
+        return True
+    if threading.current_thread() is not threading.main_thread():
+        return False  # signal handlers can only be set from the main thread
     try:
-        rows, cols = _get_termios_winsize()
-    except Exception:
+        signal.signal(sigwinch, _handle_sigwinch)
+    except (ValueError, OSError):
+        return False
+    _PREV_SIGWINCH_HANDLER = cur_handler
+    return True
+
+
+def invalidate_winsize():
+    """Clear the cached terminal size used by :func:`get_winsize`. Called
+    automatically when the terminal is resized (on SIGWINCH)."""
+    global _WINSIZE
+    _WINSIZE = None
+
+
+@contextlib.contextmanager
+def _pin_winsize(winsize, per_context=False):
+    """Within the block, :func:`get_winsize` returns *winsize* without
+    probing, for the whole process, or just the current context if
+    *per_context* is True."""
+    global _PINNED_WINSIZE, _CONTEXT_PIN_COUNT
+    if not per_context:
+        prev_winsize, _PINNED_WINSIZE = _PINNED_WINSIZE, winsize
         try:
-            rows, cols = _get_environ_winsize()
-        except Exception:
-            pass
-    return rows, cols
+            yield
+        finally:
+            _PINNED_WINSIZE = prev_winsize
+        return
+    token = _CONTEXT_PINNED_WINSIZE.set(winsize)
+    with _CONTEXT_PIN_LOCK:
+        _CONTEXT_PIN_COUNT += 1
+    try:
+        yield
+    finally:
+        with _CONTEXT_PIN_LOCK:
+            _CONTEXT_PIN_COUNT -= 1
+        _CONTEXT_PINNED_WINSIZE.reset(token)
+
+
+def get_winsize():
+    """Returns a tuple of the terminal's (rows, columns), or (None,
+    None) if unknown. Falls back to the ``ROWS`` and ``COLUMNS``
+    environment variables when no terminal is found.
+
+    The terminal is probed once per process and the result cached,
+    with the cache invalidated on resize. Used by help formatting and
+    other terminal output, to fit the terminal width.
+    """
+    global _WINSIZE
+    pinned = _PINNED_WINSIZE
+    if pinned is None and _CONTEXT_PIN_COUNT:
+        pinned = _CONTEXT_PINNED_WINSIZE.get()
+    if pinned is not None:
+        return pinned
+    winsize = _WINSIZE
+    if winsize is None:
+        winsize = _probe_termios_winsize()
+        if winsize is None:
+            _WINSIZE = _NO_TERMINAL
+        elif _install_sigwinch_handler():
+            _WINSIZE = winsize
+    if winsize is None or winsize is _NO_TERMINAL:
+        # environment variables are cheap, and may change, so not cached
+        return _get_environ_winsize()
+    return winsize
 
 
 def get_wrap_width(max_width=DEFAULT_MAX_WIDTH):
@@ -57,6 +173,73 @@ def get_wrap_width(max_width=DEFAULT_MAX_WIDTH):
     return width
 
 
+_WRAP_WHITESPACE = '\t\n\x0b\x0c\r '
+_WRAP_WHITESPACE_TRANS = {ord(c): ' ' for c in _WRAP_WHITESPACE}
+_WIDE_EAW = ('W', 'F')
+
+
+def get_text_width(text):
+    """Returns the number of terminal columns *text* occupies, counting
+    East Asian wide characters as two columns, and ANSI escape
+    sequences and combining characters as zero."""
+    if text.isascii() and '\x1b' not in text:
+        return len(text)
+    text = strip_ansi(text)
+    width = 0
+    for char in text:
+        if combining(char):
+            continue
+        width += 2 if east_asian_width(char) in _WIDE_EAW else 1
+    return width
+
+
+def _wrap_text(text, width, indent=''):
+    """Wraps *text* to lines at most *width* columns wide, each
+    prefixed with *indent*, and returns a list of lines. Matches the
+    output of ``textwrap.wrap()`` (with both indents set) for ASCII
+    text, but with a single pass over the text, and measuring lines
+    with :func:`get_text_width`.
+
+    Falls back to textwrap in the rare cases it handles specially:
+    tabs, words too long for a line, and hyphenated words which
+    would start a line (textwrap can break after the hyphen).
+    """
+    avail = width - len(indent)
+    if '\t' in text or avail <= 0:
+        return textwrap.wrap(text, width, initial_indent=indent, subsequent_indent=indent)
+    text = text.translate(_WRAP_WHITESPACE_TRANS)
+    ascii_only = text.isascii() and '\x1b' not in text
+    get_width = len if ascii_only else get_text_width
+
+    lines = []
+    cur_line, cur_len, ws_len = [], 0, 0
+    for word in text.split(' '):
+        if not word:
+            ws_len += 1  # runs of whitespace are preserved within lines
+            continue
+        word_len = get_width(word)
+        if not cur_line:
+            # only reached for the first word, leading whitespace is kept
+            if ws_len + word_len > avail:
+                break
+            cur_line.append(' ' * ws_len + word)
+            cur_len = ws_len + word_len
+        elif cur_len + ws_len + word_len <= avail:
+            cur_line.append(' ' * ws_len + word)
+            cur_len += ws_len + word_len
+        else:
+            lines.append(indent + ''.join(cur_line))
+            if word_len > avail or '-' in word:
+                break
+            cur_line, cur_len = [word], word_len
+        ws_len = 1
+    else:
+        if cur_line:
+            lines.append(indent + ''.join(cur_line))
+        return lines
+    return textwrap.wrap(text, width, initial_indent=indent, subsequent_indent=indent)
+
+
 def _wrap_stout_pair(indent, label, sep, doc, doc_start, max_doc_width):
     # TODO: consider making the fill character configurable (ljust
     # uses space by default, the just() methods can only take
@@ -71,7 +254,7 @@ def _wrap_stout_pair(indent, label, sep, doc, doc_start, max_doc_width):
         return ret
 
     len_sep = len(sep)
-    wrapped_doc = textwrap.wrap(doc, max_doc_width)
+    wrapped_doc = _wrap_text(doc, max_doc_width)
     if len(lhs) <= doc_start:
         lhs_f = lhs.ljust(doc_start - len(sep)) + sep
         append(lhs_f + wrapped_doc[0])
@@ -92,10 +275,7 @@ def _wrap_stout_cmd_doc(indent, doc, max_width):
              split(doc.splitlines(), lambda l: not l.lstrip())
              if para]
     for para in paras:
-        part = textwrap.fill(text=para,
-                             width=(max_width - len(indent)),
-                             initial_indent=indent,
-                             subsequent_indent=indent)
+        part = '\n'.join(_wrap_text(para, width=(max_width - len(indent)), indent=indent))
         parts.append(part)
     return '\n\n'.join(parts)
 
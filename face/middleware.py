@@ -139,22 +139,79 @@ in a wide variety of ways. Other useful middleware ideas:
     ``try``/``except``, and add a flag (or environment variable) that
     enables a ``pdb.post_mortem()`` to drop you into a debug console.
 
+Caching provided values
+-----------------------
+
+When the same :class:`Command` is run many times in one process (a
+REPL, a server, a batch job), middleware that provides expensive but
+stable values, like parsed configuration or auth tokens, recomputes
+them on every run. Pass *cache* to memoize the values passed to
+``next_()``, keyed on the middleware's own injected arguments::
+
+  @face_middleware(provides=['config'], cache=MiddlewareCache(ttl=300))
+  def config_middleware(next_, config_path):
+      return next_(config=load_config(config_path))
+
+On a cache hit, the middleware function is skipped entirely, and the
+cached values are passed straight through to the next function in the
+chain. As such, caching is only appropriate for middleware which does
+no work after calling ``next_()``.
+
+Process-lifetime middleware
+---------------------------
+
+Some middleware sets up a resource before calling ``next_()``, and
+tears it down after, like a database connection pool or an HTTP
+session. In a long-lived process, reconnecting on every run is
+wasteful. Declare ``lifetime='process'`` to set up once, and reuse
+the provided values across runs::
+
+  @face_middleware(provides=['db'], lifetime='process')
+  def db_middleware(next_, db_url):
+      pool = connect_pool(db_url)
+      try:
+          return next_(db=pool)
+      finally:
+          pool.close()
+
+The first run calls the middleware in a background thread, which is
+suspended inside its call to ``next_()``, while the values it passed
+are provided to the rest of the chain. Later runs with the same
+injected arguments reuse those values without calling the middleware
+at all. Teardown happens in :meth:`Command.close()`, or at interpreter
+exit, when ``next_()`` returns ``None`` and the rest of the middleware
+runs as usual. Because setup and teardown run in their own thread,
+process-lifetime middleware should not depend on thread-local state.
+
 The possibilities never end. If you build a middleware of particularly
 broad usefulness, consider contributing it back to the core!
 
 """
 
 
+import os
+import time
+import atexit
+import threading
+from threading import Lock, RLock
+from collections import OrderedDict
+
+from boltons.typeutils import make_sentinel
+
 from face.parser import Flag
+from face.utils import echo
 from face.sinter import make_chain, get_arg_names, get_fb, get_callable_labels
 from face.sinter import inject  # transitive import for external use
 from typing import Callable, List, Optional, Union
 
 INNER_NAME = 'next_'
+_MISSING = make_sentinel('_MISSING')
+LIFETIMES = ('invocation', 'process')
+DEFAULT_MAX_RESOURCES = 16  # per process-lifetime middleware, per Command
 
 _BUILTIN_PROVIDES = [INNER_NAME, 'args_', 'cmd_', 'subcmds_',
                      'flags_', 'posargs_', 'post_posargs_',
-                     'command_', 'subcommand_']
+                     'command_', 'subcommand_', 'progress_']
 
 
 def is_middleware(target):
@@ -172,11 +229,307 @@ def is_middleware(target):
     return False
 
 
+class MiddlewareCache:
+    """A size-bounded, least-recently-used cache for values provided
+    by middleware. Pass an instance to :func:`face_middleware` as
+    *cache* to memoize the values a middleware passes to ``next_()``
+    across multiple runs of a :class:`Command` in the same process.
+
+    Entries are keyed on the values of the middleware's injected
+    arguments (everything but ``next_``). Runs with unhashable
+    argument values bypass the cache.
+
+    Args:
+       max_size (int): The maximum number of entries to keep before
+          evicting the least recently used. Defaults to 128.
+       ttl (float): Number of seconds after which an entry
+          expires. Defaults to ``None``, meaning entries never expire.
+
+    The ``hit_count``, ``miss_count``, and ``evict_count`` attributes
+    count cache activity, for observability. This type is
+    threadsafe.
+    """
+    def __init__(self, max_size: int = 128, ttl: Optional[float] = None) -> None:
+        if max_size < 1:
+            raise ValueError(f'expected max_size >= 1, not: {max_size!r}')
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f'expected positive ttl or None, not: {ttl!r}')
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hit_count = self.miss_count = self.evict_count = 0
+        self._lock = RLock()
+        self._entries = OrderedDict()  # key -> (expiry, value)
+
+    @staticmethod
+    def make_key(arg_map):
+        "Returns a hashable key for *arg_map*, or ``None`` if unhashable."
+        key = tuple(sorted(arg_map.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key, default=None):
+        "Get the value stored for *key*, counting a hit or miss."
+        with self._lock:
+            expiry, value = self._entries.get(key, (None, _MISSING))
+            if value is not _MISSING and expiry is not None and expiry < time.monotonic():
+                del self._entries[key]
+                value = _MISSING
+            if value is _MISSING:
+                self.miss_count += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hit_count += 1
+            return value
+
+    def set(self, key, value):
+        "Store *value* for *key*, evicting the oldest entries as needed."
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evict_count += 1
+        return
+
+    def invalidate(self, **arg_map):
+        """Remove the entry for the injected arguments in *arg_map*. Returns
+        True if an entry was removed. Call with no arguments to remove
+        the entry of a middleware which takes no arguments, or see
+        :meth:`clear()` to remove all entries.
+        """
+        key = self.make_key(arg_map)
+        with self._lock:
+            return self._entries.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        "Remove all entries. Counters are left as-is."
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return ('<%s max_size=%r ttl=%r size=%r hit_count=%r miss_count=%r>'
+                % (cn, self.max_size, self.ttl, len(self), self.hit_count, self.miss_count))
+
+
+class _CachedMiddleware:
+    """Stands in for a middleware with a *cache* in the compiled
+    middleware chain. Shares the wrapped middleware's signature (see
+    sinter.get_fb) so it can be called exactly as the middleware would.
+    """
+    def __init__(self, mw):
+        self.mw = mw
+        self.cache = mw._face_cache
+        self._sinter_fb = get_fb(mw)
+
+    def __call__(self, next_, **kwargs):
+        __traceback_hide__ = True
+        cache = self.cache
+        key = cache.make_key(kwargs)
+        if key is None:
+            return self.mw(next_=next_, **kwargs)
+        provided = cache.get(key, _MISSING)
+        if provided is not _MISSING:
+            return next_(**provided)
+
+        def _caching_next(**provided):
+            __traceback_hide__ = True
+            cache.set(key, provided)
+            return next_(**provided)
+
+        return self.mw(next_=_caching_next, **kwargs)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} mw={self.mw!r} cache={self.cache!r}>'
+
+
+class _Resource:
+    """One setup of a process-lifetime middleware, suspended in its own
+    thread inside its call to ``next_()``, until closed.
+    """
+    def __init__(self, mw, kwargs):
+        self.pid = os.getpid()
+        self.provided = None
+        self.returned = None
+        self.exc = None
+        self.suspended = False
+        self.closed = False
+        self._ready = threading.Event()
+        self._release = threading.Event()
+        # daemon, as non-daemon threads are joined before atexit runs
+        name = 'face-middleware-' + getattr(mw, '__name__', type(mw).__name__)
+        self._thread = threading.Thread(target=self._run, args=(mw, kwargs), name=name, daemon=True)
+
+    def _run(self, mw, kwargs):
+        def _suspend(**provided):
+            self.provided = provided
+            self.suspended = True
+            self._ready.set()
+            self._release.wait()
+            return None
+
+        try:
+            ret = mw(next_=_suspend, **kwargs)
+            if not self.suspended:
+                self.returned = ret  # middleware ended the run early
+        except BaseException as be:
+            self.exc = be
+        finally:
+            self._ready.set()
+
+    def start(self):
+        "Run setup, raising any exception it raised."
+        self._thread.start()
+        self._ready.wait()
+        if not self.suspended and self.exc is not None:
+            raise self.exc
+
+    def close(self):
+        "Run teardown, raising any exception it raised."
+        if self.closed or not self.suspended:
+            return
+        self.closed = True
+        if self.pid != os.getpid():
+            return  # a forked copy, teardown belongs to the parent
+        self._release.set()
+        self._thread.join()
+        if self.exc is not None:
+            raise self.exc
+
+
+_OPEN_RESOURCES = []
+_OPEN_RESOURCES_LOCK = Lock()
+
+
+def _close_open_resources():
+    with _OPEN_RESOURCES_LOCK:
+        open_resources = list(reversed(_OPEN_RESOURCES))
+        del _OPEN_RESOURCES[:]
+    for resources in open_resources:
+        try:
+            resources.close()
+        except Exception as e:
+            echo.err(f'warning: failed to tear down middleware {resources.mw!r}: {e!r}')
+
+
+atexit.register(_close_open_resources)
+
+
+class _ProcessResources:
+    """The live setups of one process-lifetime middleware, keyed on
+    its injected arguments, like :class:`MiddlewareCache`. Each setup
+    holds a thread, so past *max_size* setups, the least recently used
+    is torn down.
+    """
+    def __init__(self, mw, max_size=DEFAULT_MAX_RESOURCES):
+        self.mw = mw
+        self.max_size = max_size
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, arg_map):
+        """Returns the started :class:`_Resource` for *arg_map*, setting
+        one up if needed, or ``None`` if *arg_map* is unhashable.
+        """
+        key = MiddlewareCache.make_key(arg_map)
+        if key is None:
+            return None
+        evicted = []
+        with self._lock:
+            res = self._entries.get(key)
+            if res is not None and res.pid == os.getpid():
+                self._entries.move_to_end(key)
+                return res
+            res = _Resource(self.mw, arg_map)
+            res.start()
+            if res.suspended:
+                self._entries[key] = res
+                while len(self._entries) > self.max_size:
+                    evicted.append(self._entries.popitem(last=False)[1])
+                self._register()
+        for old_res in evicted:
+            try:
+                old_res.close()
+            except Exception as e:
+                echo.err(f'warning: failed to tear down middleware {self.mw!r}: {e!r}')
+        return res
+
+    def _register(self):
+        with _OPEN_RESOURCES_LOCK:
+            if self not in _OPEN_RESOURCES:
+                _OPEN_RESOURCES.append(self)
+
+    def close(self):
+        """Tear down all setups, most recent first. Raises the first
+        exception raised by teardown, after attempting all of them.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        with _OPEN_RESOURCES_LOCK:
+            if self in _OPEN_RESOURCES:
+                _OPEN_RESOURCES.remove(self)
+        first_exc = None
+        for res in reversed(entries):
+            try:
+                res.close()
+            except Exception as e:
+                first_exc = first_exc or e
+        if first_exc is not None:
+            raise first_exc
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _ProcessMiddleware:
+    """Stands in for a middleware with ``lifetime='process'`` in the
+    compiled middleware chain, like :class:`_CachedMiddleware`.
+    """
+    def __init__(self, mw, resources):
+        self.mw = mw
+        self.resources = resources
+        self._sinter_fb = get_fb(mw)
+
+    def __call__(self, next_, **kwargs):
+        __traceback_hide__ = True
+        res = self.resources.get(kwargs)
+        if res is None:
+            # unhashable arguments, fall back to a per-run setup
+            return self.mw(next_=next_, **kwargs)
+        if not res.suspended:
+            return res.returned
+        return next_(**res.provided)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} mw={self.mw!r}>'
+
+
+def _wrap_middleware(mw, resource_map):
+    if getattr(mw, '_face_lifetime', None) == 'process':
+        resources = resource_map.get(id(mw))
+        if resources is None:
+            resources = resource_map[id(mw)] = _ProcessResources(mw)
+        return _ProcessMiddleware(mw, resources)
+    if getattr(mw, '_face_cache', None) is not None:
+        return _CachedMiddleware(mw)
+    return mw
+
+
 def face_middleware(func: Optional[Callable] = None, 
                    *,
                    provides: Union[List[str], str] = [],
                    flags: List[Flag] = [],
-                   optional: bool = False) -> Callable:
+                   optional: bool = False,
+                   cache: Union[bool, int, MiddlewareCache] = False,
+                   lifetime: str = 'invocation') -> Callable:
     """A decorator to mark a function as face middleware, which wraps
     execution of a subcommand handler function. This decorator can be
     called with or without arguments:
@@ -188,6 +541,25 @@ def face_middleware(func: Optional[Callable] = None,
            automatically added to any Command which adds this middleware.
         optional: Whether this middleware should be skipped if its 
            provides are not required by the command.
+        cache: Pass ``True``, a maximum size, or a
+           :class:`MiddlewareCache` instance to memoize the values this
+           middleware provides, keyed on its injected arguments. Cache
+           hits skip the middleware function entirely. Defaults to
+           ``False``.
+        lifetime: ``'invocation'`` (the default) to call the
+           middleware on every run, or ``'process'`` to set it up once
+           and reuse its provided values across runs, until
+           :meth:`Command.close()` or interpreter exit. Each Command
+           keeps its own setups, one per distinct set of injected
+           arguments, up to 16, past which the least recently used is
+           torn down. Cannot be combined with *cache*. Note that setup
+           and teardown run in a background thread, which waits inside
+           ``next_()`` between them, while handlers use the provided
+           values from the thread running the command. Values tied to
+           the thread which created them, like :mod:`sqlite3`
+           connections (unless made with ``check_same_thread=False``)
+           or :class:`threading.local` state, won't work across that
+           boundary, and should use the default lifetime instead.
 
     The first argument of the decorated function must be named
     "next_". This argument is a function, representing the next
@@ -205,12 +577,27 @@ def face_middleware(func: Optional[Callable] = None,
             if not isinstance(flag, Flag):
                 raise TypeError(f'expected Flag object, not: {flag!r}')
 
+    if cache is True:
+        cache = MiddlewareCache()
+    elif cache is False or cache is None:
+        cache = None
+    elif isinstance(cache, int):
+        cache = MiddlewareCache(max_size=cache)
+    elif not isinstance(cache, MiddlewareCache):
+        raise TypeError(f'expected bool, int, or MiddlewareCache instance for cache, not: {cache!r}')
+    if lifetime not in LIFETIMES:
+        raise ValueError(f'expected lifetime to be one of {LIFETIMES!r}, not: {lifetime!r}')
+    if lifetime == 'process' and cache is not None:
+        raise ValueError("lifetime='process' middleware values are already reused, cannot also set cache")
+
     def decorate_face_middleware(func):
         check_middleware(func, provides=provides)
         func.is_face_middleware = True
         func._face_flags = list(flags)
         func._face_provides = list(provides)
         func._face_optional = optional
+        func._face_cache = cache
+        func._face_lifetime = lifetime
         return func
 
     if func and callable(func):
@@ -219,7 +606,11 @@ def face_middleware(func: Optional[Callable] = None,
     return decorate_face_middleware
 
 
-def get_middleware_chain(middlewares, innermost, preprovided):
+def _get_label(func):
+    return getattr(func, '__name__', None) or type(func).__name__
+
+
+def get_middleware_chain(middlewares, innermost, preprovided, trace=False, resources=None):
     """Perform basic validation of innermost function, wrap it in
     middlewares, and raise a :exc:`NameError` on any unresolved
     arguments.
@@ -231,6 +622,12 @@ def get_middleware_chain(middlewares, innermost, preprovided):
           middlewares.
        preprovided (list): A list of built-in or otherwise preprovided
           injectables.
+       trace (bool): Wrap each middleware and the innermost function
+          to record spans in traced runs. See :mod:`face.tracing`.
+       resources (dict): Where to keep the live setups of middlewares
+          with ``lifetime='process'``, keyed by middleware ``id()``, so
+          that their owner can tear them down. Defaults to a new dict,
+          reachable only through the returned chain.
 
     Returns:
        A single function representing the whole middleware chain.
@@ -245,6 +642,14 @@ def get_middleware_chain(middlewares, innermost, preprovided):
 
     mw_builtins = set(preprovided) - {INNER_NAME}
     mw_provides = [list(mw._face_provides) for mw in middlewares]
+    resources = {} if resources is None else resources
+    if trace:
+        from face.tracing import SpanWrapper
+        middlewares = [SpanWrapper(_wrap_middleware(mw, resources), 'middleware ' + _get_label(mw), 'middleware')
+                       for mw in middlewares]
+        innermost = SpanWrapper(innermost, 'handler ' + _get_label(innermost), 'handler')
+    else:
+        middlewares = [_wrap_middleware(mw, resources) for mw in middlewares]
 
     mw_chain, mw_chain_args, mw_unres = make_chain(middlewares, mw_provides, innermost, mw_builtins, INNER_NAME)
 
@@ -1,13 +1,19 @@
 import sys
+import copy
+import stat
+import array
 import shlex
 import codecs
 import os.path
+from bisect import bisect_left
 from collections import OrderedDict
+from contextvars import ContextVar
 from typing import Optional
 
-from boltons.iterutils import split, unique
+from boltons.iterutils import split, unique, chunked
 from boltons.dictutils import OrderedMultiDict as OMD
 from boltons.funcutils import format_exp_repr, format_nonexp_repr
+from boltons.typeutils import make_sentinel
 
 from face.utils import (ERROR,
                         get_type_desc,
@@ -15,6 +21,7 @@ from face.utils import (ERROR,
                         normalize_flag_name,
                         process_command_name,
                         get_minimal_executable)
+from face.config import ConfigFile
 from face.errors import (FaceException,
                          ArgumentParseError,
                          ArgumentArityError,
@@ -26,6 +33,18 @@ from face.errors import (FaceException,
                          MissingRequiredFlags)
 
 
+# set to a face.tracing.Tracer while a traced run is in progress
+_ACTIVE_TRACER = ContextVar('face_active_tracer', default=None)
+
+
+def _convert_flag_value(flag, parse_as, text):
+    tracer = _ACTIVE_TRACER.get()
+    if tracer is None:
+        return parse_as(text)
+    with tracer.span('flag ' + flag.name, 'parse', {'flag': flag.name}):
+        return parse_as(text)
+
+
 def _arg_to_subcmd(arg):
     return arg.lower().replace('-', '_')
 
@@ -97,6 +116,13 @@ def _posargs_to_provides(posargspec, posargs):
                        % (posargspec, posargs))  # pragma: no cover (shouldn't get here)
 
 
+def _freeze_posargs(parsed_posargs):
+    # lazy posargs are left for the handler to consume
+    if isinstance(parsed_posargs, PosArgIterator):
+        return parsed_posargs
+    return tuple(parsed_posargs)
+
+
 class CommandParseResult:
     """The result of :meth:`Parser.parse`, instances of this type
     semantically store all that a command line can contain. Each
@@ -115,6 +141,13 @@ class CommandParseResult:
        argv (tuple): The sequence of strings parsed by the Parser to
           yield this result. Defaults to ``()``.
 
+    After parsing, the ``flag_sources`` attribute maps each flag name
+    to where its value came from: ``'argv'``, ``'flagfile'``, ``'env'``,
+    ``'config'`` (see :class:`~face.ConfigFile`), or ``'missing'``, for
+    flags set to their default. The first source with a value wins, in
+    order: argv, flagfiles, the environment, config files, then the
+    flag's default.
+
     Instances of this class can be injected by accepting the "args_"
     builtin in their Command handler function.
 
@@ -128,33 +161,44 @@ class CommandParseResult:
         self.flags = None  # OrderedDict
         self.posargs = None  # tuple
         self.post_posargs = None  # tuple
+        self.flag_sources = None  # OrderedDict
 
-    def to_cmd_scope(self):
-        "returns a dict which can be used as kwargs in an inject call"
-        _subparser = self.parser.subprs_map[self.subcmds] if self.subcmds else self.parser
+    def get_subparser(self):
+        "returns the Parser for the subcommand path in this result"
+        return self.parser.subprs_map[self.subcmds] if self.subcmds else self.parser
 
+    def get_cmd_name(self):
+        "returns the command as it was invoked, as used in help output"
         if not self.argv:
-            cmd_ = self.parser.name
-        else:
-            cmd_ = self.argv[0]
-            path, basename = os.path.split(cmd_)
-            if basename == '__main__.py':
-                pkg_name = os.path.basename(path)
-                executable_path = get_minimal_executable()
-                cmd_ = f'{executable_path} -m {pkg_name}'
+            return self.parser.name
+        cmd_ = self.argv[0]
+        path, basename = os.path.split(cmd_)
+        if basename == '__main__.py':
+            pkg_name = os.path.basename(path)
+            executable_path = get_minimal_executable()
+            cmd_ = f'{executable_path} -m {pkg_name}'
+        return cmd_
+
+    def to_cmd_scope(self, names=None):
+        """returns a dict which can be used as kwargs in an inject call
+
+        Pass a collection of *names* to skip computing builtins which
+        won't be used. Defaults to None, returning all builtins.
+        """
+        prs = self.get_subparser()
 
         ret = {'args_': self,
-               'cmd_': cmd_,
                'subcmds_': self.subcmds,
                'flags_': self.flags,
                'posargs_': self.posargs,
                'post_posargs_': self.post_posargs,
-               'subcommand_': _subparser,
+               'subcommand_': prs,
                'command_': self.parser}
+        if names is None or 'cmd_' in names:
+            ret['cmd_'] = self.get_cmd_name()
         if self.flags:
             ret.update(self.flags)
 
-        prs = self.parser if not self.subcmds else self.parser.subprs_map[self.subcmds]
         if prs.posargs.provides:
             posargs_provides = _posargs_to_provides(prs.posargs, self.posargs)
             ret[prs.posargs.provides] = posargs_provides
@@ -205,13 +249,23 @@ class Flag:
          generation. Pass False to hide the flag, pass a string to
          customize the label, and pass a FlagDisplay instance for full
          customizability.
+       env (str): The name of an environment variable to read the
+         flag's argument from, when the flag is not passed on the
+         command line or in a flagfile. The value is parsed just like
+         an argument on the command line. For flags which take no
+         argument, values like ``1``, ``true``, and ``yes`` set the
+         flag, and values like ``0``, ``false``, and ``no`` are treated
+         as if the variable were not set. Defaults to ``None``.
     """
     def __init__(self, name, parse_as=str, missing=None, multi='error',
-                 char=None, doc=None, display=None):
+                 char=None, doc=None, display=None, env=None):
         self.name = flag_to_identifier(name)
         self.doc = doc
         self.parse_as = parse_as
         self.missing = missing
+        if env is not None and (not isinstance(env, str) or not env or '=' in env):
+            raise ValueError(f'expected env to be an environment variable name, not: {env!r}')
+        self.env = env
         if missing is ERROR and not callable(parse_as):
             raise ValueError('cannot make an argument-less flag required.'
                              ' expected non-ERROR for missing, or a callable'
@@ -249,8 +303,8 @@ class Flag:
         self.display = display
 
     def __repr__(self):
-        return format_nonexp_repr(self, ['name', 'parse_as'], ['missing', 'multi'],
-                                  opt_key=lambda v: v not in (None, _multi_error))
+        return format_nonexp_repr(self, ['name', 'parse_as'], ['missing', 'multi', 'env'],
+                                  opt_key=lambda v: v is None or v is _multi_error)
 
 
 class FlagDisplay:
@@ -387,13 +441,28 @@ class PosArgSpec:
        name (str): A shortcut to set *display* name and *provides*
        count (int): A shortcut to set min_count and max_count to a single value
           when an exact number of arguments should be specified.
+       response_files (bool): Pass True to expand arguments of the form
+          ``@path`` into the arguments listed in the file at *path*,
+          one per line. ``@-`` reads arguments from stdin, and ``@@``
+          escapes a literal leading ``@``. Useful for argument lists
+          too long for the command line. Defaults to False.
+       nul_delimited (bool): Pass True to read response files as
+          NUL-delimited, as written by ``find -print0``, instead of
+          newline-delimited. Defaults to False.
+       lazy (bool): Pass True to receive positional arguments as a
+          :class:`PosArgIterator`, which reads response files and
+          parses each argument only as it is iterated over, instead
+          of a list. Counts are checked as iteration proceeds. Useful
+          for processing very long lists of arguments without holding
+          them all in memory. Defaults to False.
 
     PosArgSpec instances are stateless and safe to be used multiple
     times around the application.
 
     """
     def __init__(self, parse_as=str, min_count=None, max_count=None, display=None, provides=None, 
-                 *, name: Optional[str] = None, count: Optional[int] = None):
+                 *, name: Optional[str] = None, count: Optional[int] = None,
+                 response_files: bool = False, nul_delimited: bool = False, lazy: bool = False):
         if not callable(parse_as) and parse_as is not ERROR:
             raise TypeError(f'expected callable or ERROR for parse_as, not {parse_as!r}')
 
@@ -414,6 +483,13 @@ class PosArgSpec:
             raise ValueError('expected min_count > max_count, not: %r > %r'
                              % (self.min_count, self.max_count))
 
+        self.response_files = response_files
+        self.nul_delimited = nul_delimited
+        self.lazy = lazy
+        if lazy and self.max_count == 1:
+            raise ValueError('expected max_count > 1 for lazy positional arguments,'
+                             ' not: %r' % self.max_count)
+
         provides = name if provides is None else provides
         self.provides = provides
 
@@ -445,6 +521,35 @@ class PosArgSpec:
         """
         return self.parse_as is not ERROR
 
+    def _get_arg_range_text(self):
+        min_count, max_count = self.min_count, self.max_count
+        if min_count == max_count:
+            # min_count must be >0 because max_count cannot be 0
+            arg_range_text = f'{min_count} argument'
+            if min_count > 1:
+                arg_range_text += 's'
+        else:
+            if min_count == 0:
+                arg_range_text = f'up to {max_count} argument'
+                arg_range_text += 's' if (max_count and max_count > 1) else ''
+            elif max_count is None:
+                arg_range_text = f'at least {min_count} argument'
+                arg_range_text += 's' if min_count > 1 else ''
+            else:
+                arg_range_text = f'{min_count} - {max_count} arguments'
+        return arg_range_text
+
+    def _iter_args(self, posargs):
+        "Yields posargs, expanding response files, if enabled."
+        for arg in posargs:
+            if not self.response_files or not arg.startswith('@'):
+                yield arg
+            elif arg.startswith('@@'):
+                yield arg[1:]
+            else:
+                yield from _iter_response_file(arg[1:], self.nul_delimited)
+        return
+
     def parse(self, posargs):
         """Parse a list of strings as positional arguments.
 
@@ -458,34 +563,33 @@ class PosArgSpec:
         Raises InvalidPositionalArgument if the argument doesn't match
         the configured *parse_as*. See PosArgSpec for more info.
 
-        Returns a list of arguments, parsed with *parse_as*.
+        Returns a list of arguments, parsed with *parse_as*, or a
+        :class:`PosArgIterator` if *lazy* is set.
         """
-        len_posargs = len(posargs)
         if posargs and not self.accepts_args:
             # TODO: check for likely subcommands
             raise ArgumentArityError(f'unexpected positional arguments: {posargs!r}')
-        min_count, max_count = self.min_count, self.max_count
-        if min_count == max_count:
-            # min_count must be >0 because max_count cannot be 0
-            arg_range_text = f'{min_count} argument'
-            if min_count > 1:
-                arg_range_text += 's'
-        else:
-            if min_count == 0:
-                arg_range_text = f'up to {max_count} argument'
-                arg_range_text += 's' if (max_count and max_count > 1) else ''
-            elif max_count is None:
-                arg_range_text = f'at least {min_count} argument'
-                arg_range_text += 's' if min_count > 1 else ''
-            else:
-                arg_range_text = f'{min_count} - {max_count} arguments'
+        if self.lazy:
+            return PosArgIterator(self, self._iter_args(posargs))
+        if self.response_files:
+            posargs = list(self._iter_args(posargs))
 
+        len_posargs = len(posargs)
+        min_count, max_count = self.min_count, self.max_count
         if len_posargs < min_count:
             raise ArgumentArityError('too few arguments, expected %s, got %s'
-                                     % (arg_range_text, len_posargs))
+                                     % (self._get_arg_range_text(), len_posargs))
         if max_count is not None and len_posargs > max_count:
             raise ArgumentArityError('too many arguments, expected %s, got %s'
-                                     % (arg_range_text, len_posargs))
+                                     % (self._get_arg_range_text(), len_posargs))
+
+        parse_many = getattr(self.parse_as, 'parse_many', None)
+        if parse_many is not None:
+            # batch-capable parsers validate everything, reporting all failures at once
+            ret, failures = parse_many(posargs)
+            if failures:
+                raise InvalidPositionalArgument.from_parse_many(self, failures)
+            return ret
         ret = []
         for pa in posargs:
             try:
@@ -497,6 +601,101 @@ class PosArgSpec:
         return ret
 
 
+_MISSING_SOURCE = make_sentinel('_MISSING_SOURCE')
+_SOURCE_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+_SOURCE_FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+
+_RESPONSE_FILE_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_response_file(path, nul_delimited=False):
+    if not path:
+        raise ArgumentParseError('expected path after "@" for response file')
+    label = 'stdin' if path == '-' else f'"{path}"'
+    try:
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    except OSError as ose:
+        raise ArgumentParseError(f'failed to read response file {label}: {ose.strerror}')
+    try:
+        if nul_delimited:
+            remainder = ''
+            while True:
+                chunk = f.read(_RESPONSE_FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                parts = (remainder + chunk).split('\0')
+                remainder = parts.pop()
+                yield from (p for p in parts if p)
+            if remainder:
+                yield remainder
+        else:
+            for line in f:
+                line = line.rstrip('\r\n')
+                if line:
+                    yield line
+    except (OSError, UnicodeError) as ee:
+        raise ArgumentParseError(f'failed to read response file {label}, got: {ee!r}')
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return
+
+
+class PosArgIterator:
+    """An iterator over positional arguments, returned by
+    :meth:`PosArgSpec.parse()` when the PosArgSpec is *lazy*. Each
+    argument is parsed as it is reached, and counts are checked as
+    iteration proceeds, raising the same errors as a regular parse,
+    just later. Can only be iterated over once.
+
+    Errors raised while iterating in a handler called by
+    :meth:`Command.run()` are reported just like any other argument
+    error. These errors have a *posarg_iter* attribute set to the
+    iterator that raised them, distinguishing them from any other
+    parse errors raised by the handler.
+    """
+    def __init__(self, posargspec, args):
+        self.posargspec = posargspec
+        self.count = 0
+        self._args = iter(args)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        spec = self.posargspec
+        try:
+            arg = next(self._args)
+        except ArgumentParseError as ape:
+            raise self._tag(ape)  # e.g., an unreadable response file
+        except StopIteration:
+            if self.count < spec.min_count:
+                raise self._tag(ArgumentArityError('too few arguments, expected %s, got %s'
+                                                   % (spec._get_arg_range_text(), self.count)))
+            raise
+        self.count += 1
+        if spec.max_count is not None and self.count > spec.max_count:
+            raise self._tag(ArgumentArityError('too many arguments, expected %s, got at least %s'
+                                               % (spec._get_arg_range_text(), self.count)))
+        try:
+            return spec.parse_as(arg)
+        except Exception as exc:
+            raise self._tag(InvalidPositionalArgument.from_parse(spec, arg, exc))
+
+    def _tag(self, ape):
+        ape.posarg_iter = self
+        return ape
+
+    def __repr__(self):
+        return format_nonexp_repr(self, ['posargspec', 'count'])
+
+
+class _Fallback(Exception):
+    """Raised by parsers generated with :mod:`face.codegen` to hand off to
+    the generic Parser.parse()."""
+
+
 FLAGFILE_ENABLED = Flag('--flagfile', parse_as=str, multi='extend', missing=None, display=False, doc='')
 
 
@@ -553,12 +752,15 @@ class Parser:
           flagfile support. Pass a :class:`Flag` instance to use a
           custom flag instead of ``--flagfile``. Read more about
           Flagfiles below.
+       configfile: A path, or list of paths, of TOML or INI config
+          files from which to read flag values, or a
+          :class:`~face.config.ConfigFile` instance. Defaults to None.
 
     Once initialized, parsing is performed by calling
     :meth:`Parser.parse()` with ``sys.argv`` or any other list of strings.
     """
     def __init__(self, name, doc=None, flags=None, posargs=None,
-                 post_posargs=None, flagfile=True):
+                 post_posargs=None, flagfile=True, configfile=None):
         self.name = process_command_name(name)
         self.doc = doc
         flags = list(flags or [])
@@ -576,9 +778,18 @@ class Parser:
             raise TypeError('expected True, False, or Flag instance for'
                             ' flagfile, not: %r' % flagfile)
 
+        if configfile is not None and not isinstance(configfile, ConfigFile):
+            configfile = ConfigFile(configfile)
+        self.configfile = configfile
+
         self.subprs_map = OrderedDict()
         self._path_flag_map = OrderedDict()
         self._path_flag_map[()] = OrderedDict()
+        # see clone() and _unshare()
+        self._cow_shared = False
+        self._mounted_flag_maps = {}
+        # env var name -> flag, per path, built on first parse. reset on add()
+        self._path_env_map = {}
 
         for flag in flags:
             self.add(flag)
@@ -586,6 +797,10 @@ class Parser:
             self.add(self.flagfile_flag)
         return
 
+    def _get_builtin_flags(self):
+        "Flags face itself adds and handles, rather than a handler's."
+        return [self.flagfile_flag] if self.flagfile_flag else []
+
     def get_flag_map(self, path, with_hidden=True):
         flag_map = self._path_flag_map[path]
         return OrderedDict([(k, f) for k, f in flag_map.items()
@@ -601,12 +816,51 @@ class Parser:
         return ('<%s name=%r subcmd_count=%r flag_count=%r posargs=%r>'
                 % (cn, self.name, len(self.subprs_map), len(self.get_flags()), self.posargs))
 
+    # maps of subcommand path to per-path state, shared between clones
+    _cow_attrs = ('subprs_map', '_path_flag_map')
+
+    def clone(self, name=None, doc=None):
+        """Returns a copy of this parser, with a new *name* and *doc*, if
+        passed. Use clones to add the same subcommand under more than
+        one name, or to more than one parent.
+
+        Clones share their subcommands and flags with the original
+        until either is changed with :meth:`add()`, so cloning is cheap,
+        even for large subcommand trees. Adding several clones of the
+        same subcommand to a parser also shares their flags, so memory
+        use grows with the number of distinct subcommands, not the
+        number of names they're added under.
+        """
+        ret = copy.copy(self)
+        if name is not None:
+            ret.name = process_command_name(name)
+        if doc is not None:
+            ret.doc = doc
+        self._cow_shared = ret._cow_shared = True
+        return ret
+
+    def _unshare(self):
+        # copy-on-write: called before any change to the per-path maps
+        if not self._cow_shared:
+            return
+        for attr in self._cow_attrs:
+            setattr(self, attr, OrderedDict(getattr(self, attr)))
+        # flag maps are changed in place, so copy them too, keeping
+        # any sharing between paths
+        copied = {}
+        for path, flag_map in self._path_flag_map.items():
+            if id(flag_map) not in copied:
+                copied[id(flag_map)] = OrderedDict(flag_map)
+            self._path_flag_map[path] = copied[id(flag_map)]
+        self._mounted_flag_maps = {}
+        self._cow_shared = False
+
     def _add_subparser(self, subprs):
         """Process subcommand name, check for subcommand conflicts, check for
         subcommand flag conflicts, then finally add subcommand.
 
-        To add a command under a different name, simply make a copy of
-        that parser or command with a different name.
+        To add a command under a different name, add a clone() of it
+        with the new name.
         """
         if self.posargs.accepts_args:
             raise ValueError('commands accepting positional arguments'
@@ -633,10 +887,19 @@ class Parser:
             new_path = (subprs_name,) + path
             self.subprs_map[new_path] = cur_subprs
 
-        # Flags inherit down (a parent's flags are usable by the child)
+        # Flags inherit down (a parent's flags are usable by the
+        # child). Clones of the same subparser share flag maps, so the
+        # merged maps are shared, too. Flag maps only grow, so their
+        # lengths serve as versions.
+        mounted = self._mounted_flag_maps
         for path, flags in subprs._path_flag_map.items():
-            new_flags = parent_flag_map.copy()
-            new_flags.update(flags)
+            key = (id(flags), len(flags), len(parent_flag_map))
+            try:
+                _, new_flags = mounted[key]
+            except KeyError:
+                new_flags = parent_flag_map.copy()
+                new_flags.update(flags)
+                mounted[key] = (flags, new_flags)  # flags kept, so the id stays unique
             self._path_flag_map[(subprs_name,) + path] = new_flags
 
         # If two flags have the same name, as long as the "parse_as"
@@ -656,6 +919,8 @@ class Parser:
         Parser, Flag, or Flag parameters. ValueError may also be
         raised on duplicate definitions and other conflicts.
         """
+        self._unshare()
+        self._path_env_map = {}  # new, rather than cleared, as clones share it
         if isinstance(a[0], Parser):
             subprs = a[0]
             self._add_subparser(subprs)
@@ -757,7 +1022,10 @@ class Parser:
             cpr.posargs = tuple(posargs)
 
             # take care of dupes and check required flags
-            resolved_flag_map = self._resolve_flags(cmd_flag_map, flag_map, flagfile_map)
+            cpr.flag_sources = OrderedDict()
+            resolved_flag_map = self._resolve_flags(cmd_flag_map, flag_map, flagfile_map,
+                                                    flag_sources=cpr.flag_sources,
+                                                    subcmds=cpr.subcmds)
             cpr.flags = OrderedDict(resolved_flag_map)
 
             # separate out any trailing arguments from normal positional arguments
@@ -768,10 +1036,10 @@ class Parser:
                 cpr.posargs, cpr.post_posargs = posargs, post_posargs
 
                 parsed_post_posargs = prs.post_posargs.parse(post_posargs)
-                cpr.post_posargs = tuple(parsed_post_posargs)
+                cpr.post_posargs = _freeze_posargs(parsed_post_posargs)
 
             parsed_posargs = prs.posargs.parse(posargs)
-            cpr.posargs = tuple(parsed_posargs)
+            cpr.posargs = _freeze_posargs(parsed_posargs)
         except ArgumentParseError as ape:
             ape.prs_res = cpr
             raise
@@ -825,7 +1093,7 @@ class Parser:
         except IndexError:
             raise InvalidFlagArgument.from_parse(cmd_flag_map, flag, arg=None)
         try:
-            arg_val = parse_as(arg_text)
+            arg_val = _convert_flag_value(flag, parse_as, arg_text)
         except Exception as e:
             raise InvalidFlagArgument.from_parse(cmd_flag_map, flag, arg_text, exc=e)
 
@@ -863,6 +1131,14 @@ class Parser:
         return flag_value_map, ff_path_res_map, args
 
     def _parse_flagfile(self, cmd_flag_map, path_or_file, res_map=None):
+        tracer = _ACTIVE_TRACER.get()
+        if tracer is None:
+            return self._load_flagfile(cmd_flag_map, path_or_file, res_map)
+        path = getattr(path_or_file, 'name', path_or_file)
+        with tracer.span(f'flagfile {path}', 'parse', {'path': str(path)}):
+            return self._load_flagfile(cmd_flag_map, path_or_file, res_map)
+
+    def _load_flagfile(self, cmd_flag_map, path_or_file, res_map=None):
         ret = res_map if res_map is not None else OrderedDict()
         if callable(getattr(path_or_file, 'read', None)):
             # enable StringIO and custom flagfile opening
@@ -902,10 +1178,109 @@ class Parser:
 
         return ret
 
-    def _resolve_flags(self, cmd_flag_map, parsed_flag_map, flagfile_map=None):
+    def _parse_source_value(self, cmd_flag_map, flag, value):
+        """Parse a value for *flag* from a source other than argv, like
+        the environment or a config file. Returns _MISSING_SOURCE for
+        falsy values of flags which take no argument."""
+        parse_as = flag.parse_as
+        if not callable(parse_as):
+            # switch flags take no argument, so interpret the value as a bool
+            if isinstance(value, bool):
+                return parse_as if value else _MISSING_SOURCE
+            key = str(value).strip().lower()
+            if key in _SOURCE_FALSE_VALUES:
+                return _MISSING_SOURCE
+            if key not in _SOURCE_TRUE_VALUES:
+                raise InvalidFlagArgument('flag %s expected a true or false value'
+                                          ' (e.g., 1/0, true/false, yes/no), not %r'
+                                          % (flag.name, value))
+            return parse_as
+        try:
+            return _convert_flag_value(flag, parse_as, value)
+        except Exception as e:
+            raise InvalidFlagArgument.from_parse(cmd_flag_map, flag, str(value), exc=e)
+
+    def _get_env_flag_map(self, path):
+        "Returns a map of environment variable name to flag, for *path*."
+        try:
+            return self._path_env_map[path]
+        except KeyError:
+            pass
+        ret = {flag.env: flag for flag in self._path_flag_map[path].values() if flag.env}
+        self._path_env_map[path] = ret
+        return ret
+
+    def _apply_env(self, cmd_flag_map, parsed_flag_map, flag_sources, subcmds=()):
+        cfm, pfm = cmd_flag_map, parsed_flag_map
+        env_flag_map = self._get_env_flag_map(subcmds)
+        if not env_flag_map:
+            return
+        environ = os.environ
+        for env_name, flag in env_flag_map.items():
+            if flag.name in pfm or cfm.get(flag.name) is not flag:
+                continue  # already set, or not used by this command
+            env_text = environ.get(env_name)
+            if env_text is None:
+                continue
+            try:
+                value = self._parse_source_value(cfm, flag, env_text)
+            except FaceException as fe:
+                fe.args = (fe.args[0] + f' (from environment variable {env_name})',)
+                raise
+            if value is _MISSING_SOURCE:
+                continue
+            pfm.add(flag.name, value)
+            flag_sources[flag.name] = 'env'
+        return
+
+    def _apply_configfile(self, cmd_flag_map, parsed_flag_map, flag_sources, subcmds):
+        cfm, pfm, configfile = cmd_flag_map, parsed_flag_map, self.configfile
+        for key, (value, section_path, path) in configfile.get_values(subcmds).items():
+            flag = cfm.get(key)
+            if flag is None or flag is self.flagfile_flag:
+                section_flag_map = self._path_flag_map.get(section_path, {})
+                if key in section_flag_map and section_flag_map[key] is not self.flagfile_flag:
+                    continue  # a valid flag, just not one used by this command
+                fe = UnknownFlag.from_parse(cfm, key)
+                fe.args = (fe.args[0] + f' (in {configfile.get_origin_label(section_path, path)})',)
+                raise fe
+            if flag.name in pfm:
+                continue
+            values = value if isinstance(value, list) else [value]
+            try:
+                values = [self._parse_source_value(cfm, flag, v) for v in values]
+            except FaceException as fe:
+                fe.args = (fe.args[0] + f' (in {configfile.get_origin_label(section_path, path)})',)
+                raise
+            values = [v for v in values if v is not _MISSING_SOURCE]
+            if not values:
+                continue
+            for v in values:
+                pfm.add(flag.name, v)
+            flag_sources[flag.name] = 'config'
+        return
+
+    def _resolve_flags(self, cmd_flag_map, parsed_flag_map, flagfile_map=None,
+                       flag_sources=None, subcmds=()):
         ret = OrderedDict()
         cfm, pfm = cmd_flag_map, parsed_flag_map
         flagfile_map = flagfile_map or {}
+        flag_sources = flag_sources if flag_sources is not None else OrderedDict()
+
+        ff_counts = {}
+        for ff_value_map in flagfile_map.values():
+            for flag_name in ff_value_map:
+                ff_counts[flag_name] = ff_counts.get(flag_name, 0) + len(ff_value_map.getlist(flag_name))
+        for flag_name in pfm:
+            from_argv = len(pfm.getlist(flag_name)) > ff_counts.get(flag_name, 0)
+            flag_sources[flag_name] = 'argv' if from_argv else 'flagfile'
+
+        self._apply_env(cfm, pfm, flag_sources, subcmds)
+        if self.configfile is not None:
+            # only read config when there's something left to set
+            builtin_flags = self._get_builtin_flags()
+            if any(flag.name not in pfm for flag in cfm.values() if flag not in builtin_flags):
+                self._apply_configfile(cfm, pfm, flag_sources, subcmds)
 
         # check requireds and set defaults and then...
         missing_flags = []
@@ -916,6 +1291,7 @@ class Parser:
                 missing_flags.append(flag.name)
             else:
                 pfm[flag.name] = flag.missing
+                flag_sources[flag.name] = 'missing'
         if missing_flags:
             raise MissingRequiredFlags.from_parse(cfm, pfm, missing_flags)
 
@@ -939,14 +1315,73 @@ class Parser:
         return ret
 
 
-def parse_sv_line(line, sep=','):
-    """Parse a single line of values, separated by the delimiter
-    *sep*. Supports quoting.
-
+def prescan_flag(argv, flag):
+    """Find the argument text for *flag* in *argv* without performing a
+    full parse. Used by builtins, like profiling, which must be set up
+    before parsing starts. If the flag is not in *argv*, and has an
+    *env* set, the value of that environment variable is
+    used. Returns ``None`` if the flag is not present or has no
+    argument.
     """
-    # TODO: this doesn't support unicode, which is intended to be
-    # handled at the layer above.
-    from csv import reader, Dialect, QUOTE_MINIMAL
+    flag_names = (flag.name, flag.char)
+    for i, arg in enumerate(argv[1:], 1):
+        if arg == '--':
+            break
+        if not arg.startswith('-'):
+            continue
+        name, eq, value = arg.partition('=')
+        if normalize_flag_name(name) not in flag_names:
+            continue
+        if eq:
+            return value
+        return argv[i + 1] if i + 1 < len(argv) else None
+    if flag.env:
+        return os.environ.get(flag.env) or None
+    return None
+
+
+def prescan_invocation(prs, argv, exclude=()):
+    """Find the subcommand path, and names of flags, in *argv* for the
+    Parser *prs*, without performing a full parse, which might consume
+    stdin or other one-time inputs. Returns a tuple of the subcommand
+    path and a list of flag names. Flags named in *exclude*, and flags
+    not recognized, are left out.
+    """
+    subcmds, args = (), list(argv[1:])
+    while args and not args[0].startswith('-'):
+        path = subcmds + (normalize_flag_name(args[0]),)
+        if path not in prs.subprs_map:
+            break
+        subcmds = path
+        args.pop(0)
+    flag_map = prs._path_flag_map[subcmds]
+    flag_names = []
+    for arg in args:
+        if arg == '--':
+            break
+        if not arg.startswith('-') or arg == '-':
+            continue
+        flag = flag_map.get(normalize_flag_name(arg.partition('=')[0]))
+        if flag is not None and flag.name not in exclude and flag.name not in flag_names:
+            flag_names.append(flag.name)
+    return subcmds, flag_names
+
+
+_MAX_LISTED_CHOICES = 20
+_MAX_SUGGESTED_CHOICES = 3
+_MAX_AMBIGUOUS_CHOICES = 5
+
+_SV_SPECIAL_CHARS = ('"', '\\', '\r', '\n')
+_SV_DIALECTS = {}
+
+
+def _get_sv_dialect(sep):
+    "Returns a csv Dialect for *sep*, cached, as these are reusable."
+    try:
+        return _SV_DIALECTS[sep]
+    except KeyError:
+        pass
+    from csv import Dialect, QUOTE_MINIMAL
 
     class _face_dialect(Dialect):
         delimiter = sep
@@ -957,7 +1392,26 @@ def parse_sv_line(line, sep=','):
         lineterminator = '\n'
         quoting = QUOTE_MINIMAL
 
-    parsed = list(reader([line], dialect=_face_dialect))
+    _SV_DIALECTS[sep] = _face_dialect
+    return _face_dialect
+
+
+def parse_sv_line(line, sep=','):
+    """Parse a single line of values, separated by the delimiter
+    *sep*. Supports quoting.
+
+    """
+    # TODO: this doesn't support unicode, which is intended to be
+    # handled at the layer above.
+    if not line:
+        return []  # matches csv, which yields an empty row
+    dialect = _get_sv_dialect(sep)
+    if not any(c in line for c in _SV_SPECIAL_CHARS):
+        # nothing for the csv module to unquote, plain split is equivalent
+        return line.split(sep)
+    from csv import reader
+
+    parsed = list(reader([line], dialect=dialect))
     return parsed[0]
 
 
@@ -976,12 +1430,21 @@ class ListParam:
 
     Args:
        parse_one_as (callable): Turns a single value's text into its
-          parsed value.
+          parsed value. Defaults to ``str``, or, if *typecode* is set,
+          ``int`` or ``float`` to match.
        sep (str): A single-character string representing the list
          value separator. Defaults to ``,``.
        strip (bool): Whether or not each value in the list should have
           whitespace stripped before being passed to
           *parse_one_as*. Defaults to False.
+       min_count (int): The minimum number of values the list must
+          contain. Defaults to 0.
+       max_count (int): The maximum number of values the list may
+          contain. Defaults to None, for no limit.
+       typecode (str): An :mod:`array` typecode (e.g., ``'i'`` or
+          ``'d'``). When set, parsed values are stored in a compact
+          :class:`array.array` instead of a list, which is much
+          smaller for long lists of numbers.
 
     .. note:: Aside from using ListParam, an alternative method for
               accepting multiple arguments is to use the
@@ -991,67 +1454,489 @@ class ListParam:
               line.
 
     """
-    def __init__(self, parse_one_as=str, sep=',', strip=False):
-        # TODO: min/max limits?
+    def __init__(self, parse_one_as=None, sep=',', strip=False,
+                 min_count=0, max_count=None, typecode=None):
+        if not isinstance(sep, str) or len(sep) != 1 or sep in _SV_SPECIAL_CHARS:
+            raise ValueError(f'expected sep to be a single, non-quote character, not: {sep!r}')
+        if typecode is not None and typecode not in array.typecodes:
+            raise ValueError(f'expected typecode to be one of {array.typecodes!r}, not: {typecode!r}')
+        if parse_one_as is None:
+            if typecode is None:
+                parse_one_as = str
+            else:
+                parse_one_as = float if typecode in 'fd' else int
         self.parse_one_as = parse_one_as
         self.sep = sep
         self.strip = strip
+        self.typecode = typecode
+        self.min_count = min_count = int(min_count or 0)
+        self.max_count = max_count = None if max_count is None else int(max_count)
+        if min_count < 0:
+            raise ValueError(f'expected min_count >= 0, not: {min_count!r}')
+        if max_count is not None and max_count < min_count:
+            raise ValueError(f'expected max_count >= min_count ({min_count!r}), not: {max_count!r}')
+        _get_sv_dialect(sep)  # warm the cache
 
     def parse(self, list_text):
         "Parse a single string argument into a list of arguments."
         split_vals = parse_sv_line(list_text, self.sep)
+        count = len(split_vals)
+        if count < self.min_count:
+            raise ValueError(f'expected at least {self.min_count} values, got {count}')
+        if self.max_count is not None and count > self.max_count:
+            raise ValueError(f'expected at most {self.max_count} values, got {count}')
         if self.strip:
             split_vals = [v.strip() for v in split_vals]
+        if self.typecode:
+            return array.array(self.typecode, map(self.parse_one_as, split_vals))
         return [self.parse_one_as(v) for v in split_vals]
 
     __call__ = parse
 
     def __repr__(self):
-        return format_exp_repr(self, ['parse_one_as'], ['sep', 'strip'])
+        return format_exp_repr(self, ['parse_one_as'], ['sep', 'strip'],
+                               ['min_count', 'max_count', 'typecode'], opt_key=lambda v: not v)
+
+
+class _FileChoices:
+    "Reads choices, one per line, from a file. See ChoicesParam.from_file."
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        with open(self.path) as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith('#')]
+
+    def __repr__(self):
+        return format_nonexp_repr(self, ['path'])
+
+
+def _is_choices_loader(choices):
+    # types (e.g., Enums) and other iterables are choices themselves
+    return (callable(choices) and not isinstance(choices, type)
+            and not hasattr(choices, '__iter__'))
 
 
 class ChoicesParam:
     """Parses a single value, limited to a set of *choices*. The actual
     converter used to parse is inferred from *choices* by default, but
     an explicit one can be set *parse_as*.
+
+    Args:
+       choices: The allowed values, or a callable which takes no
+          arguments and returns them. Callables are only called when
+          a value is first parsed, so large choice sets (e.g., loaded
+          from a database or a file) only cost anything when the
+          flag is actually used. See also :meth:`from_file`. Types
+          and iterables, like Enum classes, are used as the values.
+       parse_as (callable): Converts the argument text before checking
+          it against *choices*. Inferred from the type of the first
+          choice if not set.
+       ignore_case (bool): Whether string arguments are matched without
+          regard to case. The matched choice, not the argument text,
+          is returned. Defaults to False.
+       allow_prefix (bool): Whether string arguments may be given as an
+          unambiguous prefix of a choice. Defaults to False.
+
+    Large choice sets are not listed in full when a value fails to
+    parse; instead, the closest matching choices are suggested.
     """
-    def __init__(self, choices, parse_as=None):
+    display_name = 'choice'
+
+    def __init__(self, choices, parse_as=None, ignore_case=False, allow_prefix=False):
+        self._source = choices if _is_choices_loader(choices) else None
+        self.parse_as = parse_as
+        self.ignore_case = ignore_case
+        self.allow_prefix = allow_prefix
+        self._choices = None
+        if self._source is None:
+            self._load(choices)
+
+    @classmethod
+    def from_file(cls, path, parse_as=None, **kwargs):
+        """Create a ChoicesParam whose choices are read from the file at
+        *path*, one per line, when first needed. Blank lines and lines
+        starting with ``#`` are skipped. Other keyword arguments are
+        passed through to the ChoicesParam constructor.
+        """
+        return cls(_FileChoices(path), parse_as=parse_as, **kwargs)
+
+    def _load(self, choices):
         if not choices:
             raise ValueError(f'expected at least one choice, not: {choices!r}')
         try:
-            self.choices = sorted(choices)
+            choices = sorted(choices)
         except Exception:
             # in case choices aren't sortable
-            self.choices = list(choices)
-        if parse_as is None:
-            parse_as = type(self.choices[0])
+            choices = list(choices)
+        if self.parse_as is None:
+            self.parse_as = type(choices[0])
             # TODO: check for builtins, raise if not a supported type
-        self.parse_as = parse_as
+        try:
+            self._index = frozenset(choices)
+        except TypeError:
+            self._index = None  # unhashable choices, fall back to the list
+
+        # folded text -> matching choices, plus sorted keys for prefix lookup
+        self._text_map = text_map = {}
+        if self.ignore_case or self.allow_prefix:
+            for choice in choices:
+                if isinstance(choice, str):
+                    text_map.setdefault(self._fold(choice), []).append(choice)
+        self._text_keys = sorted(text_map) if self.allow_prefix else []
+        self._choices = choices
+        return
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            self._load(self._source())
+        return self._choices
+
+    def _fold(self, text):
+        return text.casefold() if self.ignore_case else text
+
+    def _match_prefix(self, text):
+        keys = self._text_keys
+        i = bisect_left(keys, text)
+        matches = []
+        while i < len(keys) and keys[i].startswith(text):
+            matches.extend(self._text_map[keys[i]])
+            if len(matches) > _MAX_AMBIGUOUS_CHOICES:
+                break
+            i += 1
+        return matches
 
     def parse(self, text):
+        choices = self.choices
         choice = self.parse_as(text)
-        if choice not in self.choices:
-            raise ArgumentParseError(f'expected one of {self.choices!r}, not: {text!r}')
-        return choice
+        index = self._index
+        try:
+            if choice in index:
+                return choice
+        except TypeError:
+            # unhashable choice or no index
+            if choice in choices:
+                return choice
+
+        matches = []
+        if isinstance(choice, str) and self._text_map:
+            folded = self._fold(choice)
+            if self.ignore_case:
+                matches = self._text_map.get(folded, [])
+            if not matches and self.allow_prefix and folded:
+                matches = self._match_prefix(folded)
+            if len(matches) == 1:
+                return matches[0]
+        if len(matches) > 1:
+            shown = ', '.join(repr(m) for m in matches[:_MAX_AMBIGUOUS_CHOICES])
+            if len(matches) > _MAX_AMBIGUOUS_CHOICES:
+                shown += ', ...'
+            raise ArgumentParseError(f'ambiguous choice {text!r} could be any of: {shown}')
+        raise ArgumentParseError(self._get_error_message(text))
+
+    def _get_error_message(self, text):
+        choices = self.choices
+        if len(choices) <= _MAX_LISTED_CHOICES:
+            return f'expected one of {choices!r}, not: {text!r}'
+        msg = f'expected one of {len(choices)} choices, not: {text!r}'
+        str_choices = [c for c in choices if isinstance(c, str)]
+        if str_choices:
+            from difflib import get_close_matches
+            if self.ignore_case:
+                folded_map = {c.casefold(): c for c in str_choices}
+                close = get_close_matches(text.casefold(), folded_map, n=_MAX_SUGGESTED_CHOICES)
+                close = [folded_map[c] for c in close]
+            else:
+                close = get_close_matches(text, str_choices, n=_MAX_SUGGESTED_CHOICES)
+            if close:
+                msg += f' (did you mean {" or ".join(repr(c) for c in close)}?)'
+        return msg
 
     __call__ = parse
 
+    @property
+    def _repr_choices(self):
+        # avoid loading lazy choices just for a repr
+        return self._source if self._choices is None else self._choices
+
     def __repr__(self):
-        return format_exp_repr(self, ['choices'], ['parse_as'])
+        return format_exp_repr(self, ['_repr_choices'], ['parse_as'],
+                               ['ignore_case', 'allow_prefix'], opt_key=lambda v: not v)
+
+
+_PATH_TYPES = {'f': ('file', stat.S_ISREG), 'd': ('directory', stat.S_ISDIR)}
+_PATH_PERMS = {'r': os.R_OK, 'w': os.W_OK, 'x': os.X_OK}
 
 
 class FilePathParam:
-    """TODO
+    """Parses and validates a filesystem path. With no arguments, any
+    path is accepted and returned as-is.
 
-    ideas: exists, minimum permissions, can create, abspath, type=d/f
-    (technically could also support socket, named pipe, and symlink)
+    Args:
+       exists (bool): Set to True to require that the path exists, or
+          False to require that it does not. Defaults to None, for no
+          check.
+       type (str): ``'f'`` to require a regular file, or ``'d'`` to
+          require a directory, if the path exists.
+       perms (str): Any combination of ``'r'``, ``'w'``, and ``'x'``,
+          permissions which the current user must have on the path, if
+          it exists.
+       can_create (bool): Require that a path which does not exist
+          could be created, i.e., that its parent is a writable
+          directory. Defaults to False.
+       abspath (bool): Whether to return absolute paths. Defaults to
+          False.
+       glob (bool): Whether positional arguments should be expanded as
+          glob patterns, in the style of the shell. Patterns matching
+          no paths are reported as errors. Does not apply to flags,
+          and note that PosArgSpec counts arguments before
+          expansion. Defaults to False.
+       workers (int): When parsing many positional arguments, check
+          them across this many threads. Useful on network
+          filesystems, where each stat call has significant
+          latency. Defaults to None, checking paths serially.
+
+    Each path is checked with a single stat call, plus one access
+    check if *perms* is set. When used as a :class:`PosArgSpec`'s
+    *parse_as*, every argument is checked and all failures are
+    reported together.
 
-    could do missing=TEMP, but that might be getting too fancy tbh.
     """
+    display_name = 'path'
+
+    def __init__(self, exists=None, type=None, perms='', can_create=False,
+                 abspath=False, glob=False, workers=None):
+        if type is not None and type not in _PATH_TYPES:
+            raise ValueError(f'expected type to be one of {sorted(_PATH_TYPES)!r}, not: {type!r}')
+        perms = perms or ''
+        if set(perms) - set(_PATH_PERMS):
+            raise ValueError(f'expected perms to be a combination of "rwx", not: {perms!r}')
+        if exists is False and (type or perms):
+            raise ValueError('type and perms cannot be checked on paths required not to exist')
+        if workers is not None and int(workers) < 1:
+            raise ValueError(f'expected workers >= 1, not: {workers!r}')
+        self.exists = exists
+        self.type = type
+        self.perms = perms
+        self.can_create = can_create
+        self.abspath = abspath
+        self.glob = glob
+        self.workers = None if workers is None else int(workers)
+        self._access_mode = 0
+        for perm in perms:
+            self._access_mode |= _PATH_PERMS[perm]
+
+    def _check_parent(self, path, parent_cache):
+        parent = os.path.dirname(os.path.abspath(path))
+        try:
+            return parent_cache[parent]
+        except KeyError:
+            pass
+        if not os.path.isdir(parent):
+            err = f'parent directory does not exist: {parent!r}'
+        elif not os.access(parent, os.W_OK | os.X_OK):
+            err = f'parent directory is not writable: {parent!r}'
+        else:
+            err = None
+        parent_cache[parent] = err
+        return err
+
+    def _check(self, path, parent_cache):
+        if not path:
+            raise ArgumentParseError('expected non-empty path')
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        except OSError as ose:
+            raise ArgumentParseError(f'could not access path {path!r}: {ose.strerror}')
+
+        if st is None:
+            if self.exists:
+                raise ArgumentParseError(f'path does not exist: {path!r}')
+            if self.can_create:
+                err = self._check_parent(path, parent_cache)
+                if err:
+                    raise ArgumentParseError(f'cannot create path {path!r}, {err}')
+        else:
+            if self.exists is False:
+                raise ArgumentParseError(f'path already exists: {path!r}')
+            if self.type:
+                type_name, is_type = _PATH_TYPES[self.type]
+                if not is_type(st.st_mode):
+                    raise ArgumentParseError(f'expected path to be a {type_name}: {path!r}')
+            if self._access_mode and not os.access(path, self._access_mode):
+                raise ArgumentParseError(f'expected {self.perms!r} permissions on path: {path!r}')
+
+        return os.path.abspath(path) if self.abspath else path
+
+    def parse(self, text):
+        "Parse and validate a single path."
+        return self._check(text, {})
+
+    __call__ = parse
+
+    def _expand(self, args):
+        "Returns a list of paths and a list of (arg, exc) failures."
+        if not self.glob:
+            return list(args), []
+        import glob
+        paths, failures = [], []
+        for arg in args:
+            if not glob.has_magic(arg):
+                paths.append(arg)
+                continue
+            matches = sorted(glob.glob(arg))
+            if matches:
+                paths.extend(matches)
+            else:
+                failures.append((arg, ArgumentParseError(f'no paths match pattern: {arg!r}')))
+        return paths, failures
+
+    def _check_chunk(self, paths, parent_cache):
+        ret = []
+        for path in paths:
+            try:
+                ret.append((self._check(path, parent_cache), None))
+            except ArgumentParseError as ape:
+                ret.append((None, ape))
+        return ret
+
+    def parse_many(self, args):
+        """Parse and validate a list of paths, expanding globs if
+        enabled. Rather than stopping at the first invalid path,
+        returns a tuple of the list of parsed paths and a list of
+        ``(arg, exception)`` pairs, one per invalid argument.
+        """
+        paths, failures = self._expand(args)
+        parent_cache = {}
+        workers = self.workers
+        if workers and workers > 1 and len(paths) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            chunk_size = max(1, len(paths) // (workers * 4))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                chunk_results = executor.map(lambda chunk: self._check_chunk(chunk, parent_cache),
+                                             chunked(paths, chunk_size))
+                results = [res for chunk_res in chunk_results for res in chunk_res]
+        else:
+            results = self._check_chunk(paths, parent_cache)
+
+        ret = []
+        for path, (val, exc) in zip(paths, results):
+            if exc is None:
+                ret.append(val)
+            else:
+                failures.append((path, exc))
+        return ret, failures
+
+    def __repr__(self):
+        return format_exp_repr(self, [], [], ['exists', 'type', 'perms', 'can_create',
+                                              'abspath', 'glob', 'workers'],
+                               opt_key=lambda v: v is None or v is False or v == '')
+
+
+
+
+_IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None))
+FILE_VALUE_CACHE_SIZE = 128  # paths, per FileValueParam
+
+
+def _is_immutable(value):
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(_is_immutable(v) for v in value)
+    return False
+
 
 class FileValueParam:
+    """Parses the path of a file containing a single value, like a
+    pidfile or a mounted-in password file, reads the file, and treats
+    its contents as if they were passed on the command line. Works
+    with flags set in flagfiles, too.
+
+    Args:
+       parse_as (callable): Turns the file's text into its parsed
+          value. Defaults to ``str``.
+       strip (bool): Whether trailing newlines are stripped from the
+          file's text before it is parsed. Defaults to True.
+       encoding (str): The file's text encoding. Defaults to
+          ``'utf-8'``.
+
+    Parsed values are cached, keyed on the file's device, inode,
+    modification time, and size, so long-lived processes parsing the
+    same arguments repeatedly only re-read files which have changed.
+    Only immutable values (strings, numbers, and tuples of them, for
+    instance) are cached, so one run can't change the value another
+    run gets. Up to 128 paths are cached, least recently used first
+    out.
+
+    Because files often hold secrets, error messages mention the path,
+    but never the contents.
     """
-    TODO: file with a single value in it, like a pidfile
-    or a password file mounted in. Read in and treated like it
-    was on the argv.
-    """
+    display_name = 'file'
+
+    def __init__(self, parse_as=str, strip=True, encoding='utf-8'):
+        if not callable(parse_as):
+            raise TypeError(f'expected callable parse_as, not: {parse_as!r}')
+        codecs.lookup(encoding)  # raises LookupError on unknown encodings
+        self.parse_as = parse_as
+        self.strip = strip
+        self.encoding = encoding
+        self._cache = OrderedDict()
+
+    def parse(self, path):
+        "Read, parse, and return the value in the file at *path*."
+        if not path:
+            raise ArgumentParseError('expected non-empty path')
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                # the converter is compared by identity, as parse_as,
+                # strip, and encoding may all be reassigned
+                cache_key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size,
+                             self.strip, self.encoding)
+                cached = self._cache.get(path)
+                if cached is not None and cached[0] == cache_key and cached[1] is self.parse_as:
+                    try:
+                        self._cache.move_to_end(path)
+                    except KeyError:
+                        pass  # evicted by another thread meanwhile, no matter
+                    return cached[2]
+                data = f.read()
+        except OSError as ose:
+            raise ArgumentParseError(f'could not read value from file {path!r}: {ose.strerror}') from None
+
+        # from None, here and below, as the exceptions may contain file contents
+        try:
+            text = data.decode(self.encoding)
+        except UnicodeDecodeError:
+            raise ArgumentParseError(f'expected file {path!r} to contain {self.encoding} text') from None
+        if self.strip:
+            text = text.rstrip('\r\n')
+        try:
+            value = self.parse_as(text)
+        except Exception:
+            prep, type_desc = get_type_desc(self.parse_as)
+            raise ArgumentParseError(f'failed to parse contents of file {path!r} {prep} {type_desc}') from None
+
+        cache = self._cache
+        try:
+            if _is_immutable(value):
+                cache[path] = (cache_key, self.parse_as, value)
+                cache.move_to_end(path)
+                while len(cache) > FILE_VALUE_CACHE_SIZE:
+                    cache.popitem(last=False)
+            else:
+                cache.pop(path, None)  # stale
+        except KeyError:
+            pass  # changed by another thread meanwhile, no matter
+        return value
+
+    __call__ = parse
+
+    def __repr__(self):
+        return format_exp_repr(self, ['parse_as'], [], ['strip', 'encoding'],
+                               opt_key=lambda v: v in (True, 'utf-8'))
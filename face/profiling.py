@@ -0,0 +1,230 @@
+"""Built-in profiling for face Commands.
+
+Diagnosing a slow command shouldn't require editing its entrypoint. A
+:class:`Command` created with ``profile=True`` gets two hidden flags:
+
+  * ``--profile PATH`` runs the whole of :meth:`Command.run()`,
+    including argument parsing and the middleware chain, under
+    :mod:`cProfile`, and writes a :mod:`pstats` file to *PATH*.
+  * ``--profile-sample PATH`` periodically samples the stack of the
+    running command instead, writing a collapsed-stack file suitable
+    for flamegraph tools. Sampling has much lower overhead, making it
+    the better choice for long-running handlers.
+
+In both cases, the glue frames face generates to connect middlewares
+and handlers (marked with ``__traceback_hide__``) are filtered out, so
+that middlewares appear to call each other directly.
+"""
+
+import os
+import sys
+import types
+import pstats
+import cProfile
+import threading
+from functools import partial
+from collections import Counter
+
+import face.sinter
+import face.tracing
+import face.middleware
+from face.parser import Flag, prescan_flag
+from face.utils import echo
+
+
+DEFAULT_PROFILE_FLAG = Flag('--profile', parse_as=str, display=False,
+                            doc='profile this run with cProfile, writing a pstats file to the given path')
+DEFAULT_SAMPLE_FLAG = Flag('--profile-sample', parse_as=str, display=False,
+                           doc='profile this run by sampling, writing a collapsed-stack file to the given path')
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds
+
+_SINTER_FILENAME_PREFIX = '<sinter generated'
+_GLUE_MODULES = [face.sinter, face.middleware, face.tracing]
+_GLUE_CODES = None
+
+
+def _iter_code(code):
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _iter_code(const)
+
+
+def _get_glue_codes():
+    "All code objects in face marked with __traceback_hide__"
+    global _GLUE_CODES
+    if _GLUE_CODES is not None:
+        return _GLUE_CODES
+    ret = set()
+    for mod in _GLUE_MODULES:
+        for obj in vars(mod).values():
+            funcs = [obj]
+            if isinstance(obj, type):
+                funcs = list(vars(obj).values())
+            for func in funcs:
+                code = getattr(func, '__code__', None)
+                if code is None:
+                    continue
+                ret.update(c for c in _iter_code(code) if '__traceback_hide__' in c.co_varnames)
+    _GLUE_CODES = frozenset(ret)
+    return _GLUE_CODES
+
+
+def is_glue_code(code):
+    """Returns True if *code* is one of the functions face uses to
+    connect middlewares and handlers, and not of interest when
+    profiling.
+    """
+    return code.co_filename.startswith(_SINTER_FILENAME_PREFIX) or code in _get_glue_codes()
+
+
+def _is_glue_key(key, glue_keys):
+    return key[0].startswith(_SINTER_FILENAME_PREFIX) or key in glue_keys
+
+
+def hide_glue_stats(stats):
+    """Remove glue functions from a :class:`pstats.Stats` instance,
+    reattributing their callees and own time to their callers, as if
+    the glue functions were inlined.
+    """
+    glue_keys = {(c.co_filename, c.co_firstlineno, c.co_name) for c in _get_glue_codes()}
+    raw = stats.stats
+    for glue_key in [k for k in raw if _is_glue_key(k, glue_keys)]:
+        _, glue_nc, glue_tt, _, glue_callers = raw.pop(glue_key)
+        glue_callers = {k: v for k, v in glue_callers.items() if k != glue_key}
+        total_nc = sum(v[1] for v in glue_callers.values()) or 1
+        shares = {k: v[1] / total_nc for k, v in glue_callers.items()}
+
+        for caller_key, share in shares.items():
+            if caller_key in raw:
+                cc, nc, tt, ct, callers = raw[caller_key]
+                raw[caller_key] = (cc, nc, tt + glue_tt * share, ct, callers)
+
+        for key, (cc, nc, tt, ct, callers) in raw.items():
+            if glue_key not in callers:
+                continue
+            e_cc, e_nc, e_tt, e_ct = callers.pop(glue_key)
+            for caller_key, share in shares.items():
+                p_cc, p_nc, p_tt, p_ct = callers.get(caller_key, (0, 0, 0.0, 0.0))
+                callers[caller_key] = (p_cc + round(e_cc * share), p_nc + round(e_nc * share),
+                                       p_tt + e_tt * share, p_ct + e_ct * share)
+    return stats
+
+
+def _get_frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class CProfiler:
+    "Runs a function under cProfile, writing pstats to *path*."
+    def __init__(self, path):
+        self.path = path
+
+    def run(self, func, *a, **kw):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *a, **kw)
+        finally:
+            stats = hide_glue_stats(pstats.Stats(profile))
+            try:
+                stats.dump_stats(self.path)
+            except OSError as ose:
+                echo.err(f'warning: failed to write profile to {self.path!r}: {ose}')
+
+
+class SamplingProfiler:
+    """Runs a function while a background thread samples its stack
+    every *interval* seconds, writing collapsed stacks (one
+    ``frame;frame;frame count`` line per unique stack) to *path*.
+    """
+    def __init__(self, path, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.counts = Counter()
+
+    def _sample(self, thread_id, stop_event):
+        counts, label_cache = self.counts, {}
+        while not stop_event.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code not in label_cache:
+                    label_cache[code] = None if is_glue_code(code) else _get_frame_label(code)
+                label = label_cache[code]
+                if label is not None:
+                    stack.append(label)
+                frame = frame.f_back
+            if stack:
+                counts[';'.join(reversed(stack))] += 1
+        return
+
+    def run(self, func, *a, **kw):
+        stop_event = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(threading.get_ident(), stop_event),
+                                   name='face-profile-sampler', daemon=True)
+        sampler.start()
+        try:
+            return func(*a, **kw)
+        finally:
+            stop_event.set()
+            sampler.join()
+            try:
+                with open(self.path, 'w') as f:
+                    for stack, count in sorted(self.counts.items()):
+                        f.write(f'{stack} {count}\n')
+            except OSError as ose:
+                echo.err(f'warning: failed to write profile to {self.path!r}: {ose}')
+
+
+class ProfileHandler:
+    """Adds opt-in profiling to a :class:`Command`, via hidden flags.
+    Pass ``profile=True`` to the :class:`Command` constructor to use
+    the defaults, or pass an instance of this type to customize.
+
+    Args:
+       flag (face.Flag): The flag which enables deterministic
+          profiling with :mod:`cProfile`, taking the path of the
+          pstats file to write. Defaults to a hidden ``--profile``
+          flag. Pass ``False`` to disable.
+       sample_flag (face.Flag): The flag which enables sampling
+          profiling, taking the path of the collapsed-stack file to
+          write. Defaults to a hidden ``--profile-sample``
+          flag. Pass ``False`` to disable.
+       sample_interval (float): Seconds between stack samples. Defaults
+          to 0.005.
+    """
+    def __init__(self, flag=DEFAULT_PROFILE_FLAG, sample_flag=DEFAULT_SAMPLE_FLAG,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        for f in (flag, sample_flag):
+            if f and not isinstance(f, Flag):
+                raise TypeError(f'expected Flag instance or False, not: {f!r}')
+        if not flag and not sample_flag:
+            raise ValueError('expected at least one of flag or sample_flag to be set')
+        if sample_interval <= 0:
+            raise ValueError(f'expected positive sample_interval, not: {sample_interval!r}')
+        self.flag = flag or None
+        self.sample_flag = sample_flag or None
+        self.sample_interval = sample_interval
+
+    @property
+    def flags(self):
+        return [f for f in (self.flag, self.sample_flag) if f]
+
+    def get_profiler(self, argv):
+        """Returns a profiler if *argv* enables profiling, otherwise
+        ``None``. Profilers have a ``run(func, *a, **kw)`` method."""
+        if self.flag:
+            path = prescan_flag(argv, self.flag)
+            if path:
+                return CProfiler(path)
+        if self.sample_flag:
+            path = prescan_flag(argv, self.sample_flag)
+            if path:
+                return SamplingProfiler(path, interval=self.sample_interval)
+        return None
+
+    def wrap_run(self, argv, cmd, run):
+        "Returns *run*, profiled if *argv* enables profiling."
+        profiler = self.get_profiler(argv)
+        return run if profiler is None else partial(profiler.run, run)
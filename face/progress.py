@@ -0,0 +1,271 @@
+"""Progress reporting for long-running face commands.
+
+Handlers accept the ``progress_`` builtin to get a :class:`Progress`,
+which tracks any number of tasks, nested or in parallel::
+
+  def process(posargs_, progress_):
+      for path in progress_.iter(posargs_, 'files'):
+          ...
+
+Counting is cheap: :meth:`Task.update` only increments a counter, so
+it's fine to call per item, even over millions of items. Output is
+drawn separately, by a background thread, at a bounded rate, so
+output cost doesn't grow with the number of updates:
+
+  * On a terminal, tasks are drawn as a single status line on stderr,
+    redrawn ten times a second, and fit to the terminal width. Text
+    written with :func:`~face.echo` while the line is drawn clears it
+    first, so the two don't collide. This applies to text echoed in
+    the context (such as the thread) which started the first task.
+  * Otherwise, as when output is piped to a log, a plain line is
+    written for each task which has progressed, every ten seconds.
+
+When a top-level task finishes, a line with its final count is left
+behind in either case.
+
+Each task should be updated from one thread at a time. For parallel
+work, create a task (or :meth:`Task.subtask`) per worker thread.
+"""
+
+import sys
+import time
+import threading
+
+import face.utils
+from face.utils import isatty
+from face.helpers import get_winsize, get_text_width
+
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_LOG_INTERVAL = 10.0
+
+_CLEAR_LINE = '\r\x1b[K'
+
+
+def _format_count(count):
+    if count < 10000:
+        return str(count)
+    for unit in ('k', 'M', 'G'):
+        count /= 1000
+        if count < 1000:
+            return f'{count:.1f}{unit}'
+    return f'{count:.1f}T'
+
+
+def _truncate(text, width):
+    if get_text_width(text) <= width:
+        return text
+    while text and get_text_width(text) > width - 1:
+        text = text[:-1]
+    return text.rstrip() + '…'
+
+
+class Task:
+    """A counter of work done toward an optional *total*, created with
+    :meth:`Progress.task` or :meth:`Task.subtask`. Use as a context
+    manager, or call :meth:`close` when done.
+    """
+    def __init__(self, progress, label, total=None, parent=None):
+        self.progress = progress
+        self.label = label
+        self.total = total
+        self.parent = parent
+        self.count = 0
+        self.children = []
+        self.start_time = time.monotonic()
+        self.closed = False
+        self._logged_count = None
+
+    def update(self, n=1):
+        "Add *n* to the count. Cheap enough to call for every item."
+        self.count += n
+
+    def subtask(self, label, total=None):
+        "Returns a new :class:`Task`, drawn nested under this one."
+        return self.progress._add_task(label, total, parent=self)
+
+    def close(self):
+        "Mark this task done. Called automatically on context manager exit."
+        self.progress._close_task(self)
+
+    def get_summary(self, rate=False):
+        "Returns a short text summary of the task's progress."
+        ret = f'{self.label} {_format_count(self.count)}'
+        if self.total:
+            ret += f'/{_format_count(self.total)} ({100 * self.count // self.total}%)'
+        if rate:
+            elapsed = time.monotonic() - self.start_time
+            if elapsed > 0:
+                ret += f', {_format_count(int(self.count / elapsed))}/s'
+        return ret
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return f'<{cn} label={self.label!r} count={self.count!r} total={self.total!r}>'
+
+
+class Progress:
+    """Draws the progress of a set of tasks to *file*, ``sys.stderr`` by
+    default. Available to handlers as the ``progress_`` builtin, and
+    closed automatically at the end of the run. Outside of a command,
+    use as a context manager.
+
+    Args:
+       file: The stream to draw to. Defaults to ``sys.stderr``.
+       interval (float): Seconds between redraws. Defaults to 0.1 on a
+          terminal, and 10 otherwise.
+       tty (bool): Whether to draw a status line, rather than logging
+          plain lines. Defaults to whether *file* is a terminal.
+    """
+    def __init__(self, file=None, interval=None, tty=None):
+        self.file = sys.stderr if file is None else file
+        self.tty = isatty(self.file) if tty is None else tty
+        if interval is None:
+            interval = DEFAULT_INTERVAL if self.tty else DEFAULT_LOG_INTERVAL
+        self.interval = interval
+        self.tasks = []
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._line_drawn = False
+        self._prev_active = None
+
+    def task(self, label, total=None):
+        "Returns a new top-level :class:`Task`, counting toward *total*."
+        return self._add_task(label, total)
+
+    def iter(self, iterable, label, total=None):
+        """Yields the items of *iterable*, counting each in a new task
+        labeled *label*. *total* defaults to the length of *iterable*,
+        if it has one."""
+        if total is None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                pass
+        with self.task(label, total) as task:
+            # assigning the count directly is cheaper than update()
+            for task.count, item in enumerate(iterable, 1):
+                yield item
+
+    def _add_task(self, label, total, parent=None):
+        task = Task(self, label, total, parent=parent)
+        with self._lock:
+            (parent.children if parent else self.tasks).append(task)
+            if self._thread is None:
+                self._start()
+        return task
+
+    def _close_task(self, task):
+        with self._lock:
+            if task.closed:
+                return
+            task.closed = True
+            siblings = task.parent.children if task.parent else self.tasks
+            if task in siblings:
+                siblings.remove(task)
+            if task.parent is None:
+                self._write_line(task.get_summary(rate=True))
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='face-progress', daemon=True)
+        self._thread.start()
+        if self.tty:
+            # set, rather than a token to reset, as tasks may be added
+            # from a different context than the one closing
+            self._prev_active = face.utils._ACTIVE_PROGRESS.get()
+            face.utils._ACTIVE_PROGRESS.set(self)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.draw()
+            except Exception:
+                return  # e.g., a closed stream, never worth crashing over
+
+    def _iter_active(self, tasks=None, prefix=''):
+        for task in list(self.tasks if tasks is None else tasks):
+            yield prefix, task
+            yield from self._iter_active(task.children, prefix + task.label + ' › ')
+
+    def draw(self):
+        "Draw current progress. Called periodically by a background thread."
+        with self._lock:
+            if self.tty:
+                self._draw_line()
+            else:
+                self._log_lines()
+
+    def _get_line_text(self, tasks):
+        # nested tasks follow their parent, parallel tasks are side by side
+        parts = []
+        for task in list(tasks):
+            text = task.get_summary()
+            if task.children:
+                text += ' › ' + self._get_line_text(task.children)
+            parts.append(text)
+        return ' | '.join(parts)
+
+    def _draw_line(self):
+        text = self._get_line_text(self.tasks)
+        if not text:
+            self.clear()
+            return
+        _, width = get_winsize()
+        line = _truncate(text, (width or 80) - 1)
+        self.file.write(_CLEAR_LINE + line)
+        self.file.flush()
+        self._line_drawn = True
+
+    def _log_lines(self):
+        lines = []
+        for prefix, task in self._iter_active():
+            if task.count == task._logged_count:
+                continue  # no news
+            task._logged_count = task.count
+            lines.append(prefix + task.get_summary(rate=True))
+        if lines:
+            self.file.write(''.join(line + '\n' for line in lines))
+            self.file.flush()
+
+    def _write_line(self, line):
+        self.clear()
+        self.file.write(line + '\n')
+        self.file.flush()
+
+    def clear(self):
+        "Clear the status line, if drawn. It's redrawn on the next update."
+        with self._lock:
+            if self._line_drawn:
+                self.file.write(_CLEAR_LINE)
+                self.file.flush()
+                self._line_drawn = False
+
+    def close(self):
+        "Close any open tasks, and stop drawing."
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        with self._lock:
+            for task in list(self.tasks):
+                self._close_task(task)
+            self.clear()
+            if face.utils._ACTIVE_PROGRESS.get() is self:
+                face.utils._ACTIVE_PROGRESS.set(self._prev_active)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return f'<{cn} file={self.file!r} tty={self.tty!r} task_count={len(self.tasks)}>'
@@ -0,0 +1,223 @@
+"""Recording real runs of face Commands, for replay as benchmarks.
+
+Synthetic benchmarks only go so far. A :class:`Command` created with
+``record=True`` gets a hidden ``--record PATH`` flag, which can also
+be set with the ``FACE_RECORD`` environment variable, making it easy
+to turn on for a whole deployment. Each recorded run appends one line
+of JSON to *PATH*, with:
+
+  * the full argv, and the subcommand path it invoked
+  * the path and SHA-256 digest of each flagfile loaded, so replays
+    can tell when a flagfile has changed since recording
+  * timings, in seconds, of the ``run`` as a whole, and of its
+    ``parse``, ``prepare``, and ``dispatch`` phases (see
+    :mod:`face.tracing`)
+  * the exit code, or the type of the exception raised
+
+.. warning::
+
+   The argv is recorded verbatim. Don't record commands which take
+   secrets as arguments, and treat the resulting logs accordingly.
+
+Recordings are replayed with ``python -m bench replay``, which reruns
+each argv against the Command with its handlers replaced by stubs
+(see :func:`stub_handlers`), and reports latency percentiles for each
+phase.
+
+Recording is skipped for runs which are also traced with ``--trace``.
+"""
+
+import json
+import time
+import hashlib
+from functools import partial
+from contextlib import contextmanager
+from collections import OrderedDict
+
+from face.parser import Flag, prescan_flag, prescan_invocation, _ACTIVE_TRACER
+from face.sinter import get_fb
+from face.tracing import Tracer, TraceHandler
+from face.utils import echo
+
+
+DEFAULT_RECORD_FLAG = Flag('--record', parse_as=str, display=False, env='FACE_RECORD',
+                           doc="append this run's arguments and timings as JSON to the given path")
+PHASES = ('run', 'parse', 'prepare', 'dispatch')
+
+
+def get_file_digest(path):
+    "Returns the hex SHA-256 digest of the file at *path*, or None if unreadable."
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class Recorder(Tracer):
+    """Runs a function, recording the phase timings of the run, then
+    appends a record of it to *path* as one line of JSON. Pass
+    ``None`` for *path* to keep the record in memory, as the
+    ``record`` attribute.
+
+    Unlike its parent, :class:`~face.tracing.Tracer`, a Recorder
+    runs the same middleware chain as an unrecorded run, so that its
+    timings are representative.
+    """
+    trace_chain = False
+
+    def __init__(self, path, argv, command, subcmds=()):
+        super().__init__(path, name=command)
+        self.argv = list(argv)
+        self.subcmds = list(subcmds)
+        self.record = None
+
+    def run(self, func, *a, **kw):
+        record = {'timestamp': time.time(), 'argv': self.argv,
+                  'command': self.name, 'subcmds': self.subcmds}
+        token = _ACTIVE_TRACER.set(self)
+        try:
+            with self.span('run', 'command'):
+                ret = func(*a, **kw)
+        except SystemExit as se:
+            record['exit_code'] = se.code if isinstance(se.code, int) else 1
+            raise
+        except BaseException as be:
+            record['error'] = type(be).__name__
+            raise
+        else:
+            record['exit_code'] = 0
+        finally:
+            _ACTIVE_TRACER.reset(token)
+            record['timings'] = self.get_timings()
+            record['flagfiles'] = self.get_flagfiles()
+            self.record = record
+            if self.path:
+                self._write(record)
+        return ret
+
+    def get_timings(self):
+        "Returns a dict of the seconds taken by each phase of the run."
+        ret = {}
+        for span in self.spans:
+            if span.name in PHASES and span.name not in ret:
+                ret[span.name] = (span.end_ns - span.start_ns) / 1e9
+        return ret
+
+    def get_flagfiles(self):
+        "Returns a list of dicts of the path and digest of each flagfile loaded."
+        ret, seen = [], set()
+        for span in self.spans:
+            path = (span.attrs or {}).get('path')
+            if not span.name.startswith('flagfile ') or path is None or path in seen:
+                continue
+            seen.add(path)
+            ret.append({'path': path, 'sha256': get_file_digest(path)})
+        return ret
+
+    def _write(self, record):
+        try:
+            # one write call per record, so concurrent runs appending
+            # to the same file don't interleave lines
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+        except OSError as ose:
+            echo.err(f'warning: failed to write run record to {self.path!r}: {ose}')
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} path={self.path!r} argv={self.argv!r}>'
+
+
+class RecordHandler:
+    """Adds opt-in recording of runs to a :class:`Command`, via a hidden
+    flag. Pass ``record=True`` to the :class:`Command` constructor to
+    use the defaults, or pass an instance of this type to customize.
+
+    Args:
+       flag (face.Flag): The flag which enables recording, taking the
+          path of the JSONL file to append to. Defaults to a hidden
+          ``--record`` flag, also set by the ``FACE_RECORD``
+          environment variable.
+    """
+    def __init__(self, flag=DEFAULT_RECORD_FLAG):
+        if not isinstance(flag, Flag):
+            raise TypeError(f'expected Flag instance, not: {flag!r}')
+        self.flag = flag
+
+    @property
+    def flags(self):
+        return [self.flag]
+
+    def get_recorder(self, argv, cmd):
+        """Returns a :class:`Recorder` if *argv* or the environment
+        enables recording, otherwise ``None``."""
+        path = prescan_flag(argv, self.flag)
+        if not path:
+            return None
+        subcmds, _ = prescan_invocation(cmd, argv)
+        return Recorder(path, argv, cmd.name, subcmds)
+
+    def wrap_run(self, argv, cmd, run):
+        """Returns *run*, recorded if *argv* enables recording. Runs
+        which are also traced aren't recorded."""
+        for handler in cmd.builtin_handlers:
+            if isinstance(handler, TraceHandler) and handler.get_tracer(argv):
+                return run
+        recorder = self.get_recorder(argv, cmd)
+        return run if recorder is None else partial(recorder.run, run)
+
+
+def load_records(path):
+    "Returns a list of the records in the JSONL file at *path*."
+    ret = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ret.append(json.loads(line))
+            except ValueError as ve:
+                raise ValueError(f'invalid record on line {lineno} of {path!r}: {ve}')
+    return ret
+
+
+class _StubHandler:
+    "Takes the same arguments as a handler, and does nothing."
+    def __init__(self, func):
+        self.func = func
+        self._sinter_fb = get_fb(func)
+
+    def __call__(self, **kwargs):
+        return None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} func={self.func!r}>'
+
+
+_STUB_SWAPPED_ATTRS = ('_path_func_map', '_path_wrapped_map', '_chain_cache',
+                       '_prepared_paths', '_path_traced_map')
+
+
+@contextmanager
+def stub_handlers(cmd):
+    """A context manager which replaces every handler of *cmd* and its
+    subcommands with a stub taking the same arguments, so that runs
+    parse, prepare, and dispatch through the full middleware chain,
+    without doing the work of the command. Middlewares are still
+    called. Handlers are restored on exit.
+    """
+    # swap in copies of the compiled state, rather than changing it in
+    # place, so that clones sharing it are unaffected, and the real
+    # chains are back in place on exit, without being compiled again
+    saved = {attr: getattr(cmd, attr) for attr in _STUB_SWAPPED_ATTRS}
+    cmd._path_func_map = OrderedDict((path, None if func is None else _StubHandler(func))
+                                     for path, func in saved['_path_func_map'].items())
+    cmd._path_wrapped_map = OrderedDict(saved['_path_wrapped_map'])
+    cmd._chain_cache = {}
+    cmd._prepared_paths, cmd._path_traced_map = set(), {}
+    try:
+        yield cmd
+    finally:
+        for attr, value in saved.items():
+            setattr(cmd, attr, value)
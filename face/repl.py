@@ -0,0 +1,226 @@
+"""An interactive mode for face Commands.
+
+Every run of a command-line program pays for interpreter startup,
+imports, and building and preparing its :class:`~face.Command`. For
+a few commands that's fine, but operators running dozens of
+subcommands back-to-back pay it every time. :meth:`Command.repl()
+<face.Command.repl>` instead keeps one Command resident, reading lines
+from a prompt and dispatching each through the already-prepared tree::
+
+  $ deploy-tool repl
+  deploy-tool> status --region us-east-1
+  ...
+  deploy-tool> rollback --help
+  ...
+  deploy-tool> exit
+
+Lines are split the same way as the string form of
+:meth:`CommandChecker.run() <face.CommandChecker.run>`, using
+:func:`shlex.split`, and the command's own name is implied. Errors in
+user input are printed, and the prompt returns, rather than ending the
+session. So are the tracebacks of other exceptions raised by handlers. As all lines run in the same process, values from
+middleware declared with ``lifetime='process'``, or cached with a
+:class:`~face.MiddlewareCache`, stay warm across lines.
+
+Where :mod:`readline` is available, the tab key completes subcommand
+names, flags, and the values of flags parsed with a
+:class:`~face.ChoicesParam`.
+"""
+
+import shlex
+import traceback
+
+from face.errors import CommandLineError
+from face.parser import ChoicesParam
+from face.utils import echo, normalize_flag_name, identifier_to_flag
+
+
+DEFAULT_EXIT_COMMANDS = ('exit', 'quit')
+_COMPLETER_DELIMS = ' \t\n'
+
+
+def _print_error(msg):
+    return echo.err(msg)
+
+
+class Repl:
+    """Reads lines from a prompt and runs each as arguments to *cmd*,
+    until the user enters one of *exit_commands*, or sends EOF
+    (Ctrl-D). Usually created and run with :meth:`Command.repl()
+    <face.Command.repl>`.
+
+    Args:
+       cmd (Command): The command to run. Its whole tree is prepared
+          once, when the REPL starts.
+       prompt (str): The prompt text. Defaults to the command name,
+          followed by ``"> "``.
+       extras (dict): A map of additional arguments made available to
+          handlers on every run, as in :meth:`Command.run()`.
+       exit_commands (tuple): Lines which end the session. Defaults to
+          ``('exit', 'quit')``.
+       history_path (str): Path of a file to load readline history
+          from at startup, and save it to on exit. Defaults to
+          ``None``, for no persistent history.
+       print_error (callable): Prints error messages, as in
+          :meth:`Command.run()`. Defaults to printing to stderr.
+
+    After each line, the ``exit_code`` attribute is set to the exit
+    code a standalone run would have had.
+    """
+    def __init__(self, cmd, prompt=None, extras=None, exit_commands=DEFAULT_EXIT_COMMANDS,
+                 history_path=None, print_error=None):
+        self.cmd = cmd
+        self.prompt = prompt if prompt is not None else f'{cmd.name}> '
+        self.extras = dict(extras or {})
+        self.exit_commands = tuple(exit_commands or ())
+        self.history_path = history_path
+        self.print_error = print_error or _print_error
+        self.exit_code = 0
+
+    def run(self):
+        "Run the REPL until the user exits. Returns the last exit code."
+        self.cmd.prepare()
+        restore = self._install_readline()
+        try:
+            while True:
+                try:
+                    line = input(self.prompt)
+                except EOFError:
+                    echo('')
+                    break
+                except KeyboardInterrupt:
+                    echo('')  # abandon the current line, as shells do
+                    continue
+                if not self.run_line(line):
+                    break
+        finally:
+            restore()
+        return self.exit_code
+
+    def run_line(self, line):
+        """Run a single line of input. Returns False if the line was an
+        exit command, True otherwise.
+        """
+        try:
+            args = shlex.split(line)
+        except ValueError as ve:
+            self.print_error(f'error: {ve}')  # e.g., unclosed quotes
+            self.exit_code = 1
+            return True
+        if not args:
+            return True
+        if args[0] in self.exit_commands:
+            return False
+
+        try:
+            self.cmd.run([self.cmd.name] + args, extras=self.extras, print_error=self.print_error)
+        except CommandLineError as cle:
+            # message already printed by Command.run()
+            self.exit_code = cle.code if isinstance(cle.code, int) else 1
+        except SystemExit as se:
+            # a handler calling sys.exit() shouldn't end the session
+            if se.code is None or isinstance(se.code, int):
+                self.exit_code = se.code or 0
+            else:
+                self.print_error(str(se.code))
+                self.exit_code = 1
+        except KeyboardInterrupt:
+            echo('')
+            self.exit_code = 130
+        except Exception:
+            # a bug in one handler shouldn't end the session, either
+            echo.err(traceback.format_exc(), nl=False)
+            self.exit_code = 1
+        else:
+            self.exit_code = 0
+        return True
+
+    def get_completions(self, line, text):
+        """Returns a sorted list of completions for *text*, the word
+        being typed, where *line* is the input before that word.
+        """
+        try:
+            tokens = shlex.split(line)
+        except ValueError:
+            return []  # inside an unclosed quote
+
+        cmd, path = self.cmd, ()
+        for i, token in enumerate(tokens):
+            if token.startswith('-'):
+                break
+            next_path = path + (normalize_flag_name(token),)
+            if next_path not in cmd.subprs_map:
+                break
+            path = next_path
+        else:
+            i = len(tokens)
+        in_subcmds = i == len(tokens)
+
+        flag_map = cmd.get_flag_map(path, with_hidden=False)
+        if tokens and tokens[-1].startswith('-') and '=' not in tokens[-1]:
+            flag = flag_map.get(normalize_flag_name(tokens[-1]))
+            if flag is not None and callable(flag.parse_as):
+                # completing the flag's value
+                if not isinstance(flag.parse_as, ChoicesParam):
+                    return []
+                candidates = [str(c) for c in flag.parse_as.choices]
+                return sorted(c for c in candidates if c.startswith(text))
+
+        candidates = []
+        if text.startswith('-') or not in_subcmds:
+            for flag in cmd.get_flags(path, with_hidden=False):
+                candidates.append(identifier_to_flag(flag.name))
+                if flag.char:
+                    candidates.append('-' + flag.char)
+        else:
+            depth = len(path) + 1
+            candidates.extend(p[-1].replace('_', '-') for p in cmd.subprs_map
+                              if len(p) == depth and p[:-1] == path)
+            if not path:
+                candidates.extend(self.exit_commands)
+        return sorted(c for c in set(candidates) if c.startswith(text))
+
+    def complete(self, text, state):
+        "A :func:`readline.set_completer` completer for this REPL."
+        if state == 0:
+            import readline  # only called once installed, see _install_readline()
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            self._completions = self.get_completions(line, text)
+        try:
+            return self._completions[state]
+        except IndexError:
+            return None
+
+    def _install_readline(self):
+        "Set up completion and history, returning a function which undoes it."
+        try:
+            import readline  # imported here, as it can be slow to load
+        except ImportError:  # pragma: no cover (e.g., Windows)
+            return lambda: None
+        prev_completer, prev_delims = readline.get_completer(), readline.get_completer_delims()
+        readline.set_completer(self.complete)
+        # flags contain dashes, so only split words on whitespace
+        readline.set_completer_delims(_COMPLETER_DELIMS)
+        if 'libedit' in (readline.__doc__ or ''):  # pragma: no cover (macOS)
+            readline.parse_and_bind('bind ^I rl_complete')
+        else:
+            readline.parse_and_bind('tab: complete')
+        if self.history_path:
+            try:
+                readline.read_history_file(self.history_path)
+            except OSError:
+                pass  # no history yet
+
+        def _restore():
+            if self.history_path:
+                try:
+                    readline.write_history_file(self.history_path)
+                except OSError as ose:
+                    self.print_error(f'warning: failed to write history to {self.history_path!r}: {ose}')
+            readline.set_completer(prev_completer)
+            readline.set_completer_delims(prev_delims)
+
+        return _restore
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} cmd={self.cmd!r} prompt={self.prompt!r}>'
@@ -0,0 +1,221 @@
+"""Built-in resource usage reports for face Commands.
+
+Finding out which subcommands are hungry for memory or CPU shouldn't
+require a profiler. A :class:`Command` created with ``rusage=True``
+gets a hidden ``--rusage PATH`` flag, which can also be set with the
+``FACE_RUSAGE`` environment variable. When the run finishes, a report
+is written with:
+
+  * wall time, user and system CPU time, and maximum resident set
+    size, from :func:`resource.getrusage`
+  * block input and output operations, and voluntary and involuntary
+    context switches
+  * the subcommand path, and the names (never the values) of the
+    flags passed on the command line, for aggregating reports
+    across many runs and machines
+
+With a *PATH* of ``-``, the report is a single line on stderr.
+Otherwise, it is appended to *PATH* as one line of JSON, so many runs
+can share a log file.
+
+Setting ``--rusage-tracemalloc N`` (or ``FACE_RUSAGE_TRACEMALLOC``)
+also traces memory allocations with :mod:`tracemalloc`, adding the
+peak traced memory and the *N* source lines which allocated the most
+to the report. Allocation tracing slows Python down significantly, so
+only use it when investigating memory usage.
+
+The :mod:`resource` module is only available on Unix-like systems.
+Elsewhere, reports include wall time and tracemalloc results only.
+"""
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from functools import partial
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (e.g., Windows)
+    resource = None
+
+from face.parser import Flag, prescan_flag, prescan_invocation
+from face.utils import echo
+
+
+DEFAULT_RUSAGE_FLAG = Flag('--rusage', parse_as=str, display=False, env='FACE_RUSAGE',
+                           doc='report resource usage of this run, appending JSON to the'
+                           ' given path, or writing a summary to stderr for "-"')
+DEFAULT_TRACEMALLOC_FLAG = Flag('--rusage-tracemalloc', parse_as=int, display=False,
+                                env='FACE_RUSAGE_TRACEMALLOC',
+                                doc='with --rusage, also trace allocations, reporting the'
+                                ' peak and the given number of top allocating lines')
+STDERR_PATH = '-'
+
+# ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+_RUSAGE_FIELDS = (('block_input', 'ru_inblock'),
+                  ('block_output', 'ru_oublock'),
+                  ('voluntary_ctx_switches', 'ru_nvcsw'),
+                  ('involuntary_ctx_switches', 'ru_nivcsw'))
+_TRACEMALLOC_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'))
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+def format_report(report):
+    "Format a report dict as a single human-readable line."
+    parts = [' '.join([report['command']] + report['subcmds'])]
+    parts.append(f"wall {report['wall_time']:.3f}s")
+    if 'user_time' in report:
+        parts.append(f"user {report['user_time']:.3f}s")
+        parts.append(f"sys {report['system_time']:.3f}s")
+        parts.append(f"max rss {_format_size(report['max_rss'])}")
+        parts.append(f"blocks in/out {report['block_input']}/{report['block_output']}")
+        parts.append('ctx switches vol/invol'
+                     f" {report['voluntary_ctx_switches']}/{report['involuntary_ctx_switches']}")
+    if 'tracemalloc_peak' in report:
+        parts.append(f"traced peak {_format_size(report['tracemalloc_peak'])}")
+    ret = 'rusage: ' + ', '.join(parts)
+    for site in report.get('tracemalloc_top', []):
+        ret += f"\n  {_format_size(site['size']):>9} in {site['count']} blocks: {site['site']}"
+    return ret
+
+
+class RusageReporter:
+    """Runs a function, then writes a report of the resources it used
+    to *path* (or stderr, for ``'-'``). *invocation* is a dict of
+    ``command``, ``subcmds``, and ``flags``, identifying the run in
+    the report. Set *tracemalloc_top* to a positive number to also
+    trace allocations.
+    """
+    def __init__(self, path, invocation, tracemalloc_top=0):
+        self.path = path
+        self.invocation = invocation
+        self.tracemalloc_top = tracemalloc_top
+        self.report = None
+
+    def run(self, func, *a, **kw):
+        report = dict(self.invocation, timestamp=time.time(), pid=os.getpid())
+        start_usage = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+        started_tracemalloc = False
+        if self.tracemalloc_top > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracemalloc = True
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            # py3.9+. before that, the peak is since tracing started,
+            # which is this run unless tracing was already on
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        try:
+            ret = func(*a, **kw)
+        except SystemExit as se:
+            report['exit_code'] = se.code if isinstance(se.code, int) else 1
+            raise
+        except BaseException as be:
+            report['error'] = type(be).__name__
+            raise
+        else:
+            report['exit_code'] = 0
+        finally:
+            report['wall_time'] = time.perf_counter() - start_time
+            if start_usage is not None:
+                report.update(self._get_rusage_delta(start_usage))
+            if self.tracemalloc_top > 0:
+                report.update(self._get_tracemalloc_stats())
+                if started_tracemalloc:
+                    tracemalloc.stop()
+            self.report = report
+            self._write(report)
+        return ret
+
+    def _get_rusage_delta(self, start):
+        end = resource.getrusage(resource.RUSAGE_SELF)
+        ret = {'user_time': end.ru_utime - start.ru_utime,
+               'system_time': end.ru_stime - start.ru_stime,
+               'max_rss': end.ru_maxrss * _MAXRSS_SCALE}
+        for name, attr in _RUSAGE_FIELDS:
+            ret[name] = getattr(end, attr) - getattr(start, attr)
+        return ret
+
+    def _get_tracemalloc_stats(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+        top = [{'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size': stat.size, 'count': stat.count}
+               for stat in snapshot.statistics('lineno')[:self.tracemalloc_top]]
+        return {'tracemalloc_peak': peak, 'tracemalloc_top': top}
+
+    def _write(self, report):
+        if self.path == STDERR_PATH:
+            echo.err(format_report(report))
+            return
+        try:
+            # one write call per report, so concurrent runs appending
+            # to the same file don't interleave lines
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(report, sort_keys=True) + '\n')
+        except OSError as ose:
+            echo.err(f'warning: failed to write resource usage report to {self.path!r}: {ose}')
+
+
+class RusageHandler:
+    """Adds opt-in resource usage reports to a :class:`Command`, via
+    hidden flags. Pass ``rusage=True`` to the :class:`Command`
+    constructor to use the defaults, or pass an instance of this type
+    to customize.
+
+    Args:
+       flag (face.Flag): The flag which enables the report, taking the
+          path of the JSONL file to append to, or ``-`` for
+          stderr. Defaults to a hidden ``--rusage`` flag, also set by
+          the ``FACE_RUSAGE`` environment variable.
+       tracemalloc_flag (face.Flag): The flag which enables allocation
+          tracing, taking the number of top allocation sites to
+          report. Defaults to a hidden ``--rusage-tracemalloc`` flag,
+          also set by the ``FACE_RUSAGE_TRACEMALLOC`` environment
+          variable. Pass ``False`` to disable.
+    """
+    def __init__(self, flag=DEFAULT_RUSAGE_FLAG, tracemalloc_flag=DEFAULT_TRACEMALLOC_FLAG):
+        if not isinstance(flag, Flag):
+            raise TypeError(f'expected Flag instance, not: {flag!r}')
+        if tracemalloc_flag and not isinstance(tracemalloc_flag, Flag):
+            raise TypeError(f'expected Flag instance or False, not: {tracemalloc_flag!r}')
+        self.flag = flag
+        self.tracemalloc_flag = tracemalloc_flag or None
+
+    @property
+    def flags(self):
+        return [f for f in (self.flag, self.tracemalloc_flag) if f]
+
+    def get_reporter(self, argv, cmd):
+        """Returns a reporter if *argv* or the environment enables
+        resource usage reports for *cmd*, otherwise ``None``. Reporters
+        have a ``run(func, *a, **kw)`` method."""
+        path = prescan_flag(argv, self.flag)
+        if not path:
+            return None
+        tracemalloc_top = 0
+        if self.tracemalloc_flag:
+            top_text = prescan_flag(argv, self.tracemalloc_flag)
+            try:
+                tracemalloc_top = int(top_text) if top_text else 0
+            except ValueError:
+                pass  # reported by the full parse
+        subcmds, flag_names = prescan_invocation(cmd, argv, exclude=[f.name for f in self.flags])
+        invocation = {'command': cmd.name, 'subcmds': list(subcmds), 'flags': flag_names}
+        return RusageReporter(path, invocation, tracemalloc_top=tracemalloc_top)
+
+    def wrap_run(self, argv, cmd, run):
+        "Returns *run*, reported on if *argv* enables resource usage reports."
+        reporter = self.get_reporter(argv, cmd)
+        return run if reporter is None else partial(reporter.run, run)
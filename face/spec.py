@@ -0,0 +1,344 @@
+"""Exporting the structure of a face command tree as a plain data
+spec, and rebuilding a parse-only :class:`Parser` from one.
+
+Docs sites, shell completion, web UIs, and validators often need to
+know a CLI's subcommands, flags, and positional arguments, but
+shouldn't have to import and construct the whole :class:`Command`
+(and everything its handlers import) to find out. :func:`get_spec`
+captures a Parser or Command tree as a dict of only dicts, lists,
+strings, numbers, booleans, and ``None``, ready for :mod:`json` or
+any similar serializer::
+
+  spec = get_spec(cmd)
+  with open('cli-spec.json', 'w') as f:
+      json.dump(spec, f)
+
+The spec has a ``flags`` list, with each distinct :class:`Flag`
+appearing once, and a ``paths`` list, with one entry per subcommand
+path, root first. Each path entry has the subcommand's name, doc,
+positional argument specs, and the indexes into ``flags`` of the
+flags it accepts. For Commands, these are only the flags the
+subcommand's handler and middlewares actually use, as when parsing.
+
+:func:`load_spec` turns a spec back into a :class:`Parser`, without
+the conflict checks and signature inspection of the original
+construction. Its parse results match those of the original tree
+for all converters the spec can describe:
+
+  * builtin types like ``str``, ``int``, and ``float``
+  * :class:`ListParam`, :class:`ChoicesParam`, :class:`FilePathParam`,
+    and :class:`FileValueParam`, with any of the above as their
+    converters
+  * argument-less flags, whose *parse_as* is a value
+
+Other converters are recorded by ``"module:qualname"`` name, and must
+be passed to :func:`load_spec` in its *converters* mapping. Likewise,
+custom *multi* callables. Flag *missing* values must be of the plain
+types above, so that they survive serialization.
+
+The loaded Parser is for parsing and help output only; it has no
+handlers or middlewares to run.
+"""
+
+import builtins
+from collections import OrderedDict
+
+from face.utils import ERROR
+from face.config import ConfigFile
+from face.parser import (Flag,
+                         Parser,
+                         PosArgSpec,
+                         ListParam,
+                         ChoicesParam,
+                         FilePathParam,
+                         FileValueParam,
+                         _FileChoices,
+                         _MULTI_SHORTCUTS)
+
+
+SPEC_VERSION = 1
+
+_MULTI_NAMES = {_MULTI_SHORTCUTS['error']: 'error',
+                _MULTI_SHORTCUTS['extend']: 'extend',
+                _MULTI_SHORTCUTS['override']: 'override'}
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def _is_plain(value):
+    if isinstance(value, _PLAIN_TYPES):
+        return True
+    if isinstance(value, list):
+        return all(_is_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_plain(v) for k, v in value.items())
+    return False
+
+
+def _get_callable_name(func):
+    target = func if hasattr(func, '__qualname__') else type(func)
+    return f'{target.__module__}:{target.__qualname__}'
+
+
+def _export_converter(parse_as):
+    if parse_as is None:
+        return None
+    if isinstance(parse_as, ListParam):
+        return {'type': 'list',
+                'parse_one_as': _export_converter(parse_as.parse_one_as),
+                'sep': parse_as.sep,
+                'strip': parse_as.strip,
+                'min_count': parse_as.min_count,
+                'max_count': parse_as.max_count,
+                'typecode': parse_as.typecode}
+    if isinstance(parse_as, ChoicesParam):
+        ret = {'type': 'choices',
+               'ignore_case': parse_as.ignore_case,
+               'allow_prefix': parse_as.allow_prefix}
+        if isinstance(parse_as._source, _FileChoices):
+            # stays lazy, and picks up changes to the file
+            ret['from_file'] = parse_as._source.path
+        else:
+            choices = parse_as.choices
+            if not _is_plain(choices):
+                raise ValueError(f'expected choices of plain types, not: {choices!r}')
+            ret['choices'] = list(choices)
+        ret['parse_as'] = _export_converter(parse_as.parse_as)
+        return ret
+    if isinstance(parse_as, FilePathParam):
+        return {'type': 'path',
+                'exists': parse_as.exists,
+                'path_type': parse_as.type,
+                'perms': parse_as.perms,
+                'can_create': parse_as.can_create,
+                'abspath': parse_as.abspath,
+                'glob': parse_as.glob,
+                'workers': parse_as.workers}
+    if isinstance(parse_as, FileValueParam):
+        return {'type': 'file_value',
+                'parse_as': _export_converter(parse_as.parse_as),
+                'strip': parse_as.strip,
+                'encoding': parse_as.encoding}
+    if callable(parse_as):
+        return {'type': 'callable', 'name': _get_callable_name(parse_as)}
+    if not _is_plain(parse_as):
+        raise ValueError(f'expected parse_as value of a plain type, not: {parse_as!r}')
+    return {'type': 'value', 'value': parse_as}
+
+
+def _export_flag(flag):
+    if flag.missing is not ERROR and not _is_plain(flag.missing):
+        raise ValueError(f'expected flag {flag.name} missing value of a plain type,'
+                         f' not: {flag.missing!r}')
+    multi = _MULTI_NAMES.get(flag.multi)
+    if multi is None:
+        multi = {'type': 'callable', 'name': _get_callable_name(flag.multi)}
+    display = flag.display
+    return {'name': flag.name,
+            'char': flag.char,
+            'doc': flag.doc,
+            'parse_as': _export_converter(flag.parse_as),
+            'required': flag.missing is ERROR,
+            'missing': None if flag.missing is ERROR else flag.missing,
+            'multi': multi,
+            'env': flag.env,
+            'display': {'label': display.label,
+                        'post_doc': display.post_doc,
+                        'full_doc': display.full_doc,
+                        'value_name': display.value_name,
+                        'group': display.group,
+                        'hidden': display._hide,
+                        'sort_key': display.sort_key}}
+
+
+def _export_posargs(posargspec):
+    display = posargspec.display
+    parse_as = None
+    if posargspec.accepts_args:
+        parse_as = _export_converter(posargspec.parse_as)
+    return {'parse_as': parse_as,
+            'min_count': posargspec.min_count,
+            'max_count': posargspec.max_count,
+            'provides': posargspec.provides,
+            'response_files': posargspec.response_files,
+            'nul_delimited': posargspec.nul_delimited,
+            'lazy': posargspec.lazy,
+            'display': {'name': display.name,
+                        'doc': display.doc,
+                        'post_doc': display.post_doc,
+                        'hidden': display._hide,
+                        'label': display.label}}
+
+
+def get_spec(prs):
+    """Returns a JSON-serializable dict describing the subcommands,
+    flags, and positional arguments of *prs*, a :class:`Parser` or
+    :class:`Command`. See :func:`load_spec`.
+
+    Raises ValueError if a flag's *missing* value, an argument-less
+    flag's value, or a set of choices can't be represented with
+    plain types.
+    """
+    if not isinstance(prs, Parser):
+        raise TypeError(f'expected Parser or Command, not: {prs!r}')
+    flags, flag_index = [], {}
+    paths = []
+    for path in [()] + list(prs.subprs_map):
+        subprs = prs.subprs_map[path] if path else prs
+        path_flag_indexes = []
+        for flag in prs.get_flags(path):
+            if id(flag) not in flag_index:
+                flag_index[id(flag)] = len(flags)
+                flags.append(_export_flag(flag))
+            path_flag_indexes.append(flag_index[id(flag)])
+        paths.append({'path': list(path),
+                      'name': subprs.name,
+                      'doc': subprs.doc,
+                      'posargs': _export_posargs(subprs.posargs),
+                      'post_posargs': _export_posargs(subprs.post_posargs),
+                      'flags': path_flag_indexes})
+    configfile = None
+    if prs.configfile is not None:
+        configfile = {'paths': list(prs.configfile.paths), 'format': prs.configfile.format}
+    flagfile = None
+    if prs.flagfile_flag is not None:
+        if id(prs.flagfile_flag) not in flag_index:
+            flag_index[id(prs.flagfile_flag)] = len(flags)
+            flags.append(_export_flag(prs.flagfile_flag))
+        flagfile = flag_index[id(prs.flagfile_flag)]
+    return {'spec_version': SPEC_VERSION,
+            'configfile': configfile,
+            'flagfile': flagfile,
+            'flags': flags,
+            'paths': paths}
+
+
+class _SpecLoader:
+    def __init__(self, converters=None):
+        self.converters = dict(converters or {})
+
+    def resolve(self, name):
+        try:
+            return self.converters[name]
+        except KeyError:
+            pass
+        module_name, _, qualname = name.partition(':')
+        if module_name == 'builtins' and callable(getattr(builtins, qualname, None)):
+            ret = self.converters[name] = getattr(builtins, qualname)
+            return ret
+        raise ValueError(f'unknown converter {name!r}, expected it in the converters mapping')
+
+    def load_converter(self, desc):
+        if desc is None:
+            return None
+        conv_type = desc['type']
+        if conv_type == 'value':
+            return desc['value']
+        if conv_type == 'callable':
+            return self.resolve(desc['name'])
+        if conv_type == 'list':
+            return ListParam(self.load_converter(desc['parse_one_as']), sep=desc['sep'],
+                             strip=desc['strip'], min_count=desc['min_count'],
+                             max_count=desc['max_count'], typecode=desc['typecode'])
+        if conv_type == 'choices':
+            kwargs = {'parse_as': self.load_converter(desc['parse_as']),
+                      'ignore_case': desc['ignore_case'],
+                      'allow_prefix': desc['allow_prefix']}
+            if 'from_file' in desc:
+                return ChoicesParam.from_file(desc['from_file'], **kwargs)
+            return ChoicesParam(desc['choices'], **kwargs)
+        if conv_type == 'path':
+            return FilePathParam(exists=desc['exists'], type=desc['path_type'],
+                                 perms=desc['perms'], can_create=desc['can_create'],
+                                 abspath=desc['abspath'], glob=desc['glob'],
+                                 workers=desc['workers'])
+        if conv_type == 'file_value':
+            return FileValueParam(self.load_converter(desc['parse_as']), strip=desc['strip'],
+                                  encoding=desc['encoding'])
+        raise ValueError(f'unknown converter type in spec: {conv_type!r}')
+
+    def load_flag(self, desc):
+        multi = desc['multi']
+        multi = self.resolve(multi['name']) if isinstance(multi, dict) else _MULTI_SHORTCUTS[multi]
+        # names and chars in specs were validated when the original
+        # flags were created, so skip Flag.__init__'s checks, which
+        # dominate load time for large trees
+        flag = Flag.__new__(Flag)
+        flag.name = desc['name']
+        flag.doc = desc['doc']
+        flag.parse_as = self.load_converter(desc['parse_as'])
+        flag.missing = ERROR if desc['required'] else desc['missing']
+        flag.env = desc['env']
+        flag.char = desc['char']
+        flag.multi = multi
+        flag.set_display(dict(desc['display']))
+        return flag
+
+    def load_posargs(self, desc):
+        parse_as = self.load_converter(desc['parse_as'])
+        return PosArgSpec(parse_as=ERROR if parse_as is None else parse_as,
+                          min_count=desc['min_count'],
+                          max_count=desc['max_count'],
+                          display=dict(desc['display']),
+                          provides=desc['provides'],
+                          response_files=desc['response_files'],
+                          nul_delimited=desc['nul_delimited'],
+                          lazy=desc['lazy'])
+
+    def load(self, spec):
+        version = spec.get('spec_version')
+        if version != SPEC_VERSION:
+            raise ValueError(f'expected spec_version {SPEC_VERSION!r}, not: {version!r}')
+        flags = [self.load_flag(desc) for desc in spec['flags']]
+        configfile = None
+        if spec['configfile'] is not None:
+            configfile = ConfigFile(spec['configfile']['paths'],
+                                    format=spec['configfile']['format'])
+        flagfile_flag = None if spec['flagfile'] is None else flags[spec['flagfile']]
+
+        root = None
+        for path_desc in spec['paths']:
+            path = tuple(path_desc['path'])
+            prs = Parser(path_desc['name'], doc=path_desc['doc'],
+                         posargs=self.load_posargs(path_desc['posargs']),
+                         post_posargs=self.load_posargs(path_desc['post_posargs']),
+                         flagfile=False, configfile=configfile)
+            prs.flagfile_flag = flagfile_flag
+            flag_map = OrderedDict()
+            for index in path_desc['flags']:
+                flag = flags[index]
+                flag_map[flag.name] = flag
+                if flag.char:
+                    flag_map[flag.char] = flag
+            prs._path_flag_map[()] = flag_map
+            if root is None:
+                if path:
+                    raise ValueError(f'expected the root path first in spec, not: {path!r}')
+                root = prs
+                ancestors = {(): root}
+                continue
+            ancestors[path] = prs
+            # register with each ancestor, as Parser._add_subparser would
+            for i in range(len(path)):
+                ancestor = ancestors[path[:i]]
+                ancestor.subprs_map[path[i:]] = prs
+                ancestor._path_flag_map[path[i:]] = flag_map
+        if root is None:
+            raise ValueError('expected at least one path in spec')
+        return root
+
+
+def load_spec(spec, converters=None):
+    """Returns a parse-only :class:`Parser` rebuilt from *spec*, as
+    returned by :func:`get_spec` (or loaded from its JSON).
+
+    Args:
+       spec (dict): The spec.
+       converters (dict): Maps ``"module:qualname"`` names, as recorded
+          in the spec, to converters and *multi* callables which
+          aren't builtins. For example, ``{'myapp.cli:parse_date':
+          parse_date}``.
+
+    Raises ValueError for specs of an unsupported version, and for
+    converters which can't be resolved.
+    """
+    return _SpecLoader(converters).load(spec)
@@ -0,0 +1,315 @@
+"""Tabular output for command handlers, as aligned columns for people,
+or as TSV, CSV, or NDJSON for other programs::
+
+  from face import Command, echo_table
+  from face.table import DEFAULT_FORMAT_FLAG
+
+  def ls(format):
+      echo_table(({'name': p.name, 'size': p.stat().st_size}
+                  for p in Path('.').iterdir()), format=format)
+
+  cmd = Command(ls)
+  cmd.add(DEFAULT_FORMAT_FLAG)
+
+Rows may be any iterable, including generators too large to hold in
+memory. In the default ``'stream'`` mode, column widths are measured
+over the first rows (*sample_size*), then the rest are written as
+they arrive, with any cells too wide for their column truncated or
+wrapped (*overflow*). The ``'full'`` mode reads all the rows first,
+so that every cell is measured. The machine formats never measure, and
+always stream.
+
+Either way, rows are formatted in batches and written with a single
+:func:`~face.echo` call per batch, rather than one per row.
+"""
+
+import io
+import sys
+import csv
+import json
+from itertools import islice
+
+from face.utils import echo, isatty
+from face.parser import Flag, ChoicesParam
+from face.helpers import get_winsize, get_text_width, _wrap_text
+
+
+TABLE_FORMATS = ('table', 'tsv', 'csv', 'ndjson')
+TABLE_MODES = ('stream', 'full')
+OVERFLOW_MODES = ('truncate', 'wrap')
+
+DEFAULT_FORMAT_FLAG = Flag('--format', parse_as=ChoicesParam(TABLE_FORMATS), missing='table',
+                           doc='output format, one of: ' + ', '.join(TABLE_FORMATS))
+DEFAULT_SAMPLE_SIZE = 100
+DEFAULT_BATCH_SIZE = 500
+MIN_COLUMN_WIDTH = 4
+
+_FLATTEN_TRANS = {ord(c): ' ' for c in '\t\n\x0b\x0c\r'}
+
+
+def _get_cell_text(value):
+    if value is None:
+        return ''
+    text = str(value)
+    if text.isprintable():
+        return text
+    return text.translate(_FLATTEN_TRANS)
+
+
+def _get_width(text):
+    # the common case, where every character is one column
+    if text.isascii() and text.isprintable():
+        return len(text)
+    return get_text_width(text)
+
+
+def _get_text_rows(value_rows, col_count):
+    ret = []
+    for row in value_rows:
+        if len(row) != col_count:
+            row = (row + [None] * (col_count - len(row)))[:col_count]
+        ret.append([_get_cell_text(v) for v in row])
+    return ret
+
+
+def _get_right_aligns(value_rows, col_count):
+    "Numeric columns are right-aligned"
+    ret = [True] * col_count
+    for row in value_rows:
+        for i, value in enumerate(row[:col_count]):
+            if value is not None and (type(value) is bool
+                                      or not isinstance(value, (int, float))):
+                ret[i] = False
+    return ret
+
+
+def _get_column_widths(text_rows, col_count):
+    widths = [1] * col_count  # room for an ellipsis, at least
+    for text_row in text_rows:
+        for i, text in enumerate(text_row):
+            width = _get_width(text)
+            if width > widths[i]:
+                widths[i] = width
+    return widths
+
+
+def _fit_widths(widths, sep_width, max_width):
+    """Narrow the widest columns, evenly, until all fit within
+    *max_width*. Columns are never narrowed below
+    MIN_COLUMN_WIDTH, so very many columns may still overflow."""
+    avail = max_width - sep_width * (len(widths) - 1)
+    if sum(widths) <= avail:
+        return widths
+    # find the largest cap where the capped widths fit
+    cap, remaining, rest = MIN_COLUMN_WIDTH, avail, len(widths)
+    for width in sorted(widths):
+        if width * rest > remaining:
+            cap = max(remaining // rest, MIN_COLUMN_WIDTH)
+            break
+        remaining -= width
+        rest -= 1
+    return [min(width, cap) for width in widths]
+
+
+def _truncate_text(text, width):
+    if text.isascii() and text.isprintable():
+        return text[:width - 1] + '…'
+    while get_text_width(text) > width - 1:
+        text = text[:-1]
+    return text + '…'
+
+
+class _TableFormatter:
+    "Formats rows as lines of aligned columns."
+    def __init__(self, widths, sep, overflow):
+        self.widths = widths
+        self.sep = sep
+        self.overflow = overflow
+
+    def _get_cell_lines(self, text, width):
+        if _get_width(text) <= width:
+            return [text]
+        if self.overflow == 'truncate':
+            return [_truncate_text(text, width)]
+        return _wrap_text(text, width) or ['']
+
+    def format_rows(self, rows, right_aligns, lines):
+        "Appends the lines of each row of cell texts to *lines*."
+        sep, widths = self.sep, self.widths
+        truncate = self.overflow == 'truncate'
+        col_aligns = list(zip(widths, right_aligns))
+        for row in rows:
+            parts, extra = [], None
+            for text, (width, right_align) in zip(row, col_aligns):
+                if text.isascii() and text.isprintable():
+                    if len(text) <= width:
+                        parts.append(text.rjust(width) if right_align else text.ljust(width))
+                        continue
+                    elif truncate:
+                        parts.append(text[:width - 1] + '…')
+                        continue
+                cell_lines = self._get_cell_lines(text, width)
+                if len(cell_lines) > 1:
+                    if extra is None:
+                        extra = {}
+                    extra[len(parts)] = cell_lines[1:]
+                parts.append(_pad(cell_lines[0], width, right_align))
+            lines.append(sep.join(parts).rstrip() + '\n')
+            if extra:
+                # wrapped cells continue on following lines
+                for j in range(max(len(v) for v in extra.values())):
+                    parts = []
+                    for i, width in enumerate(widths):
+                        cell_lines = extra.get(i, ())
+                        parts.append(_pad(cell_lines[j] if j < len(cell_lines) else '',
+                                          width, False))
+                    lines.append(sep.join(parts).rstrip() + '\n')
+        return lines
+
+
+def _pad(text, width, right_align):
+    fill = ' ' * (width - _get_width(text))
+    return fill + text if right_align else text + fill
+
+
+def _get_rows(rows, headers):
+    """Returns the header texts and an iterator of rows as lists of
+    values. Dict rows are looked up by header, which default to the
+    keys of the first row."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return (list(headers) if headers else None), iter(())
+    if isinstance(first, dict):
+        if headers is None:
+            headers = list(first)
+        headers = list(headers)
+
+        def _iter_rows():
+            yield [first.get(h) for h in headers]
+            for row in rows:
+                yield [row.get(h) for h in headers]
+        return headers, _iter_rows()
+
+    def _iter_seq_rows():
+        yield list(first)
+        for row in rows:
+            yield list(row)
+    return (list(headers) if headers is not None else None), _iter_seq_rows()
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def echo_table(rows, headers=None, *, format='table', mode='stream',
+               sample_size=DEFAULT_SAMPLE_SIZE, overflow='truncate', width=None,
+               sep='  ', batch_size=DEFAULT_BATCH_SIZE, err=False, file=None):
+    """Write *rows* to *file* as a table, or in another *format*.
+
+    Args:
+       rows: An iterable of rows, each a sequence of values, or a
+          dict of values keyed by header.
+       headers (list): Column names. Defaults to the keys of the first
+          row, if it's a dict, and otherwise no header line is written.
+       format (str): One of ``'table'`` (aligned columns), ``'tsv'``,
+          ``'csv'``, or ``'ndjson'`` (a JSON object per line, or array
+          if there are no *headers*). See :data:`DEFAULT_FORMAT_FLAG`.
+       mode (str): ``'stream'`` to measure columns over the first
+          *sample_size* rows, or ``'full'`` to measure all rows
+          before writing any. Only used for ``'table'`` format.
+       sample_size (int): How many rows to measure in ``'stream'`` mode.
+       overflow (str): ``'truncate'`` or ``'wrap'`` cells too wide for
+          their column.
+       width (int): The widest a table line can be. Defaults to the
+          terminal width if *file* is a terminal, and no limit
+          otherwise.
+       sep (str): The text between columns.
+       batch_size (int): How many rows to format per write.
+       err (bool): Set the default output file to ``sys.stderr``
+       file: Stream or other file-like object to output to. Defaults
+          to ``sys.stdout``, or ``sys.stderr`` if *err* is True.
+
+    Numbers are right-aligned, ``None`` is written as an empty
+    cell, and other values are converted with :func:`str`.
+    """
+    if format not in TABLE_FORMATS:
+        raise ValueError(f'expected format to be one of {TABLE_FORMATS!r}, not {format!r}')
+    if mode not in TABLE_MODES:
+        raise ValueError(f'expected mode to be one of {TABLE_MODES!r}, not {mode!r}')
+    if overflow not in OVERFLOW_MODES:
+        raise ValueError(f'expected overflow to be one of {OVERFLOW_MODES!r}, not {overflow!r}')
+    headers, rows = _get_rows(rows, headers)
+    echo_kw = {'err': err, 'file': file, 'nl': False}
+
+    if format == 'table':
+        _echo_text_table(rows, headers, mode, sample_size, overflow, width, sep,
+                         batch_size, echo_kw)
+        return
+
+    for batch in _batched(rows, batch_size):
+        if format == 'ndjson':
+            if headers is None:
+                lines = [json.dumps(row, default=str) + '\n' for row in batch]
+            else:
+                lines = [json.dumps(dict(zip(headers, row)), default=str) + '\n' for row in batch]
+            echo(''.join(lines), **echo_kw)
+            continue
+        if headers is not None:
+            batch.insert(0, headers)
+            headers = None
+        if format == 'csv':
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator='\n').writerows(batch)
+            echo(buf.getvalue(), **echo_kw)
+        else:
+            echo(''.join('\t'.join([_get_cell_text(v) for v in row]) + '\n' for row in batch),
+                 **echo_kw)
+    return
+
+
+def _echo_text_table(rows, headers, mode, sample_size, overflow, width, sep,
+                     batch_size, echo_kw):
+    if mode == 'full':
+        sample, rest = list(rows), ()
+    else:
+        sample, rest = list(islice(rows, sample_size)), rows
+    if not sample and headers is None:
+        return
+    col_count = len(headers) if headers is not None else max(len(row) for row in sample)
+
+    sample_texts = _get_text_rows(sample, col_count)
+    right_aligns = _get_right_aligns(sample, col_count)
+    header_texts = [_get_cell_text(h) for h in headers] if headers is not None else None
+    widths = _get_column_widths(sample_texts + ([header_texts] if header_texts else []),
+                                col_count)
+    if width is None:
+        file = echo_kw['file'] or (sys.stderr if echo_kw['err'] else sys.stdout)
+        _, term_width = get_winsize()
+        if term_width and isatty(file):
+            width = term_width - 1
+    if width:
+        widths = _fit_widths(widths, len(sep), width)
+
+    formatter = _TableFormatter(widths, sep, overflow)
+    lines = []
+    if header_texts:
+        formatter.format_rows([header_texts], [False] * col_count, lines)
+        lines.append(sep.join('-' * w for w in widths) + '\n')
+    for start in range(0, len(sample_texts), batch_size):
+        formatter.format_rows(sample_texts[start:start + batch_size], right_aligns, lines)
+        echo(''.join(lines), **echo_kw)
+        lines = []
+    for batch in _batched(rest, batch_size):
+        # after the sample, a column's alignment is fixed
+        formatter.format_rows(_get_text_rows(batch, col_count), right_aligns, lines)
+        echo(''.join(lines), **echo_kw)
+        lines = []
+    if lines:
+        echo(''.join(lines), **echo_kw)
+    return
@@ -1,10 +1,18 @@
+import os
+import csv
+import enum
+from array import array
 from random import shuffle
 
 import pytest
 
-from face import (Command, Flag, ERROR, FlagDisplay, PosArgSpec,
-                  PosArgDisplay, ChoicesParam, CommandLineError,
-                  ArgumentParseError, echo, prompt, CommandChecker)
+import face.parser
+
+from face import (Command, Parser, Flag, ERROR, FlagDisplay, PosArgSpec,
+                  PosArgDisplay, ChoicesParam, ListParam, FilePathParam, FileValueParam,
+                  CommandLineError,
+                  ArgumentParseError, echo, prompt, CommandChecker, HelpHandler)
+from face.parser import parse_sv_line
 from face.utils import format_flag_label, identifier_to_flag, get_minimal_executable
 
 def test_cmd_name():
@@ -132,6 +140,29 @@ def test_minimal_exe():
     assert res == venv_exe_path
 
 
+def test_lazy_cmd_scope(monkeypatch):
+    calls = []
+
+    def _get_minimal_executable():
+        calls.append(1)
+        return 'python'
+
+    monkeypatch.setattr(face.parser, 'get_minimal_executable', _get_minimal_executable)
+    argv = ['/path/to/pkg/__main__.py']
+
+    cmd = Command(lambda posargs_: 'ok', name='cmd', posargs=True)
+    assert cmd.run(argv) == 'ok'
+    assert not calls
+
+    cmd = Command(lambda cmd_: cmd_, name='cmd')
+    assert cmd.run(argv) == 'python -m pkg'
+    assert calls == [1]
+
+    res = cmd.parse(argv)
+    assert 'cmd_' not in res.to_cmd_scope(names=['flags_'])
+    assert res.to_cmd_scope()['cmd_'] == 'python -m pkg'
+
+
 def test_posargspec_init():
     with pytest.raises(TypeError, match='expected callable or ERROR'):
         PosArgSpec(parse_as=object())
@@ -207,6 +238,74 @@ def test_bad_subprs():
         cmd.add_command(object())
 
 
+def test_clone_subtree():
+    calls = []
+
+    def list_users(verbose):
+        calls.append(('users', verbose))
+
+    def list_groups():
+        calls.append('groups')
+
+    admin = Command(None, 'admin')
+    admin.add('--verbose', parse_as=True)
+    admin.add(list_users, 'users')
+    admin.add(list_groups, 'groups')
+
+    cmd = Command(None, 'ops')
+    cmd.add(admin)
+    cmd.add(admin.clone('adm', doc='alias of admin'))
+    assert cmd.subprs_map[('adm',)].doc == 'alias of admin'
+    assert cmd.subprs_map[('adm', 'users')] is cmd.subprs_map[('admin', 'users')]
+    # flag maps and compiled chains are shared between the two names
+    assert cmd._path_flag_map[('adm', 'users')] is cmd._path_flag_map[('admin', 'users')]
+    cmd.prepare()
+    assert cmd._path_wrapped_map[('adm', 'users')] is cmd._path_wrapped_map[('admin', 'users')]
+
+    cmd.run(['ops', 'admin', 'users', '--verbose'])
+    cmd.run(['ops', 'adm', 'users'])
+    assert calls == [('users', True), ('users', None)]
+
+    # clones are copy-on-write, in both directions
+    clone = admin.clone()
+    clone.add('--extra', char='e')
+    admin.add('--other')
+    assert 'extra' not in admin._path_flag_map[('users',)]
+    assert 'extra' in clone._path_flag_map[('users',)]
+    assert 'other' not in clone._path_flag_map[('users',)]
+    assert 'extra' not in cmd._path_flag_map[('adm', 'users')]
+
+    prs = Parser('prs', flags=[Flag('--flag')])
+    prs_clone = prs.clone('prs2')
+    prs_clone.add('--flag2')
+    assert prs_clone.name == 'prs2'
+    assert [f.name for f in prs.get_flags()] == ['flag', 'flagfile']
+
+
+def test_scope_names():
+    def handler(verbose, cmd_):
+        return cmd_
+
+    cmd = Command(handler, name='cmd')
+    cmd.add('--verbose', parse_as=True)
+    assert cmd.run(['cmd', '--verbose']) == 'cmd'
+    # the builtins the handler takes are found once, when it's prepared
+    assert set(cmd._path_wrapped_map[()]._face_scope_names) == {'verbose', 'cmd_'}
+
+    class HelpFunc:
+        __hash__ = None
+
+        def __eq__(self, other):
+            return self is other
+
+        def __call__(self, cmd_):
+            return 'help for ' + cmd_
+
+    cmd = Command(None, name='cmd', help=HelpHandler(func=HelpFunc()))
+    assert cmd.run(['cmd']) == 'help for cmd'
+    assert cmd.run(['cmd', '--help']) == 'help for cmd'
+
+
 def test_choices_init():
     with pytest.raises(ValueError, match='expected at least one'):
         ChoicesParam(choices=[])
@@ -220,6 +319,278 @@ def test_choices_init():
     choices_param = ChoicesParam(choices=choices)
     assert choices == choices_param.choices
     assert choices is not choices_param.choices
+    assert choices_param.parse_as is Unsortable
+
+
+def test_choices_param():
+    cp = ChoicesParam(['py', 'js', 'html'])
+    assert cp('py') == 'py'
+    with pytest.raises(ArgumentParseError, match=r"expected one of \['html', 'js', 'py'\]"):
+        cp('PY')
+
+    cp = ChoicesParam(['Python', 'PyPy', 'JavaScript'], ignore_case=True, allow_prefix=True)
+    assert cp('python') == 'Python'
+    assert cp('JAVA') == 'JavaScript'
+    assert cp('pyp') == 'PyPy'
+    with pytest.raises(ArgumentParseError, match="ambiguous choice 'py'"):
+        cp('py')
+    with pytest.raises(ArgumentParseError):
+        cp('')
+
+    regions = [f'region-{i:04}' for i in range(5000)]
+    cp = ChoicesParam(regions, allow_prefix=True)
+    assert cp('region-0042') == 'region-0042'
+    assert cp('region-4999') == 'region-4999'
+    with pytest.raises(ArgumentParseError) as exc_info:
+        cp('regoin-0042')
+    msg = str(exc_info.value)
+    assert 'expected one of 5000 choices' in msg
+    assert "did you mean 'region-0042'" in msg
+    assert len(msg) < 200
+
+    # unhashable choices fall back to the list
+    cp = ChoicesParam([[1], [2]], parse_as=lambda text: [int(text)])
+    assert cp('2') == [2]
+    with pytest.raises(ArgumentParseError):
+        cp('3')
+
+
+def test_choices_lazy(tmp_path):
+    calls = []
+
+    def get_choices():
+        calls.append(1)
+        return [3, 1, 2]
+
+    cp = ChoicesParam(get_choices)
+    assert 'get_choices' in repr(cp)
+    cmd = Command(lambda level=None: level, name='cmd')
+    cmd.add('--level', cp)
+    assert cmd.run(['cmd']) is None
+    assert not calls
+
+    assert cmd.run(['cmd', '--level', '2']) == 2
+    assert cp.choices == [1, 2, 3]
+    assert calls == [1]
+    cmd.run(['cmd', '--level', '3'])
+    assert calls == [1]
+    assert repr(cp) == "ChoicesParam([1, 2, 3], parse_as=<class 'int'>)"
+
+    choices_path = tmp_path / 'tables.txt'
+    choices_path.write_text('# tables\nusers\n\n  orders  \n')
+    cp = ChoicesParam.from_file(str(choices_path))
+    assert 'tables.txt' in repr(cp)
+    assert cp('orders') == 'orders'
+    assert cp.choices == ['orders', 'users']
+
+    with pytest.raises(ValueError, match='expected at least one'):
+        ChoicesParam(lambda: []).parse('x')
+
+
+def test_choices_enum():
+    class Color(enum.Enum):
+        RED = 'red'
+        BLUE = 'blue'
+
+    cp = ChoicesParam(Color)
+    assert cp.choices == [Color.RED, Color.BLUE]
+    assert cp('blue') is Color.BLUE
+
+    cmd = Command(lambda color: color, name='cmd')
+    cmd.add('--color', cp)
+    assert cmd.run(['cmd', '--color', 'red']) is Color.RED
+    with pytest.raises(CommandLineError):
+        cmd.run(['cmd', '--color', 'green'])
+
+
+def test_parse_sv_line():
+    # the split fast path should agree with the csv module
+    cases = ['', 'a', 'a,b', ',', 'a,,b', ' a , b ', 'a,"b,c"', 'a\\,b',
+             '"a""b",c', 'a\tb,c', 'ü,ß']
+    for line in cases:
+        expected = (list(csv.reader([line], delimiter=',', escapechar='\\')) or [[]])[0]
+        assert parse_sv_line(line) == expected
+    assert parse_sv_line('a|b|"c|d"', sep='|') == ['a', 'b', 'c|d']
+
+
+def test_list_param():
+    lp = ListParam()
+    assert lp('a,b') == ['a', 'b']
+    assert lp('') == []
+
+    lp = ListParam(int, min_count=1, max_count=3)
+    assert lp('1,2,3') == [1, 2, 3]
+    with pytest.raises(ValueError, match='at least 1'):
+        lp('')
+    with pytest.raises(ValueError, match='at most 3'):
+        lp('1,2,3,4')
+
+    lp = ListParam(typecode='q', strip=True)
+    assert lp.parse_one_as is int
+    ids = lp(' 1, 2,3 ')
+    assert isinstance(ids, array)
+    assert ids == array('q', [1, 2, 3])
+    assert ListParam(typecode='d')('0.5,1') == array('d', [0.5, 1.0])
+
+    cmd = Command(lambda ids: ids, name='cmd')
+    cmd.add('--ids', ListParam(typecode='i', max_count=2))
+    assert cmd.run(['cmd', '--ids', '4,5']) == array('i', [4, 5])
+    with pytest.raises(ArgumentParseError, match='at most 2'):
+        cmd.parse(['cmd', '--ids', '4,5,6'])
+
+    assert repr(ListParam()) == "ListParam(<class 'str'>, sep=',', strip=False)"
+    assert 'max_count=2' in repr(ListParam(max_count=2))
+
+    with pytest.raises(ValueError, match='typecode'):
+        ListParam(typecode='x')
+    with pytest.raises(ValueError, match='min_count'):
+        ListParam(min_count=-1)
+    with pytest.raises(ValueError, match='max_count'):
+        ListParam(min_count=2, max_count=1)
+    with pytest.raises(ValueError, match='sep'):
+        ListParam(sep='::')
+
+
+def test_file_path_param(tmp_path):
+    for i in range(20):
+        (tmp_path / f'{i:02}.txt').write_text('x')
+    sub_dir = tmp_path / 'sub'
+    sub_dir.mkdir()
+    file_path = str(tmp_path / '00.txt')
+
+    assert FilePathParam()('nonexistent') == 'nonexistent'
+    assert FilePathParam(exists=True, type='f', perms='rw')(file_path) == file_path
+    assert FilePathParam(type='d', abspath=True)(str(sub_dir)) == str(sub_dir)
+    with pytest.raises(ArgumentParseError, match='does not exist'):
+        FilePathParam(exists=True)(str(tmp_path / 'nope'))
+    with pytest.raises(ArgumentParseError, match='already exists'):
+        FilePathParam(exists=False)(file_path)
+    with pytest.raises(ArgumentParseError, match='expected path to be a directory'):
+        FilePathParam(type='d')(file_path)
+    with pytest.raises(ArgumentParseError, match='could not access'):
+        FilePathParam()(file_path + '/child')
+
+    can_create = FilePathParam(can_create=True)
+    assert can_create(str(sub_dir / 'new.txt'))
+    with pytest.raises(ArgumentParseError, match='parent directory does not exist'):
+        can_create(str(tmp_path / 'missing' / 'new.txt'))
+
+    # posargs are checked in a batch, with all failures reported together
+    cmd = Command(lambda posargs_: posargs_, name='cmd',
+                  posargs=FilePathParam(exists=True, type='f', glob=True, workers=4))
+    paths = cmd.run(['cmd', str(tmp_path / '1*.txt'), file_path])
+    assert list(paths) == [str(tmp_path / f'{i}.txt') for i in range(10, 20)] + [file_path]
+
+    with pytest.raises(ArgumentParseError) as exc_info:
+        cmd.parse(['cmd', str(tmp_path / '*.nope'), file_path, str(sub_dir), 'missing.txt'])
+    msg = str(exc_info.value)
+    assert msg.startswith('3 positional arguments failed to parse as path')
+    assert 'no paths match pattern' in msg
+    assert 'expected path to be a file' in msg
+    assert 'path does not exist' in msg
+
+    many_missing = [str(tmp_path / f'missing_{i}') for i in range(100)]
+    with pytest.raises(ArgumentParseError, match='and 95 more'):
+        cmd.parse(['cmd'] + many_missing)
+
+    with pytest.raises(ArgumentParseError, match="positional argument failed to parse as path: 'missing.txt'"):
+        cmd.parse(['cmd', 'missing.txt'])
+
+    with pytest.raises(ValueError, match='type'):
+        FilePathParam(type='x')
+    with pytest.raises(ValueError, match='perms'):
+        FilePathParam(perms='rwz')
+    with pytest.raises(ValueError, match='required not to exist'):
+        FilePathParam(exists=False, type='f')
+    with pytest.raises(ValueError, match='workers'):
+        FilePathParam(workers=0)
+
+
+def test_file_value_param(tmp_path):
+    secret_path = tmp_path / 'password'
+    secret_path.write_text('hunter2\n\n')
+    port_path = tmp_path / 'port'
+    port_path.write_text('8080\n')
+
+    cmd = Command(lambda password, port=None: (password, port), name='cmd')
+    cmd.add('--password', FileValueParam(), missing=None)
+    cmd.add('--port', FileValueParam(int))
+    assert cmd.run(['cmd', '--password', str(secret_path), '--port', str(port_path)]) == ('hunter2', 8080)
+
+    flagfile_path = tmp_path / 'cmd.flags'
+    flagfile_path.write_text(f'--password {secret_path}\n')
+    assert cmd.run(['cmd', '--flagfile', str(flagfile_path)]) == ('hunter2', None)
+
+    # errors identify the file, but never echo its contents
+    secret_path.write_text('sw0rdfish')
+    with pytest.raises(ArgumentParseError) as exc_info:
+        cmd.parse(['cmd', '--port', str(secret_path)])
+    assert str(secret_path) in str(exc_info.value)
+    assert 'sw0rdfish' not in str(exc_info.value)
+    assert exc_info.value.__context__.__suppress_context__
+
+    secret_path.write_bytes(b'\xffsw0rdfish')
+    with pytest.raises(ArgumentParseError) as exc_info:
+        cmd.parse(['cmd', '--password', str(secret_path)])
+    assert 'utf-8 text' in str(exc_info.value)
+    assert 'sw0rdfish' not in str(exc_info.value)
+
+    with pytest.raises(ArgumentParseError, match='could not read value from file'):
+        cmd.parse(['cmd', '--password', str(tmp_path / 'missing')])
+
+
+def test_file_value_param_cache(tmp_path, monkeypatch):
+    value_path = tmp_path / 'value'
+    value_path.write_text('a' * 100)
+    calls = []
+
+    def _count_len(text):
+        calls.append(text)
+        return len(text)
+
+    fvp = FileValueParam(_count_len, strip=False)
+    assert fvp(str(value_path)) == 100
+    assert fvp(str(value_path)) == 100
+    assert len(calls) == 1
+
+    stat_res = os.stat(value_path)
+    value_path.write_text('b' * 10)
+    os.utime(value_path, ns=(stat_res.st_atime_ns, stat_res.st_mtime_ns + 1000))
+    assert fvp(str(value_path)) == 10
+    assert len(calls) == 2
+
+    # the cache is keyed on the converter itself, not its name or repr
+    def _count_len(text):
+        return -len(text)
+    fvp.parse_as = _count_len
+    assert fvp(str(value_path)) == -10
+
+    # mutable values are parsed anew each time, so changes don't leak
+    list_fvp = FileValueParam(lambda text: text.split(','))
+    value_path.write_text('a,b')
+    first = list_fvp(str(value_path))
+    first.append('c')
+    assert list_fvp(str(value_path)) == ['a', 'b']
+
+    # the cache holds a bounded number of paths, dropping stale entries
+    monkeypatch.setattr(face.parser, 'FILE_VALUE_CACHE_SIZE', 3)
+    paths = [tmp_path / f'value{i}' for i in range(5)]
+    for path in paths:
+        path.write_text('x')
+        fvp(str(path))
+    assert list(fvp._cache) == [str(p) for p in paths[2:]]
+    fvp(str(paths[2]))  # a hit makes it the most recently used
+    fvp(str(paths[0]))
+    assert list(fvp._cache) == [str(p) for p in (paths[4], paths[2], paths[0])]
+    fvp.parse_as = lambda text: [text]
+    fvp(str(paths[0]))
+    assert str(paths[0]) not in fvp._cache
+
+    assert repr(fvp).startswith('FileValueParam(<function')
+    assert 'strip=False' in repr(fvp)
+    assert repr(FileValueParam()) == "FileValueParam(<class 'str'>)"
+    with pytest.raises(LookupError):
+        FileValueParam(encoding='nope')
 
 
 def test_echo(capsys):
@@ -262,3 +633,171 @@ def test_post_posargs():
     res = cmd.parse(['cmd', '--'])
     assert res.posargs == ()
     assert res.post_posargs == ()
+
+
+def test_flag_env(tmp_path, monkeypatch):
+    cmd = Command(lambda port, host, verbose, tags: (port, host, verbose, tags), name='cmd')
+    cmd.add('--port', int, missing=8080, env='TEST_FACE_PORT')
+    cmd.add('--host', missing=ERROR, env='TEST_FACE_HOST')
+    cmd.add('--verbose', char='V', parse_as=True, env='TEST_FACE_VERBOSE')
+    cmd.add('--tags', multi='extend', env='TEST_FACE_TAGS')
+
+    for name in ('PORT', 'HOST', 'VERBOSE', 'TAGS'):
+        monkeypatch.delenv('TEST_FACE_' + name, raising=False)
+
+    with pytest.raises(ArgumentParseError, match='missing required'):
+        cmd.parse(['cmd'])
+
+    monkeypatch.setenv('TEST_FACE_HOST', 'example.com')
+    monkeypatch.setenv('TEST_FACE_VERBOSE', 'no')
+    res = cmd.parse(['cmd'])
+    assert res.flags['host'] == 'example.com'
+    assert res.flags['verbose'] is None
+    assert res.flag_sources['host'] == 'env'
+    assert res.flag_sources['port'] == res.flag_sources['verbose'] == 'missing'
+
+    monkeypatch.setenv('TEST_FACE_PORT', '9090')
+    monkeypatch.setenv('TEST_FACE_VERBOSE', 'Yes')
+    monkeypatch.setenv('TEST_FACE_TAGS', 'a')
+    assert cmd.run(['cmd']) == (9090, 'example.com', True, ['a'])
+
+    # argv and flagfiles take precedence over the environment
+    flagfile_path = tmp_path / 'cmd.flags'
+    flagfile_path.write_text('--port 7070\n')
+    res = cmd.parse(['cmd', '--host', 'localhost', '--flagfile', str(flagfile_path)])
+    assert res.flags['host'] == 'localhost'
+    assert res.flags['port'] == 7070
+    assert res.flag_sources['host'] == 'argv'
+    assert res.flag_sources['port'] == 'flagfile'
+    assert res.flag_sources['flagfile'] == 'argv'
+    assert res.flag_sources['tags'] == 'env'
+
+    monkeypatch.setenv('TEST_FACE_PORT', 'eighty')
+    with pytest.raises(ArgumentParseError, match='from environment variable TEST_FACE_PORT'):
+        cmd.parse(['cmd'])
+    monkeypatch.setenv('TEST_FACE_PORT', '80')
+
+    monkeypatch.setenv('TEST_FACE_VERBOSE', 'maybe')
+    with pytest.raises(ArgumentParseError, match='expected a true or false value'):
+        cmd.parse(['cmd'])
+
+    # the env var index is built once per path, and rebuilt after add()
+    env_flag_map = cmd._get_env_flag_map(())
+    assert sorted(env_flag_map) == ['TEST_FACE_HOST', 'TEST_FACE_PORT',
+                                    'TEST_FACE_TAGS', 'TEST_FACE_VERBOSE']
+    cmd.parse(['cmd', '--verbose'])
+    assert cmd._get_env_flag_map(()) is env_flag_map
+    cmd.add('--user', missing=None, env='TEST_FACE_USER')
+    monkeypatch.setenv('TEST_FACE_USER', 'me')
+    assert 'TEST_FACE_USER' in cmd._get_env_flag_map(())
+    # flags the handler doesn't use are skipped
+    assert 'user' not in cmd.parse(['cmd', '--verbose']).flags
+    prs = Parser('prs', flags=[Flag('--user', env='TEST_FACE_USER')])
+    assert prs.parse(['prs']).flags['user'] == 'me'
+
+    assert "env='TEST_FACE_PORT'" in repr(cmd.get_flag_map()['port'])
+    with pytest.raises(ValueError, match='environment variable name'):
+        Flag('--port', env='')
+
+
+def test_posargs_response_files(tmp_path):
+    resp_path = tmp_path / 'args.txt'
+    resp_path.write_text('b\n\nc d\r\n@not-expanded\n')
+    nul_path = tmp_path / 'args.nul'
+    nul_path.write_bytes(b'x\0y\ny\0' * 50000)
+
+    cmd = Command(lambda posargs_: posargs_, name='cmd',
+                  posargs=PosArgSpec(response_files=True, max_count=5))
+    assert cmd.run(['cmd', 'a', f'@{resp_path}', '@@e']) == ('a', 'b', 'c d', '@not-expanded', '@e')
+    with pytest.raises(ArgumentParseError, match='too many arguments, expected up to 5 arguments, got 6'):
+        cmd.parse(['cmd', 'a', 'f', f'@{resp_path}', 'g'])
+    with pytest.raises(ArgumentParseError, match='failed to read response file'):
+        cmd.parse(['cmd', f'@{tmp_path / "missing.txt"}'])
+    with pytest.raises(ArgumentParseError, match='expected path'):
+        cmd.parse(['cmd', '@'])
+
+    cmd = Command(lambda posargs_: len(posargs_), name='cmd',
+                  posargs=PosArgSpec(response_files=True, nul_delimited=True))
+    assert cmd.run(['cmd', f'@{nul_path}']) == 100000
+
+    cmd = Command(lambda posargs_: print(' '.join(posargs_)), name='cmd',
+                  posargs=PosArgSpec(response_files=True, nul_delimited=True))
+    assert CommandChecker(cmd).run(['cmd', '@-', 'c'], input='a\0b\0').stdout == 'a b c\n'
+
+
+def test_posargs_lazy(tmp_path):
+    resp_path = tmp_path / 'args.txt'
+    resp_path.write_text(''.join(f'{i}\n' for i in range(1000)))
+
+    def sum_args(posargs_):
+        assert not isinstance(posargs_, (list, tuple))
+        return sum(posargs_)
+
+    posargspec = PosArgSpec(int, min_count=2, max_count=1000, response_files=True, lazy=True)
+    cmd = Command(sum_args, name='cmd', posargs=posargspec)
+    assert cmd.run(['cmd', f'@{resp_path}']) == sum(range(1000))
+
+    res = cmd.parse(['cmd', '1', 'x', '2'])
+    assert next(res.posargs) == 1
+    with pytest.raises(ArgumentParseError, match='failed to parse'):
+        next(res.posargs)
+    assert next(res.posargs) == 2
+    assert res.posargs.count == 3
+
+    # errors found while the handler iterates are reported as CLI errors
+    cc = CommandChecker(cmd)
+    res = cc.fail_1(['cmd', '1'])
+    assert 'error: cmd: too few arguments, expected 2 - 1000 arguments, got 1' in res.stderr
+    res = cc.fail_1(['cmd', '1', f'@{resp_path}'])
+    assert 'too many arguments, expected 2 - 1000 arguments, got at least 1001' in res.stderr
+
+    # unreadable response files fail the same way, lazy or not
+    eager_cmd = Command(lambda posargs_: sum(posargs_), name='cmd',
+                        posargs=PosArgSpec(int, response_files=True))
+    missing_arg = f'@{tmp_path / "missing.txt"}'
+    for c in (cmd, eager_cmd):
+        res = CommandChecker(c).fail_1(['cmd', '1', missing_arg])
+        assert 'error: cmd: failed to read response file' in res.stderr
+        assert isinstance(res.exception, CommandLineError)
+
+    # other parse errors raised by handlers are not this command's
+    inner = Parser('inner', flags=[Flag('--num', parse_as=int)])
+    inner_cmd = Command(lambda: inner.parse(['inner', '--num', 'x']), name='outer')
+    with pytest.raises(ArgumentParseError) as exc_info:
+        inner_cmd.run(['outer'])
+    assert not isinstance(exc_info.value, CommandLineError)
+    other_iter = posargspec.parse(['1'])
+    iter_cmd = Command(lambda: list(other_iter), name='outer')
+    with pytest.raises(ArgumentParseError, match='too few') as exc_info:
+        iter_cmd.run(['outer'])
+    assert not isinstance(exc_info.value, CommandLineError)
+
+    with pytest.raises(ValueError, match='lazy'):
+        PosArgSpec(lazy=True, count=1)
+
+
+def test_builtin_handlers():
+    class CountHandler:
+        flags = [Flag('--count-runs', parse_as=True, display=False)]
+
+        def __init__(self):
+            self.runs = []
+
+        def wrap_run(self, argv, cmd, run):
+            if '--count-runs' not in argv:
+                return run
+
+            def counted_run(*a, **kw):
+                self.runs.append(argv)
+                return run(*a, **kw)
+            return counted_run
+
+    handler = CountHandler()
+    cmd = Command(lambda: 'ok', name='cmd', builtin_handlers=[handler], profile=True)
+    assert cmd.builtin_handlers[-1] is handler
+    assert cmd.run(['cmd']) == 'ok'
+    assert cmd.run(['cmd', '--count-runs']) == 'ok'
+    assert handler.runs == [['cmd', '--count-runs']]
+
+    with pytest.raises(TypeError, match='wrap_run'):
+        Command(lambda: 'ok', name='cmd', builtin_handlers=[object()])
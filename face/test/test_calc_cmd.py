@@ -1,4 +1,5 @@
 import os
+import sys
 import getpass
 
 import pytest
@@ -10,6 +11,7 @@ from face import (Command,
                   CommandLineError,
                   CommandChecker,
                   CheckError,
+                  ForkedRunError,
                   prompt)
 
 
@@ -199,3 +201,130 @@ def test_cc_edge_cases():
 
     with pytest.raises(CheckError):
         cc.fail('calc halve', input='4', exit_code=(1, 2))
+
+
+def test_cc_context_isolation():
+    from concurrent.futures import ThreadPoolExecutor
+
+    cmd = get_calc_cmd()
+    cc = CommandChecker(cmd, isolation='context')
+
+    def _run(i):
+        if i % 3 == 0:
+            res = cc.run('calc halve', input=str(i * 2))
+            assert res.stdout == f'Enter a number: \n{float(i)}\n'
+        elif i % 3 == 1:
+            res = cc.run(['calc', 'add', str(i), '1'])
+            assert res.stdout == f'{float(i + 1)}\n'
+        else:
+            res = cc.run('calc halve', input=str(i), env={'CALC_TWO': '-1'})
+            assert res.stdout == f'Enter a number: \n{-float(i)}\n'
+        return i
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert sorted(executor.map(_run, range(60))) == list(range(60))
+
+    res = cc.run('calc blackjack', input=['20', '20', '1'])
+    assert res.stdout.endswith('blackjack!\n')
+    assert res.stderr == 'Bottom card: Retype bottom card: '
+
+    res = cc.fail('calc halve nonexistentarg')
+    assert res.stderr.startswith('error: calc halve: unexpected')
+
+    # streams and getpass are restored once no runs are active
+    assert not type(sys.stdout).__name__ == '_ContextStream'
+    assert getpass.getpass.__name__ != '_context_getpass'
+
+    with pytest.raises(ValueError, match='isolation'):
+        CommandChecker(cmd, isolation='nope')
+
+
+def test_cc_nested_global_in_context():
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+
+    inner_cc = CommandChecker(Command(lambda: print('inner'), name='inner'))
+    barriers = [threading.Barrier(1)]
+
+    def outer():
+        barriers[0].wait()
+        print('outer ' + inner_cc.run('inner').stdout.strip())
+
+    cc = CommandChecker(Command(outer, name='outer'), isolation='context')
+
+    # alone, a context run may take the lock exclusively for a nested global run
+    assert cc.run('outer').stdout == 'outer inner\n'
+
+    # two at once would deadlock, each waiting on the other, so one raises
+    barriers[0] = threading.Barrier(2, timeout=10)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda _: cc.run('outer', exit_code=None), range(2)))
+    assert sorted(res.exit_code for res in results) == [-1, 0]
+    failed = [res for res in results if res.exit_code][0]
+    assert type(failed.exception) is RuntimeError
+    assert 'deadlock' in str(failed.exception)
+
+
+_LEAKED_STATE = []
+
+
+class _UnpicklableError(Exception):
+    def __init__(self, msg, extra):
+        super().__init__(msg)
+        self.extra = extra
+
+
+def _leaky(size):
+    _LEAKED_STATE.append(size)
+    print(len(_LEAKED_STATE))
+    print('x' * size)
+    if size == 13:
+        raise _UnpicklableError('unlucky', extra=size)
+    if size == 0:
+        raise ZeroDivisionError('zero')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_cc_fork_isolation():
+    cmd = get_calc_cmd()
+    cmd.add(_leaky, name='leaky', posargs={'count': 1, 'parse_as': int, 'provides': 'size'})
+    cc = CommandChecker(cmd, isolation='fork')
+
+    # module-level state leaked by the command doesn't survive the run
+    for _ in range(3):
+        res = cc.run('calc leaky 1')
+        assert res.stdout == '1\nx\n'
+    assert _LEAKED_STATE == []
+
+    # more output than fits in a pipe buffer
+    res = cc.run('calc leaky 200000')
+    assert len(res.stdout) == 200000 + len('1\n\n')
+
+    res = cc.run('calc halve', input='4', env={'CALC_TWO': '-2'})
+    assert res.stdout == 'Enter a number: \n-2.0\n'
+    assert 'CALC_TWO' not in os.environ
+
+    res = cc.run('calc blackjack', input=['20', '20', '1'])
+    assert res.stdout.endswith('blackjack!\n')
+    assert res.stderr == 'Bottom card: Retype bottom card: '
+
+    res = cc.fail('calc halve nonexistentarg')
+    assert type(res.exception) is CommandLineError
+    assert res.stderr.startswith('error: calc halve: unexpected')
+
+    res = cc.fail('calc leaky 0')
+    assert res.exit_code == -1
+    assert type(res.exception) is ZeroDivisionError
+    assert res.exc_info[2] is None
+
+    res = cc.fail('calc leaky 13')
+    assert isinstance(res.exception, ForkedRunError)
+    assert res.exception.type_name.endswith('_UnpicklableError')
+    assert 'unlucky' in str(res.exception)
+    assert '_leaky' in res.exception.traceback_text
+
+    cc_mixed = CommandChecker(cmd, isolation='fork', mix_stderr=True, reraise=True)
+    res = cc_mixed.fail_1('calc halve nonexistentarg')
+    assert res.stdout.startswith('error: calc halve: unexpected')
+    with pytest.raises(ZeroDivisionError):
+        cc_mixed.run('calc leaky 0')
@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from face import Command, Parser, ERROR, ListParam, ChoicesParam, ArgumentParseError
+from face.codegen import get_parser_source, install_parser, compile_parser, _Fallback
+
+
+def _last_two(flag, values):
+    return values[-2:]
+
+
+def get_fuzz_cmd():
+    def deploy(region, count, tags, verbose, level, only, token):
+        pass
+
+    def ls(posargs_, long, sort):
+        pass
+
+    def run(posargs_, post_posargs_):
+        pass
+
+    cmd = Command(None, 'ops')
+    cmd.add('--level', char='l', parse_as=int, missing=0, multi='override')
+    deploy_cmd = Command(deploy)
+    deploy_cmd.add('--region', char='r', parse_as=ChoicesParam(['us', 'eu']), missing=ERROR)
+    deploy_cmd.add('--count', parse_as=int, missing=1)
+    deploy_cmd.add('--tags', parse_as=ListParam(), multi='extend')
+    deploy_cmd.add('--verbose', char='v', parse_as=True)
+    deploy_cmd.add('--only', multi=_last_two)
+    deploy_cmd.add('--token', env='FACE_TEST_CODEGEN_TOKEN')
+    cmd.add(deploy_cmd)
+    ls_cmd = Command(ls, 'ls-all', posargs=int)
+    ls_cmd.add('--long', parse_as=True)
+    ls_cmd.add('--sort', missing='name')
+    cmd.add(ls_cmd)
+    cmd.add(run, posargs={'max_count': 2}, post_posargs=True)
+    return cmd
+
+
+_TOKENS = ['deploy', 'DEPLOY', 'ls-all', 'ls_all', 'ls', 'run', 'nope',
+           '--region', '-r', '--region=eu', '-r=us', 'us', 'eu', 'asia',
+           '--count', '--count=', '--COUNT', '-count', '3', 'x', '-3',
+           '--tags', 'a,b', '"a,b",c', '--verbose', '-v', '--verbose=1', '--verbose=',
+           '--level', '-l', '--level=2', '--only', '--token', '--long', '--sort',
+           '--help', '-h', '--unknown', '--flagfile', '/nonexistent.flags',
+           '-', '--', '', '1', '2', '10']
+
+
+def _get_outcome(parse, argv):
+    try:
+        res = parse(argv)
+    except ArgumentParseError as ape:
+        res = ape.prs_res
+        outcome = (type(ape), str(ape))
+    else:
+        outcome = ('ok',)
+    return outcome + (res.name, res.subcmds,
+                      None if res.flags is None else list(res.flags.items()),
+                      None if res.flag_sources is None else list(res.flag_sources.items()),
+                      res.posargs, res.post_posargs)
+
+
+@pytest.mark.parametrize('token', [None, 'secret'])
+def test_codegen_differential(monkeypatch, token):
+    if token is None:
+        monkeypatch.delenv('FACE_TEST_CODEGEN_TOKEN', raising=False)
+    else:
+        monkeypatch.setenv('FACE_TEST_CODEGEN_TOKEN', token)
+    cmd = get_fuzz_cmd()
+    compile_parser(cmd)
+    rand = random.Random(token)
+
+    compiled_count = 0
+    for i in range(3000):
+        argv = ['ops'] + [rand.choice(_TOKENS) for _ in range(rand.randrange(8))]
+        if i % 3 == 0:
+            # bias toward successful parses
+            argv[1:1] = [rand.choice(['deploy', 'ls-all', 'run']), '-r', rand.choice(['us', 'eu'])]
+        try:
+            cmd._compiled_parse(argv)
+            compiled_count += 1
+        except (_Fallback, ArgumentParseError):
+            pass
+        assert _get_outcome(cmd.parse, argv) == _get_outcome(lambda a: Parser.parse(cmd, a), argv), argv
+    assert compiled_count > 100
+
+
+def test_codegen_install(tmp_path, monkeypatch):
+    cmd = get_fuzz_cmd()
+    source = get_parser_source(cmd)
+    (tmp_path / 'ops_parser.py').write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import ops_parser
+
+    install_parser(cmd, ops_parser, check=True)
+    argv = ['ops', 'deploy', '-r', 'eu', '--tags', 'a,b', '--tags', 'c']
+    res = cmd._compiled_parse(argv)
+    assert res.flags['tags'] == [['a', 'b'], ['c']]
+    assert res.flags['count'] == 1
+    assert cmd.run(['ops', 'ls-all', '--long', '1', '2']) is None
+
+    # adding to the command uninstalls the parser, and makes it stale
+    cmd.add(Command(None, 'status'))
+    assert cmd._compiled_parse is None
+    with pytest.raises(ValueError, match='different version'):
+        install_parser(cmd, ops_parser, check=True)
+
+    # handler signatures determine which flags are parsed, too
+    def deploy(region, count, tags, verbose, level, only):
+        pass
+    cmd = get_fuzz_cmd()
+    cmd._path_func_map[('deploy',)] = deploy
+    with pytest.raises(ValueError, match='different version'):
+        install_parser(cmd, ops_parser, check=True)
+
+    with pytest.raises(TypeError):
+        get_parser_source(Parser('ops'))
@@ -0,0 +1,99 @@
+import pytest
+
+from face import Command, ConfigFile, ArgumentParseError, UnknownFlag
+
+
+def _get_cmd(configfile):
+    cmd = Command(None, 'deploy', configfile=configfile)
+    cmd.add('--verbose', parse_as=True)
+    cmd.add('--region', missing='us-west-2')
+
+    push = Command(lambda verbose, region, percent, tags: (verbose, region, percent, tags), 'push')
+    push.add('--percent', parse_as=int, missing=100)
+    push.add('--tags', multi='extend', env='TEST_FACE_TAGS')
+    cmd.add(push)
+    return cmd
+
+
+def test_config_toml(tmp_path, monkeypatch):
+    monkeypatch.delenv('TEST_FACE_TAGS', raising=False)
+    config_path = tmp_path / 'deploy.toml'
+    config_path.write_text('verbose = true\n'
+                           'region = "us-east-1"\n'
+                           '[push]\n'
+                           'percent = 5\n'
+                           'tags = ["a", "b"]\n')
+    cmd = _get_cmd(str(config_path))
+
+    assert cmd.run(['deploy', 'push']) == (True, 'us-east-1', 5, ['a', 'b'])
+    res = cmd.parse(['deploy', 'push', '--region', 'eu-west-1'])
+    assert res.flags['region'] == 'eu-west-1'
+    assert res.flag_sources['region'] == 'argv'
+    assert res.flag_sources['percent'] == 'config'
+
+    # env takes precedence over config
+    monkeypatch.setenv('TEST_FACE_TAGS', 'c')
+    assert cmd.parse(['deploy', 'push']).flags['tags'] == ['c']
+
+    # parsed config is cached until the file changes
+    configfile = cmd.configfile
+    sections = configfile.load(str(config_path))
+    assert configfile.load(str(config_path)) is sections
+    config_path.write_text('[push]\npercent = 50\n')
+    assert configfile.load(str(config_path)) is not sections
+    assert cmd.run(['deploy', 'push']) == (None, 'us-west-2', 50, ['c'])
+
+
+def test_config_layered_ini(tmp_path):
+    system_path = tmp_path / 'system.ini'
+    system_path.write_text('[DEFAULT]\nregion = us-east-1\n\n[push]\npercent = 5\nverbose = yes\n')
+    user_path = tmp_path / 'user.cfg'
+    user_path.write_text('[push]\npercent = 10\n')
+    cmd = _get_cmd([str(system_path), str(tmp_path / 'missing.ini'), str(user_path)])
+
+    assert cmd.run(['deploy', 'push']) == (True, 'us-east-1', 10, [])
+    # region is valid, though unused by the root command, which has no handler
+    assert 'region' not in cmd.parse(['deploy']).flags
+
+
+def test_config_skipped_when_argv_covers_all(tmp_path, monkeypatch):
+    config_path = tmp_path / 'serve.toml'
+    config_path.write_text('port = 8080\n')
+    cmd = Command(lambda port: port, 'serve', configfile=str(config_path), profile=True)
+    cmd.add('--port', parse_as=int, missing=80)
+
+    loaded = []
+    load = cmd.configfile.load
+    monkeypatch.setattr(cmd.configfile, 'load', lambda path: loaded.append(path) or load(path))
+    # builtin flags (help, flagfile, profile) never count as unset
+    assert cmd.run(['serve', '--port', '5']) == 5
+    assert loaded == []
+    assert cmd.run(['serve']) == 8080
+    assert loaded == [str(config_path)]
+
+
+def test_config_errors(tmp_path):
+    config_path = tmp_path / 'deploy.toml'
+    cmd = _get_cmd(str(config_path))
+
+    config_path.write_text('[push]\npercent = "lots"\n')
+    with pytest.raises(ArgumentParseError, match='section push of config file'):
+        cmd.parse(['deploy', 'push'])
+
+    config_path.write_text('regoin = "us-east-1"\n')
+    with pytest.raises(UnknownFlag, match=r'unknown flag "regoin".*section \(root\)'):
+        cmd.parse(['deploy', 'push'])
+
+    config_path.write_text('flagfile = "other.flags"\n')
+    with pytest.raises(UnknownFlag):
+        cmd.parse(['deploy', 'push'])
+
+    config_path.write_text('percent = [')
+    with pytest.raises(ArgumentParseError, match='failed to parse config file'):
+        cmd.parse(['deploy', 'push'])
+
+    with pytest.raises(ValueError, match='could not infer config file format'):
+        ConfigFile('deploy.yaml')
+    with pytest.raises(ValueError, match='format'):
+        ConfigFile('deploy.toml', format='yaml')
+    assert repr(ConfigFile('/deploy.conf')) == "ConfigFile(['/deploy.conf'])"
@@ -1,5 +1,14 @@
+import io
+import os
+import signal
+import random
+import textwrap
+
 import pytest
 
+import face.helpers
+from face.helpers import _wrap_text, get_text_width
+
 from face import (Flag,
                   ERROR,
                   Command,
@@ -9,7 +18,7 @@ from face import (Flag,
                   HelpHandler,
                   ArgumentParseError,
                   StoutHelpFormatter)
-from face.utils import format_flag_post_doc
+from face.utils import format_flag_post_doc, echo
 
 
 def get_subcmd_cmd():
@@ -126,3 +135,115 @@ def test_flag_post_doc():
     assert format_flag_post_doc(Flag('flag', missing=42)) == '(defaults to 42)'
     assert format_flag_post_doc(Flag('flag', missing=ERROR)) == '(required)'
     assert format_flag_post_doc(Flag('flag', display={'post_doc': '(fun)'})) == '(fun)'
+    assert format_flag_post_doc(Flag('flag', env='FLAG')) == '(env $FLAG)'
+    assert format_flag_post_doc(Flag('flag', missing=ERROR, env='FLAG')) == '(required, env $FLAG)'
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGWINCH'), reason='requires SIGWINCH')
+def test_winsize_cache(monkeypatch):
+    probes = []
+
+    def _probe():
+        probes.append(1)
+        return (24, 100 + len(probes))
+
+    monkeypatch.setattr(face.helpers, '_probe_termios_winsize', _probe)
+    monkeypatch.setattr(face.helpers, '_WINSIZE', None)
+    prev_handler = signal.getsignal(signal.SIGWINCH)
+    try:
+        assert face.helpers.get_winsize() == (24, 101)
+        assert face.helpers.get_wrap_width() == 99
+        assert len(probes) == 1
+
+        os.kill(os.getpid(), signal.SIGWINCH)
+        assert face.helpers.get_winsize() == (24, 102)
+        assert len(probes) == 2
+    finally:
+        signal.signal(signal.SIGWINCH, prev_handler)
+
+    # without a terminal, the environment is checked on every call
+    monkeypatch.setattr(face.helpers, '_probe_termios_winsize', lambda: None)
+    face.helpers.invalidate_winsize()
+    monkeypatch.setenv('ROWS', '30')
+    monkeypatch.setenv('COLUMNS', '70')
+    assert face.helpers.get_winsize() == (30, 70)
+    monkeypatch.setenv('COLUMNS', '90')
+    assert face.helpers.get_winsize() == (30, 90)
+    face.helpers.invalidate_winsize()
+
+
+def test_winsize_probe_fallback(monkeypatch):
+    class FakeTTY(io.StringIO):
+        def isatty(self):
+            return True
+
+    probed = []
+
+    def _get_winsize(stream):
+        probed.append(stream)
+        return (30, 60)
+    monkeypatch.setattr(face.helpers, '_get_termios_winsize', _get_winsize)
+    monkeypatch.setattr(face.helpers.sys, 'stdout', io.StringIO())
+    monkeypatch.setattr(face.helpers.sys, 'stderr', FakeTTY())
+    # piped stdout is skipped, without an ioctl, for the terminal on stderr
+    assert face.helpers._probe_termios_winsize() == (30, 60)
+    assert probed == [face.helpers.sys.stderr]
+
+
+def test_checker_pins_winsize(monkeypatch):
+    monkeypatch.setattr(face.helpers, '_WINSIZE', (50, 200))
+
+    def show_width():
+        echo(str(face.helpers.get_winsize()))
+    chk = CommandChecker(Command(show_width))
+    assert chk.run(['show_width']).stdout == '(24, 80)\n'
+    assert face.helpers.get_winsize() == (50, 200)
+
+    # ROWS and COLUMNS in the run's env are used instead
+    chk = CommandChecker(Command(show_width), env={'ROWS': '20', 'COLUMNS': '40'})
+    assert chk.run(['show_width']).stdout == '(20, 40)\n'
+    assert chk.run(['show_width'], env={'COLUMNS': '50'}).stdout == '(20, 50)\n'
+    chk = CommandChecker(Command(show_width))
+    assert chk.run(['show_width'], env={'ROWS': '20', 'COLUMNS': '40'}).stdout == '(20, 40)\n'
+
+    cmd = Command(None, name='cmd', doc='word ' * 30)
+    cmd.add('--flag', doc='flag ' * 30)
+    res = CommandChecker(cmd, env={'ROWS': '20', 'COLUMNS': '40'}).run(['cmd', '--help'])
+    assert max(len(line) for line in res.stdout.splitlines()) <= 38
+
+    # global runs pin for the process, never touching context variables
+    def show_pins():
+        echo(str((face.helpers._CONTEXT_PIN_COUNT, face.helpers._PINNED_WINSIZE)))
+    chk = CommandChecker(Command(show_pins))
+    assert chk.run(['show_pins']).stdout == '(0, (24, 80))\n'
+    chk = CommandChecker(Command(show_pins), isolation='context')
+    assert chk.run(['show_pins']).stdout == '(1, None)\n'
+    chk = CommandChecker(Command(show_width), isolation='context')
+    assert chk.run(['show_width']).stdout == '(24, 80)\n'
+    assert face.helpers._CONTEXT_PIN_COUNT == 0
+    assert face.helpers._PINNED_WINSIZE is None
+
+
+def test_wrap_text_matches_textwrap():
+    rnd = random.Random(40)
+    pieces = ['a', 'bc', 'def', '-', '--', ' ', '  ', '\n', '\t', '.', ',', 'x' * 25, ' ' * 30]
+    for _ in range(500):
+        text = ''.join(rnd.choice(pieces) + 'g' * rnd.randint(0, 8)
+                       for _ in range(rnd.randint(0, 40)))
+        indent = rnd.choice(['', ' ', '    '])
+        width = rnd.randint(len(indent) + 1, 40)
+        expected = textwrap.wrap(text, width, initial_indent=indent, subsequent_indent=indent)
+        assert _wrap_text(text, width, indent) == expected, (text, width, indent)
+
+
+def test_wrap_text_width():
+    assert get_text_width('abc') == 3
+    assert get_text_width('\x1b[1mabc\x1b[0m') == 3
+    assert get_text_width('日本語') == 6
+    assert get_text_width('é') == 1
+
+    # wide characters take two columns
+    assert _wrap_text('日本 語本 日本語', 6) == ['日本', '語本', '日本語']
+    # escape sequences take none
+    bold = '\x1b[1mbold\x1b[0m'
+    assert _wrap_text(f'{bold} {bold} {bold}', 9) == [f'{bold} {bold}', bold]
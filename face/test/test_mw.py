@@ -1,8 +1,10 @@
 import time
+import threading
 
 import pytest
 
-from face import face_middleware, Command, Flag
+from face import face_middleware, Command, Flag, MiddlewareCache
+from face.middleware import DEFAULT_MAX_RESOURCES
 
 
 def test_mw_basic_sig():
@@ -87,3 +89,213 @@ def test_check_mw():
 
     with pytest.raises(TypeError, match='provides conflict with reserved face builtins'):
         face_middleware(provides='flags_')(lambda next_: None)
+
+
+def test_mw_cache():
+    calls = []
+
+    @face_middleware(provides='config', cache=True)
+    def config_mw(next_, config_path):
+        calls.append(config_path)
+        return next_(config={'path': config_path})
+
+    cmd = Command(lambda config: config, name='cmd', middlewares=[config_mw])
+    cmd.add('--config-path', missing='default.ini')
+
+    cache = config_mw._face_cache
+    for _ in range(5):
+        assert cmd.run(['cmd']) == {'path': 'default.ini'}
+    assert calls == ['default.ini']
+    assert (cache.hit_count, cache.miss_count) == (4, 1)
+
+    assert cmd.run(['cmd', '--config-path', 'other.ini']) == {'path': 'other.ini'}
+    assert calls == ['default.ini', 'other.ini']
+    assert len(cache) == 2
+
+    assert cache.invalidate(config_path='default.ini')
+    assert not cache.invalidate(config_path='default.ini')
+    cmd.run(['cmd'])
+    assert calls == ['default.ini', 'other.ini', 'default.ini']
+
+    cache.clear()
+    assert len(cache) == 0
+    assert 'hit_count=4' in repr(cache)
+
+
+def test_mw_process_lifetime():
+    events = []
+
+    @face_middleware(provides='db', lifetime='process')
+    def db_mw(next_, db_url):
+        events.append(('setup', db_url))
+        try:
+            return next_(db={'url': db_url})
+        finally:
+            events.append(('teardown', db_url))
+
+    cmd = Command(lambda db: db, name='cmd', middlewares=[db_mw])
+    cmd.add('--db-url', missing='sqlite://')
+
+    for _ in range(1000):
+        assert cmd.run(['cmd']) == {'url': 'sqlite://'}
+    assert events == [('setup', 'sqlite://')]
+
+    # different injected arguments get their own setup
+    for _ in range(1000):
+        assert cmd.run(['cmd', '--db-url', 'pg://']) == {'url': 'pg://'}
+    assert events == [('setup', 'sqlite://'), ('setup', 'pg://')]
+    assert len(cmd._mw_resources[id(db_mw)]) == 2
+
+    cmd.close()
+    assert events[2:] == [('teardown', 'pg://'), ('teardown', 'sqlite://')]
+    assert len(cmd._mw_resources[id(db_mw)]) == 0
+    cmd.close()  # idempotent
+    assert len(events) == 4
+
+    with cmd:
+        cmd.run(['cmd'])
+        cmd.run(['cmd'])
+    assert events[4:] == [('setup', 'sqlite://'), ('teardown', 'sqlite://')]
+
+
+def test_mw_process_lifetime_scope():
+    events = []
+
+    @face_middleware(provides='db', lifetime='process')
+    def db_mw(next_, db_url):
+        events.append(('setup', db_url))
+        try:
+            return next_(db=db_url)
+        finally:
+            events.append(('teardown', db_url))
+
+    # commands sharing a middleware keep their own setups
+    cmd = Command(lambda db: db, name='cmd', middlewares=[db_mw])
+    cmd.add('--db-url', missing='sqlite://')
+    other_cmd = Command(lambda db: db, name='other', middlewares=[db_mw])
+    other_cmd.add('--db-url', missing='sqlite://')
+    clone_cmd = cmd.clone()
+    for c in (cmd, other_cmd, clone_cmd):
+        assert c.run(['cmd']) == 'sqlite://'
+    assert events == [('setup', 'sqlite://')] * 3
+
+    cmd.close()
+    assert events[3:] == [('teardown', 'sqlite://')]
+    assert other_cmd.run(['other']) == 'sqlite://'
+    assert clone_cmd.run(['cmd']) == 'sqlite://'
+    assert len(events) == 4
+    other_cmd.close()
+    clone_cmd.close()
+    assert len(events) == 6
+
+    # past the limit, the least recently used setup is torn down
+    del events[:]
+    for i in range(DEFAULT_MAX_RESOURCES + 2):
+        cmd.run(['cmd', '--db-url', str(i)])
+    assert len(cmd._mw_resources[id(db_mw)]) == DEFAULT_MAX_RESOURCES
+    assert [e for e in events if e[0] == 'teardown'] == [('teardown', '0'), ('teardown', '1')]
+    alive = [t for t in threading.enumerate() if t.name == 'face-middleware-db_mw']
+    assert len(alive) == DEFAULT_MAX_RESOURCES
+    cmd.close()
+    assert not [t for t in threading.enumerate() if t.name == 'face-middleware-db_mw']
+
+
+def test_mw_process_lifetime_errors():
+    calls = []
+
+    @face_middleware(provides='conn', lifetime='process')
+    def conn_mw(next_, fail):
+        calls.append(fail)
+        if fail == 'setup':
+            raise RuntimeError('setup failed')
+        elif fail == 'early':
+            return 'skipped'
+        next_(conn=object())
+        if fail == 'teardown':
+            raise RuntimeError('teardown failed')
+
+    cmd = Command(lambda conn: 'ran', name='cmd', middlewares=[conn_mw])
+    cmd.add('--fail', missing='none')
+
+    # failed and short-circuited setups are retried on the next run
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match='setup failed'):
+            cmd.run(['cmd', '--fail', 'setup'])
+        assert cmd.run(['cmd', '--fail', 'early']) == 'skipped'
+    assert calls == ['setup', 'early', 'setup', 'early']
+
+    assert cmd.run(['cmd', '--fail', 'teardown']) == 'ran'
+    assert cmd.run(['cmd']) == 'ran'
+    with pytest.raises(RuntimeError, match='teardown failed'):
+        cmd.close()
+    assert len(cmd._mw_resources[id(conn_mw)]) == 0
+
+    with pytest.raises(ValueError, match='lifetime'):
+        face_middleware(lifetime='forever')
+    with pytest.raises(ValueError, match='cannot also set cache'):
+        face_middleware(lifetime='process', cache=True)
+
+
+def test_mw_cache_eviction():
+    calls = []
+
+    @face_middleware(provides='squared', cache=MiddlewareCache(max_size=2))
+    def square_mw(next_, num):
+        calls.append(num)
+        return next_(squared=num * num)
+
+    cmd = Command(lambda squared: squared, name='cmd', middlewares=[square_mw])
+    cmd.add('--num', parse_as=int, missing=0)
+
+    for num in ['1', '2', '1', '3', '2']:
+        cmd.run(['cmd', '--num', num])
+    # 2 is evicted when 3 is added, because 1 was more recently used
+    assert calls == [1, 2, 3, 2]
+    assert square_mw._face_cache.evict_count == 2
+
+
+def test_mw_cache_ttl(monkeypatch):
+    calls = []
+    cache = MiddlewareCache(ttl=10)
+
+    @face_middleware(provides='token', cache=cache)
+    def token_mw(next_):
+        calls.append(1)
+        return next_(token='secret')
+
+    cmd = Command(lambda token: token, name='cmd', middlewares=[token_mw])
+    cmd.run(['cmd'])
+    cmd.run(['cmd'])
+    assert len(calls) == 1
+
+    real_monotonic = time.monotonic
+    monkeypatch.setattr(time, 'monotonic', lambda: real_monotonic() + 11)
+    cmd.run(['cmd'])
+    assert len(calls) == 2
+    assert cache.miss_count == 2
+
+
+def test_mw_cache_unhashable():
+    calls = []
+
+    @face_middleware(provides='total', cache=4)
+    def total_mw(next_, nums):
+        calls.append(nums)
+        return next_(total=sum(nums))
+
+    cmd = Command(lambda total: total, name='cmd', middlewares=[total_mw])
+    cmd.add('--nums', parse_as=int, multi=True)
+
+    assert cmd.run(['cmd', '--nums', '1', '--nums', '2']) == 3
+    assert cmd.run(['cmd', '--nums', '1', '--nums', '2']) == 3
+    assert len(calls) == 2  # lists aren't hashable, so the cache is skipped
+    assert total_mw._face_cache.max_size == 4
+
+
+def test_mw_cache_init():
+    with pytest.raises(TypeError, match='MiddlewareCache instance'):
+        face_middleware(cache='yes')
+    with pytest.raises(ValueError, match='max_size'):
+        MiddlewareCache(max_size=0)
+    with pytest.raises(ValueError, match='ttl'):
+        MiddlewareCache(ttl=-1)
@@ -0,0 +1,95 @@
+import time
+import pstats
+
+import pytest
+
+from face import Command, Flag, face_middleware, CommandChecker
+from face.parser import prescan_flag
+from face.profiling import ProfileHandler
+
+
+@face_middleware(provides=['greeting'])
+def _greeting_mw(next_):
+    return next_(greeting='hello')
+
+
+def _busy_handler(greeting, duration):
+    end = time.time() + duration
+    while time.time() < end:
+        pass
+    return greeting
+
+
+def get_profiled_cmd(profile=True):
+    cmd = Command(None, 'prof', profile=profile)
+    busy = Command(_busy_handler, 'busy', middlewares=[_greeting_mw])
+    busy.add('--duration', parse_as=float, missing=0.0)
+    cmd.add(busy)
+    return cmd
+
+
+def test_prescan_flag():
+    flag = Flag('--profile', char='P')
+    assert prescan_flag(['cmd', '--profile', 'a.pstats'], flag) == 'a.pstats'
+    assert prescan_flag(['cmd', 'sub', '--profile=b.pstats'], flag) == 'b.pstats'
+    assert prescan_flag(['cmd', '-P', 'c.pstats'], flag) == 'c.pstats'
+    assert prescan_flag(['cmd', '--profile'], flag) is None
+    assert prescan_flag(['cmd', '--', '--profile', 'x'], flag) is None
+    assert prescan_flag(['cmd', 'profile'], flag) is None
+
+
+def test_profile_pstats(tmp_path):
+    cmd = get_profiled_cmd()
+    assert 'profile' not in [f.name for f in cmd.get_flags(with_hidden=False)]
+
+    out_path = str(tmp_path / 'run.pstats')
+    assert cmd.run(['prof', 'busy', '--profile', out_path]) == 'hello'
+
+    stats = pstats.Stats(out_path)
+    func_names = {key[2] for key in stats.stats}
+    assert '_busy_handler' in func_names
+    assert '_greeting_mw' in func_names
+    assert 'parse' in func_names  # parsing is profiled, too
+    assert 'inject' not in func_names
+    assert not [key for key in stats.stats if key[0].startswith('<sinter generated')]
+
+    # glue frames were collapsed, so middleware calls the handler directly
+    handler_key = [key for key in stats.stats if key[2] == '_busy_handler'][0]
+    caller_names = {key[2] for key in stats.stats[handler_key][4]}
+    assert caller_names == {'_greeting_mw'}
+
+
+def test_profile_sample(tmp_path):
+    cmd = get_profiled_cmd(profile=ProfileHandler(flag=False, sample_interval=0.001))
+    out_path = tmp_path / 'run.collapsed'
+    cmd.run(['prof', 'busy', '--duration', '0.1', '--profile-sample', str(out_path)])
+
+    lines = out_path.read_text().splitlines()
+    assert lines
+    handler_lines = [line for line in lines if '_busy_handler' in line]
+    assert handler_lines
+    for line in handler_lines:
+        stack, _, count = line.rpartition(' ')
+        assert int(count) > 0
+        frames = stack.split(';')
+        assert frames[-1].startswith('_busy_handler (test_profiling.py:')
+        assert not [f for f in frames if f.startswith(('inject ', 'next_ '))]
+        assert frames[-2].startswith('_greeting_mw ')
+
+
+def test_profile_disabled_by_default(tmp_path):
+    cmd = get_profiled_cmd(profile=False)
+    cc = CommandChecker(cmd)
+    res = cc.fail_1(['prof', 'busy', '--profile', str(tmp_path / 'x.pstats')])
+    assert 'unknown flag' in res.stderr
+
+
+def test_profile_handler_init():
+    with pytest.raises(TypeError, match='ProfileHandler instance'):
+        Command(lambda: None, 'cmd', profile='yes')
+    with pytest.raises(TypeError, match='Flag instance'):
+        ProfileHandler(flag='--profile')
+    with pytest.raises(ValueError, match='at least one'):
+        ProfileHandler(flag=False, sample_flag=False)
+    with pytest.raises(ValueError, match='sample_interval'):
+        ProfileHandler(sample_interval=0)
@@ -0,0 +1,93 @@
+import io
+import threading
+import contextvars
+
+import face.utils
+from face import Command, echo
+from face.progress import Progress
+
+
+def test_progress_log_lines():
+    out = io.StringIO()
+    with Progress(file=out) as progress:
+        assert not progress.tty
+        assert progress.interval == 10
+        items = list(progress.iter(range(12345), 'items'))
+        with progress.task('batches', total=4) as batches:
+            batches.update(3)
+            with batches.subtask('rows') as rows:
+                rows.update(20)
+                progress.draw()
+                progress.draw()  # nothing changed, nothing logged
+    assert len(items) == 12345
+
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('items 12.3k/12.3k (100%), ')
+    assert lines[1].startswith('batches 3/4 (75%), ')
+    assert lines[2].startswith('batches › rows 20, ')
+    assert lines[3].startswith('batches 3/4 (75%), ')  # done
+    assert len(lines) == 4
+
+
+def test_progress_tty_line(monkeypatch):
+    out = io.StringIO()
+    monkeypatch.setattr('face.progress.get_winsize', lambda: (24, 40))
+    monkeypatch.setattr('face.utils.should_strip_ansi', lambda file: False)
+    progress = Progress(file=out, interval=60, tty=True)
+
+    def work(task):
+        with task:
+            task.update(5)
+            done.wait()
+
+    done = threading.Event()
+    outer = progress.task('sync')
+    outer.update()
+    workers = [threading.Thread(target=work, args=(outer.subtask(name, total=10),))
+               for name in ('alpha', 'beta')]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(t.count < 5 for t in outer.children):
+            pass
+        progress.draw()
+        line = out.getvalue().rpartition('\r\x1b[K')[2]
+        assert line == 'sync 1 › alpha 5/10 (50%) | beta 5/10…'
+
+        # echoing clears the line before writing
+        echo('hi', file=out)
+        assert out.getvalue().endswith(line + '\r\x1b[Khi\n')
+
+        # but only in the context drawing it, not in other runs
+        progress.draw()
+        contextvars.Context().run(echo, 'other', file=out)
+        assert out.getvalue().endswith(line + '\r\x1b[Khi\n\r\x1b[K' + line + 'other\n')
+        echo('done', file=out)
+        assert out.getvalue().endswith('other\n\r\x1b[Kdone\n')
+    finally:
+        done.set()
+        for worker in workers:
+            worker.join()
+    progress.close()
+    assert out.getvalue().splitlines()[-1].startswith('sync 1, ')
+    assert face.utils._ACTIVE_PROGRESS.get() is None
+
+
+def test_progress_injectable():
+    seen = []
+
+    def handler(progress_):
+        seen.append(progress_)
+        with progress_.task('work') as task:
+            task.update(2)
+
+    def plain():
+        return 'ok'
+
+    cmd = Command(None, 'cmd')
+    cmd.add(handler)
+    cmd.add(plain)
+    cmd.run(['cmd', 'handler'])
+    assert isinstance(seen[0], Progress)
+    assert seen[0]._stop.is_set()
+    assert cmd.run(['cmd', 'plain']) == 'ok'
@@ -0,0 +1,75 @@
+import json
+import hashlib
+
+from face import Command
+from face.recording import Recorder, stub_handlers, load_records, _StubHandler
+
+
+def get_recorded_cmd(calls):
+    def deploy(region):
+        calls.append(region)
+        return region
+
+    cmd = Command(None, 'rec', record=True, trace=True)
+    deploy_cmd = Command(deploy)
+    deploy_cmd.add('--region', missing='us-east-1')
+    cmd.add(deploy_cmd)
+    return cmd
+
+
+def test_record(tmp_path, monkeypatch):
+    monkeypatch.delenv('FACE_RECORD', raising=False)
+    calls = []
+    cmd = get_recorded_cmd(calls)
+    log_path = tmp_path / 'runs.jsonl'
+    ff_path = tmp_path / 'deploy.flags'
+    ff_path.write_text('--region eu-west-1\n')
+
+    argv = ['rec', 'deploy', '--flagfile', str(ff_path), '--record', str(log_path)]
+    assert cmd.run(argv) == 'eu-west-1'
+    monkeypatch.setenv('FACE_RECORD', str(log_path))
+    assert cmd.run(['rec', 'deploy']) == 'us-east-1'
+    # traced runs aren't recorded
+    cmd.run(['rec', 'deploy', '--trace', str(tmp_path / 'trace.json')])
+
+    first, second = load_records(log_path)
+    assert first['argv'] == argv
+    assert first['subcmds'] == ['deploy']
+    assert first['exit_code'] == 0
+    assert set(first['timings']) == {'run', 'parse', 'prepare', 'dispatch'}
+    assert first['timings']['run'] >= first['timings']['parse'] > 0
+    digest = hashlib.sha256(ff_path.read_bytes()).hexdigest()
+    assert first['flagfiles'] == [{'path': str(ff_path), 'sha256': digest}]
+    assert second['argv'] == ['rec', 'deploy']
+    assert second['flagfiles'] == []
+
+
+def test_stub_handlers():
+    calls = []
+    cmd = get_recorded_cmd(calls)
+    assert cmd.run(['rec', 'deploy']) == 'us-east-1'
+
+    with stub_handlers(cmd):
+        recorder = Recorder(None, ['rec', 'deploy', '--region', 'x'], 'rec')
+        assert recorder.run(cmd.run, ['rec', 'deploy', '--region', 'x']) is None
+        # stubs take the same arguments, so parsing still validates
+        assert cmd.get_dep_names(('deploy',)) == ['region']
+    assert calls == ['us-east-1']
+    assert recorder.record['exit_code'] == 0
+    assert 'dispatch' in recorder.record['timings']
+    json.dumps(recorder.record)
+
+    assert cmd.run(['rec', 'deploy']) == 'us-east-1'
+    assert calls == ['us-east-1', 'us-east-1']
+
+    # no stubbed chains are left behind, in the command or its clones
+    clone = cmd.clone()
+    with stub_handlers(cmd):
+        assert cmd.run(['rec', 'deploy']) is None
+        assert clone.run(['rec', 'deploy']) == 'us-east-1'
+    assert cmd.run(['rec', 'deploy']) == 'us-east-1'
+    assert clone.run(['rec', 'deploy']) == 'us-east-1'
+    assert calls == ['us-east-1'] * 5
+    for c in (cmd, clone):
+        assert not any(isinstance(f, _StubHandler) for f in c._path_func_map.values())
+        assert not any(isinstance(key[0], _StubHandler) for key in c._chain_cache)
@@ -0,0 +1,92 @@
+import io
+
+from face import Command, Repl, ChoicesParam, face_middleware, MiddlewareCache
+
+
+def _make_cmd(calls):
+    @face_middleware(provides=['conn'], cache=MiddlewareCache())
+    def conn_mw(next_):
+        calls.append('connect')
+        return next_(conn=object())
+
+    def status(conn, region):
+        calls.append(('status', region))
+
+    def fail():
+        raise SystemExit(3)
+
+    def crash():
+        raise ValueError('handler bug')
+
+    cmd = Command(None, 'ops', middlewares=[conn_mw])
+    status_cmd = Command(status)
+    status_cmd.add('--region', parse_as=ChoicesParam(['us-east-1', 'us-west-2', 'eu-west-1']),
+                   missing='us-east-1')
+    cmd.add(status_cmd)
+    cmd.add(fail)
+    cmd.add(crash)
+    return cmd
+
+
+def test_repl_run(monkeypatch, capsys):
+    calls = []
+    cmd = _make_cmd(calls)
+    lines = ['status --region us-west-2',
+             '',
+             'status --region nowhere',
+             'status "unclosed',
+             'fail',
+             'crash',
+             'status',
+             'exit',
+             'status']
+    monkeypatch.setattr('sys.stdin', io.StringIO('\n'.join(lines) + '\n'))
+
+    repl = Repl(cmd)
+    assert repr(repl) == f"<Repl cmd={cmd!r} prompt='ops> '>"
+    wrapped = cmd._path_wrapped_map
+    exit_code = repl.run()
+
+    # errors don't end the session, exit does, and the middleware ran once
+    assert calls == ['connect', ('status', 'us-west-2'), ('status', 'us-east-1')]
+    assert exit_code == 0
+    err = capsys.readouterr().err
+    assert "error: ops status: flag region expected a valid choice" in err
+    assert 'No closing quotation' in err
+    assert 'Traceback (most recent call last)' in err
+    assert 'ValueError: handler bug' in err
+
+    # chains are compiled once, and kept across runs
+    chain = wrapped[('status',)]
+    repl.run_line('status')
+    assert wrapped[('status',)] is chain
+    assert repl.run_line('fail') is True
+    assert repl.exit_code == 3
+    assert repl.run_line('crash') is True
+    assert repl.exit_code == 1
+    assert repl.run_line('quit') is False
+
+    # adding recompiles, but identical chains are reused
+    cmd.add('--verbose', parse_as=True)
+    repl.run_line('status')
+    assert wrapped[('status',)] is chain
+
+    @face_middleware
+    def noop_mw(next_):
+        return next_()
+
+    cmd.add(noop_mw)
+    repl.run_line('status')
+    assert cmd._path_wrapped_map[('status',)] is not chain
+
+
+def test_repl_completions():
+    cmd = _make_cmd([])
+    repl = Repl(cmd)
+    assert repl.get_completions('', '') == ['crash', 'exit', 'fail', 'quit', 'status']
+    assert repl.get_completions('', 'st') == ['status']
+    assert repl.get_completions('status ', '--') == ['--help', '--region']
+    assert repl.get_completions('status ', '--r') == ['--region']
+    assert repl.get_completions('status --region ', 'us') == ['us-east-1', 'us-west-2']
+    assert repl.get_completions('status --region us-east-1 ', '') == ['--help', '--region', '-h']
+    assert repl.get_completions('status "unclosed ', '') == []
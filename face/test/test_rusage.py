@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from face import Command, CommandLineError
+from face.rusage import RusageHandler, format_report
+
+
+def _alloc(count, label):
+    return [label * 100 for _ in range(count)]
+
+
+def get_rusage_cmd(rusage=True):
+    cmd = Command(None, 'ru', rusage=rusage)
+    alloc = Command(_alloc, 'alloc')
+    alloc.add('--count', parse_as=int, missing=10)
+    alloc.add('--label', missing='x')
+    cmd.add(alloc)
+    return cmd
+
+
+def test_rusage_jsonl(tmp_path, monkeypatch):
+    monkeypatch.delenv('FACE_RUSAGE', raising=False)
+    cmd = get_rusage_cmd()
+    log_path = tmp_path / 'rusage.jsonl'
+
+    assert len(cmd.run(['ru', 'alloc', '--count=5', '--rusage', str(log_path)])) == 5
+    assert len(cmd.run(['ru', 'alloc', '--label', 'secret', '--rusage', str(log_path)])) == 10
+    assert cmd.run(['ru', 'alloc']) is not None  # no report
+
+    first, second = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert first['command'] == 'ru'
+    assert first['subcmds'] == ['alloc']
+    assert first['flags'] == ['count']
+    assert first['exit_code'] == 0
+    for key in ('wall_time', 'user_time', 'system_time', 'max_rss', 'block_input',
+                'block_output', 'voluntary_ctx_switches', 'involuntary_ctx_switches'):
+        assert first[key] >= 0
+    assert first['max_rss'] > 1024 * 1024
+    assert 'tracemalloc_peak' not in first
+
+    # flag names are reported, never their values
+    assert second['flags'] == ['label']
+    assert 'secret' not in json.dumps(second)
+
+    # environment variables work too, with the flag taking precedence
+    monkeypatch.setenv('FACE_RUSAGE', str(log_path))
+    with pytest.raises(CommandLineError):
+        cmd.run(['ru', 'alloc', '--count', 'many'])
+    assert json.loads(log_path.read_text().splitlines()[-1])['exit_code'] == 1
+    flag_log_path = tmp_path / 'flag_rusage.jsonl'
+    cmd.run(['ru', 'alloc', '--rusage', str(flag_log_path)])
+    assert len(flag_log_path.read_text().splitlines()) == 1
+    assert len(log_path.read_text().splitlines()) == 3
+
+
+def test_rusage_stderr_tracemalloc(capsys, monkeypatch):
+    monkeypatch.delenv('FACE_RUSAGE', raising=False)
+    monkeypatch.setenv('FACE_RUSAGE_TRACEMALLOC', '3')
+    cmd = get_rusage_cmd()
+    cmd.run(['ru', 'alloc', '--count', '10000', '--rusage', '-'])
+
+    err = capsys.readouterr().err
+    first_line, *site_lines = err.splitlines()
+    assert first_line.startswith('rusage: ru alloc, wall ')
+    assert 'traced peak ' in first_line
+    assert len(site_lines) == 3
+    assert any('test_rusage.py' in line for line in site_lines)
+
+    report = {'command': 'ru', 'subcmds': [], 'wall_time': 1.5}
+    assert format_report(report) == 'rusage: ru, wall 1.500s'
+
+    with pytest.raises(TypeError):
+        Command(_alloc, rusage='yes')
+    with pytest.raises(TypeError):
+        RusageHandler(tracemalloc_flag='--malloc')
@@ -0,0 +1,98 @@
+import json
+import datetime
+
+import pytest
+
+from face import (Command, Parser, Flag, ERROR, PosArgSpec, ListParam, ChoicesParam,
+                  FilePathParam, FileValueParam, ArgumentParseError)
+from face.spec import get_spec, load_spec
+
+
+def parse_date(text):
+    return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def get_deploy_cmd(tmp_path):
+    regions_path = tmp_path / 'regions.txt'
+    regions_path.write_text('us-east-1\neu-west-1\n')
+
+    def deploy(region, count, tags, verbose, since, token=None):
+        pass
+
+    def ls(posargs_, long=False):
+        pass
+
+    def run(posargs_, post_posargs_, env_):
+        pass
+
+    cmd = Command(None, 'ops', doc='operations tool')
+    deploy_cmd = Command(deploy, doc='deploy services')
+    deploy_cmd.add('--region', char='r', parse_as=ChoicesParam.from_file(str(regions_path)),
+                   missing=ERROR)
+    deploy_cmd.add('--count', parse_as=int, missing=1, doc='instance count')
+    deploy_cmd.add('--tags', parse_as=ListParam(strip=True), multi='extend', missing=[])
+    deploy_cmd.add('--verbose', char='v', parse_as=True, display=False)
+    deploy_cmd.add('--since', parse_as=parse_date)
+    deploy_cmd.add('--token', parse_as=FileValueParam(), env='OPS_TOKEN')
+    deploy_cmd.add('--unused', parse_as=float)
+    cmd.add(deploy_cmd)
+    cmd.add(ls, posargs=PosArgSpec(FilePathParam(), min_count=1, display='path'))
+    cmd.add('--long', parse_as=True)
+    cmd.add(run, posargs={'count': 2, 'parse_as': int}, post_posargs=True)
+    cmd.add('--env', parse_as=ChoicesParam(['dev', 'prod'], ignore_case=True), missing='dev')
+    return cmd
+
+
+def _parse(prs, argv):
+    try:
+        res = prs.parse(argv)
+    except ArgumentParseError as ape:
+        return type(ape), str(ape)
+    return res.subcmds, dict(res.flags), res.posargs, res.post_posargs
+
+
+def test_spec_roundtrip(tmp_path):
+    cmd = get_deploy_cmd(tmp_path)
+    token_path = tmp_path / 'token'
+    token_path.write_text('s3cret\n')
+
+    spec = json.loads(json.dumps(get_spec(cmd)))
+    assert [p['path'] for p in spec['paths']] == [[], ['deploy'], ['ls'], ['run']]
+    # only the flags each handler uses, as when parsing
+    flag_names = [f['name'] for f in spec['flags']]
+    assert 'unused' not in flag_names
+    assert 'long' in flag_names
+
+    with pytest.raises(ValueError, match='parse_date'):
+        load_spec(spec)
+    prs = load_spec(spec, converters={f'{__name__}:parse_date': parse_date})
+    assert type(prs) is Parser
+    assert prs.subprs_map[('deploy',)].doc == 'deploy services'
+
+    argvs = [['ops', 'deploy', '-r', 'eu-west-1', '--tags', 'a, b', '--tags', 'c', '-v'],
+             ['ops', 'deploy', '--region', 'EU-WEST-1'],
+             ['ops', 'deploy', '--count', '3'],
+             ['ops', 'deploy', '--region', 'us-east-1', '--count', 'x'],
+             ['ops', 'deploy', '--region', 'us-east-1', '--since', '2024-01-02',
+              '--token', str(token_path)],
+             ['ops', 'deploy', '--region', 'us-east-1', '--unused', '1.5'],
+             ['ops', 'ls', '--long', 'a', 'b'],
+             ['ops', 'ls'],
+             ['ops', 'run', '--env', 'PROD', '1', '2', '--', 'x', 'y'],
+             ['ops', 'run', '1'],
+             ['ops', 'nope']]
+    for argv in argvs:
+        assert _parse(prs, argv) == _parse(cmd, argv)
+
+
+def test_spec_errors():
+    with pytest.raises(ValueError, match='missing value of a plain type'):
+        get_spec(Parser('cmd', flags=[Flag('when', missing=datetime.date(2020, 1, 1))]))
+    with pytest.raises(TypeError):
+        get_spec(object())
+
+    spec = get_spec(Parser('cmd', flags=[Flag('name', missing=ERROR)]))
+    prs = load_spec(spec)
+    assert prs.parse(['cmd', '--name', 'x']).flags['name'] == 'x'
+    with pytest.raises(ValueError, match='spec_version'):
+        load_spec(dict(spec, spec_version=0))
@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+
+from face import Command, CommandChecker, echo_table
+from face.table import DEFAULT_FORMAT_FLAG
+
+
+ROWS = [{'name': 'alpha', 'size': 12, 'desc': 'a short one'},
+        {'name': 'béta 日本', 'size': 1234567,
+         'desc': 'a much longer description that needs wrapping or truncation'},
+        {'name': None, 'size': 3.5, 'desc': 'x'}]
+
+
+def _get_table(rows, **kw):
+    out = io.StringIO()
+    echo_table(rows, file=out, **kw)
+    return out.getvalue()
+
+
+def test_table_stream():
+    assert _get_table(ROWS, width=50) == '''\
+name       size     desc
+---------  -------  ------------------------------
+alpha           12  a short one
+béta 日本  1234567  a much longer description tha…
+               3.5  x
+'''
+    # only the sample is measured, later rows are fit to its widths
+    assert _get_table(iter(ROWS), sample_size=1, headers=['name', 'size'], width=50) == '''\
+name   size
+-----  ----
+alpha    12
+béta…  123…
+        3.5
+'''
+    assert _get_table(ROWS, width=50, overflow='wrap', batch_size=2) == '''\
+name       size     desc
+---------  -------  ------------------------------
+alpha           12  a short one
+béta 日本  1234567  a much longer description that
+                    needs wrapping or truncation
+               3.5  x
+'''
+    assert _get_table([[1, 2], [3, 4, 5]]) == '1  2\n3  4  5\n'
+    assert _get_table([]) == ''
+    assert _get_table([], headers=['a']) == 'a\n-\n'
+
+
+def test_table_full_mode():
+    rows = [['a', 'b']] + [['x' * i, i] for i in range(200)]
+    lines = _get_table(rows, mode='full').splitlines()
+    assert len(lines) == 201
+    assert len({line.index(' ' + line.split()[-1]) for line in lines[1:]}) == 1
+    # widths fit the wide rows at the end
+    assert lines[-1] == 'x' * 199 + '  199'
+
+
+def test_table_machine_formats():
+    assert _get_table(ROWS, format='tsv').splitlines()[1:] == [
+        'alpha\t12\ta short one',
+        'béta 日本\t1234567\ta much longer description that needs wrapping or truncation',
+        '\t3.5\tx']
+    assert _get_table([['a,b', 'c\n"d"']], format='csv', headers=['x', 'y']) == 'x,y\n"a,b","c\n""d"""\n'
+    lines = _get_table(ROWS, format='ndjson', batch_size=1).splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+    assert _get_table([[1, None]], format='ndjson') == '[1, null]\n'
+
+    with pytest.raises(ValueError, match='format'):
+        _get_table(ROWS, format='xml')
+
+
+def test_table_format_flag():
+    def ls(format):
+        echo_table(ROWS[:1], format=format)
+
+    cmd = Command(ls)
+    cmd.add(DEFAULT_FORMAT_FLAG)
+    cc = CommandChecker(cmd)
+    assert cc.run('ls').stdout == 'name   size  desc\n-----  ----  -----------\nalpha    12  a short one\n'
+    assert cc.run('ls --format csv').stdout == 'name,size,desc\nalpha,12,a short one\n'
+    assert 'ndjson' in cc.run('ls --help').stdout
+    cc.fail_1('ls --format xml')
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from face import Command, ListParam, face_middleware
+from face.tracing import TraceHandler, SpanWrapper
+
+
+@face_middleware(provides=['greeting'])
+def _greeting_mw(next_):
+    return next_(greeting='hello')
+
+
+def _greet_handler(greeting, names):
+    return [f'{greeting}, {name}' for name in names]
+
+
+def get_traced_cmd(trace=True):
+    cmd = Command(None, 'tr', trace=trace)
+    greet = Command(_greet_handler, 'greet', middlewares=[_greeting_mw])
+    greet.add('--names', parse_as=ListParam(), missing=[])
+    cmd.add(greet)
+    return cmd
+
+
+def test_trace_chrome(tmp_path):
+    cmd = get_traced_cmd()
+    ff_path = tmp_path / 'greet.flags'
+    ff_path.write_text('--names a,b\n')
+    trace_path = tmp_path / 'trace.json'
+
+    res = cmd.run(['tr', 'greet', '--flagfile', str(ff_path), '--trace', str(trace_path)])
+    assert res == ['hello, a', 'hello, b']
+
+    events = json.loads(trace_path.read_text())['traceEvents']
+    names = [e['name'] for e in events]
+    assert names == ['run', 'parse', 'flag flagfile', f'flagfile {ff_path}', 'flag names',
+                     'flag trace', 'prepare', 'dispatch', 'middleware _greeting_mw',
+                     'handler _greet_handler']
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+    run, handler = events[0], events[-1]
+    assert run['args'] == {'command': 'tr'}
+    assert run['ts'] <= handler['ts'] and handler['ts'] + handler['dur'] <= run['ts'] + run['dur']
+
+    # untraced runs use the plain chain
+    assert cmd.run(['tr', 'greet', '--names', 'c']) == ['hello, c']
+    chain_funcs = cmd._path_wrapped_map[('greet',)].__globals__['funcs']
+    assert not any(isinstance(f, SpanWrapper) for f in chain_funcs)
+    traced_funcs = cmd._path_traced_map[('greet',)].__globals__['funcs']
+    assert all(isinstance(f, SpanWrapper) for f in traced_funcs)
+
+
+def test_trace_otlp(tmp_path):
+    cmd = get_traced_cmd(trace=TraceHandler(format='otlp'))
+    trace_path = tmp_path / 'trace.json'
+    cmd.run(['tr', 'greet', '--names', 'a', '--trace', str(trace_path)])
+
+    resource_spans = json.loads(trace_path.read_text())['resourceSpans']
+    assert resource_spans[0]['resource']['attributes'] == [{'key': 'service.name',
+                                                           'value': {'stringValue': 'tr'}}]
+    spans = resource_spans[0]['scopeSpans'][0]['spans']
+    span_map = {s['name']: s for s in spans}
+    assert list(span_map) == ['run', 'parse', 'flag names', 'flag trace', 'prepare',
+                              'dispatch', 'middleware _greeting_mw', 'handler _greet_handler']
+    assert len({s['traceId'] for s in spans}) == 1
+    assert 'parentSpanId' not in span_map['run']
+    assert span_map['flag names']['parentSpanId'] == span_map['parse']['spanId']
+    assert span_map['middleware _greeting_mw']['parentSpanId'] == span_map['dispatch']['spanId']
+    assert span_map['handler _greet_handler']['parentSpanId'] == span_map['middleware _greeting_mw']['spanId']
+    for span in spans:
+        assert int(span['startTimeUnixNano']) <= int(span['endTimeUnixNano'])
+
+
+def test_trace_errors(tmp_path):
+    def _fail():
+        raise RuntimeError('nope')
+
+    cmd = Command(_fail, 'fail', trace=True)
+    trace_path = tmp_path / 'trace.json'
+    with pytest.raises(RuntimeError):
+        cmd.run(['fail', '--trace', str(trace_path)])
+    events = json.loads(trace_path.read_text())['traceEvents']
+    assert events[-1]['name'] == 'handler _fail'
+    assert events[-1]['args'] == {'error': 'RuntimeError'}
+
+    with pytest.raises(TypeError):
+        Command(_fail, trace='yes')
+    with pytest.raises(ValueError):
+        TraceHandler(format='xml')
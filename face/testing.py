@@ -19,6 +19,13 @@
 * Instead of isolated_filesystem, I just added chdir to run,
   because pytest already does temporary directories.
 * Removed echo_stdin (stdin never echos, as it wouldn't with subprocess)
+* Added isolation='fork', which runs each command in a forked child
+  process, capturing output through pipes. Exceptions are pickled back
+  to the parent, or summarized as a ForkedRunError when they can't be.
+* Added isolation='context', which routes the standard streams through
+  contextvars so that runs can happen concurrently from multiple
+  threads. os.environ and the working directory are still process-wide,
+  so runs which change them are serialized with a readers-writer lock.
 
 """
 
@@ -27,13 +34,30 @@ import os
 import sys
 import shlex
 import getpass
+import selectors
+import threading
+import traceback
 import contextlib
+from contextvars import ContextVar
 from subprocess import list2cmdline
 from functools import partial
 from collections.abc import Container
 
 from boltons.setutils import complement
 
+from face.helpers import _pin_winsize, _get_environ_winsize
+
+# runs see a terminal this size, so help and other output fitted to
+# the terminal doesn't depend on where the tests are run
+CHECK_WINSIZE = (24, 80)
+
+
+def _get_check_winsize(run_env):
+    # ROWS and COLUMNS set for the run take the place of a terminal
+    if run_env.get('ROWS') is not None or run_env.get('COLUMNS') is not None:
+        return _get_environ_winsize(run_env)
+    return CHECK_WINSIZE
+
 
 def _make_input_stream(input, encoding):
     if input is None:
@@ -61,6 +85,200 @@ def _fake_getpass(prompt='Password: ', stream=None):
     return line
 
 
+_RUN_STREAMS = ContextVar('face_testing_run_streams', default=None)
+
+
+class _ContextStream:
+    """Installed in place of sys.stdin/stdout/stderr while
+    context-isolated runs are active. Attribute access is routed to
+    the current context's stream (see _RUN_STREAMS), or to the stream
+    which was in place when the proxy was installed.
+    """
+    def __init__(self, index, fallback):
+        self._index = index
+        self._fallback = fallback
+
+    def _get_stream(self):
+        streams = _RUN_STREAMS.get()
+        if streams is None:
+            return self._fallback
+        return streams[self._index]
+
+    def __getattr__(self, name):
+        return getattr(self._get_stream(), name)
+
+    def __iter__(self):
+        return iter(self._get_stream())
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} stream={self._get_stream()!r}>'
+
+
+def _context_getpass(prompt='Password: ', stream=None):
+    if _RUN_STREAMS.get() is None:
+        return _ContextInstaller.orig_getpass(prompt, stream)
+    return _fake_getpass(prompt, stream)
+
+
+class _ContextInstaller:
+    "Refcounts the installation of _ContextStreams and _context_getpass"
+    lock = threading.Lock()
+    count = 0
+    orig_streams = None
+    orig_getpass = None
+
+    @classmethod
+    def acquire(cls):
+        with cls.lock:
+            if not cls.count:
+                cls.orig_streams = (sys.stdin, sys.stdout, sys.stderr)
+                cls.orig_getpass = getpass.getpass
+                sys.stdin, sys.stdout, sys.stderr = [_ContextStream(i, s) for i, s
+                                                     in enumerate(cls.orig_streams)]
+                getpass.getpass = _context_getpass
+            cls.count += 1
+
+    @classmethod
+    def release(cls):
+        with cls.lock:
+            cls.count -= 1
+            if cls.count:
+                return
+            # only restore what hasn't been replaced by someone else in the meantime
+            cur_streams = (sys.stdin, sys.stdout, sys.stderr)
+            sys.stdin, sys.stdout, sys.stderr = [orig if isinstance(cur, _ContextStream) else cur
+                                                 for cur, orig in zip(cur_streams, cls.orig_streams)]
+            if getpass.getpass is _context_getpass:
+                getpass.getpass = cls.orig_getpass
+            cls.orig_streams = cls.orig_getpass = None
+
+
+class _RunLock:
+    """A readers-writer lock coordinating CommandChecker runs. Runs which
+    only need their own streams share the lock, runs which modify
+    process-wide state (env vars, cwd, global streams) hold it
+    exclusively. Reentrant per thread, so that commands may run
+    CommandCheckers of their own.
+
+    A thread holding the lock shared may take it exclusively (as for
+    a global run nested in a context run) once other threads' shared
+    holds are released. If two threads tried that at once, each would
+    wait on the other forever, so the second raises RuntimeError.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared_count = 0
+        self._owner = None
+        self._owner_depth = 0
+        self._waiting_count = 0
+        self._upgrading = None  # thread waiting to take its shared hold exclusive
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def shared(self):
+        me = threading.get_ident()
+        depth = getattr(self._local, 'depth', 0)
+        with self._cond:
+            if self._owner != me and not depth:
+                while self._owner is not None or self._waiting_count:
+                    self._cond.wait()
+            self._shared_count += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._cond:
+                self._shared_count -= 1
+                self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        me = threading.get_ident()
+        own_shared = getattr(self._local, 'depth', 0)
+        with self._cond:
+            if self._owner != me:
+                if own_shared:
+                    if self._upgrading is not None:
+                        raise RuntimeError('deadlock avoided: a run which needs exclusive access'
+                                           ' (isolation=\'global\', env, or chdir) was nested in a'
+                                           ' context-isolated run, while another thread'
+                                           ' was already doing the same')
+                    self._upgrading = me
+                self._waiting_count += 1
+                try:
+                    while self._owner is not None or self._shared_count > own_shared:
+                        self._cond.wait()
+                finally:
+                    self._waiting_count -= 1
+                    if own_shared:
+                        self._upgrading = None
+                self._owner = me
+            self._owner_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._owner_depth -= 1
+                if not self._owner_depth:
+                    self._owner = None
+                self._cond.notify_all()
+
+
+_RUN_LOCK = _RunLock()
+
+
+class ForkedRunError(Exception):
+    """Stands in for exceptions raised by commands run with
+    ``isolation='fork'`` which could not be pickled back to the parent
+    process. Also used when the child process exits abnormally.
+
+    Attributes:
+       type_name (str): The qualified name of the original exception type.
+       message (str): The string form of the original exception.
+       traceback_text (str): The formatted traceback, as the child saw it.
+    """
+    def __init__(self, type_name, message, traceback_text=''):
+        super().__init__(type_name, message, traceback_text)
+        self.type_name = type_name
+        self.message = message
+        self.traceback_text = traceback_text
+
+    def __str__(self):
+        return f'{self.type_name}: {self.message}'
+
+
+def _summarize_exc_info(exc_info):
+    "Returns a picklable (exc_type, exc_value, None) for sending across processes"
+    import pickle
+    exc_type, exc_value, exc_tb = exc_info
+    try:
+        pickled = pickle.dumps(exc_value)
+        pickle.loads(pickled)  # some exceptions only fail on the way back in
+        return pickled
+    except Exception:
+        pass
+    type_name = f'{exc_type.__module__}.{exc_type.__qualname__}'
+    tb_text = ''.join(traceback.format_exception(exc_type, exc_value, exc_tb))
+    return pickle.dumps(ForkedRunError(type_name, str(exc_value), tb_text))
+
+
+def _read_pipes(fds):
+    "Read all of *fds* until EOF, concurrently, so that no pipe fills up."
+    chunks = {fd: [] for fd in fds}
+    with selectors.DefaultSelector() as sel:
+        for fd in fds:
+            sel.register(fd, selectors.EVENT_READ)
+        while sel.get_map():
+            for key, _ in sel.select():
+                data = os.read(key.fd, 65536)
+                if data:
+                    chunks[key.fd].append(data)
+                else:
+                    sel.unregister(key.fd)
+    return [b''.join(chunks[fd]) for fd in fds]
+
+
 class RunResult:
     """Returned from :meth:`CommandChecker.run()`, complete with the
     relevant inputs and outputs of the run.
@@ -199,40 +417,117 @@ class CommandChecker:
        reraise (bool): Reraise uncaught exceptions from within *cmd*'s
          endpoint functions, instead of returning a :class:`RunResult`
          instance. Defaults to ``False``.
-
+       isolation (str): How runs are isolated from one another. The
+         default, ``'global'``, swaps out process-wide state like
+         :data:`sys.stdout` for the duration of the run. Set to
+         ``'context'`` to route the standard streams per-thread with
+         :mod:`contextvars`, enabling concurrent runs from multiple
+         threads. Context-isolated runs which set *env* or *chdir*
+         still hold process-wide state, and so run one at a time. Set
+         to ``'fork'`` to run each command in a child process forked
+         from the current one, for isolation from state leaked by
+         commands (module-level caches, signal handlers, etc.) at
+         lower cost than starting a new interpreter. Only available on
+         platforms with :func:`os.fork`.
+
+    With ``isolation='fork'``, exceptions are pickled back to the
+    parent process without their traceback. Exceptions which cannot be
+    pickled are replaced by a :exc:`ForkedRunError` with the
+    original's type name, message, and formatted traceback. Imports
+    and other setup done before the run (such as calling
+    :meth:`Command.prepare()`) are inherited by each child, so it pays
+    to warm up the parent process.
+
+    Commands are run as if on a terminal :data:`CHECK_WINSIZE` (24
+    rows by 80 columns) in size, so that help text and other output
+    fitted to the terminal is the same wherever tests are run. Set
+    ``ROWS`` and ``COLUMNS`` in *env* to run at another size.
     """
-    def __init__(self, cmd, env=None, chdir=None, mix_stderr=False, reraise=False):
+    def __init__(self, cmd, env=None, chdir=None, mix_stderr=False, reraise=False,
+                 isolation='global'):
         self.cmd = cmd
         self.base_env = env or {}
         self.reraise = reraise
         self.mix_stderr = mix_stderr
         self.encoding = 'utf8'  # not clear if this should be an arg yet
         self.chdir = chdir
+        if isolation not in ('global', 'context', 'fork'):
+            raise ValueError("expected isolation to be one of 'global', 'context',"
+                             " or 'fork', not: %r" % (isolation,))
+        if isolation == 'fork' and not hasattr(os, 'fork'):
+            raise ValueError("isolation='fork' is not supported on this platform")
+        self.isolation = isolation
+
+    def _make_streams(self, input):
+        tmp_stdin = _make_input_stream(input, self.encoding)
+        tmp_stdin = io.TextIOWrapper(tmp_stdin, encoding=self.encoding)
+
+        bytes_output = io.BytesIO()
+        tmp_stdout = io.TextIOWrapper(bytes_output, encoding=self.encoding)
+        if self.mix_stderr:
+            bytes_error, tmp_stderr = None, tmp_stdout
+        else:
+            bytes_error = io.BytesIO()
+            tmp_stderr = io.TextIOWrapper(bytes_error, encoding=self.encoding)
+        return (tmp_stdin, tmp_stdout, tmp_stderr), (bytes_output, bytes_error)
+
+    @contextlib.contextmanager
+    def _isolate_context(self, input=None, env=None, chdir=None):
+        chdir = chdir or self.chdir
+        streams, byte_outputs = self._make_streams(input)
+        tmp_stdin, tmp_stdout, tmp_stderr = streams
+
+        # env and cwd are process-wide, fall back to holding the lock exclusively
+        if env or self.base_env or chdir:
+            lock_ctx = _RUN_LOCK.exclusive()
+        else:
+            lock_ctx = _RUN_LOCK.shared()
+
+        with lock_ctx:
+            _ContextInstaller.acquire()
+            old_cwd = os.getcwd() if chdir else None
+            old_env = {}
+            token = _RUN_STREAMS.set(streams)
+            try:
+                _sync_env(os.environ, dict(self.base_env, **(env or {})), old_env)
+                if chdir:
+                    os.chdir(str(chdir))
+                yield byte_outputs
+            finally:
+                if chdir:
+                    os.chdir(old_cwd)
+                _sync_env(os.environ, old_env)
+                tmp_stdout.flush()
+                tmp_stderr.flush()
+                _RUN_STREAMS.reset(token)
+                _ContextInstaller.release()
+        return
 
     @contextlib.contextmanager
     def _isolate(self, input=None, env=None, chdir=None):
+        if self.isolation == 'context':
+            with self._isolate_context(input=input, env=env, chdir=chdir) as byte_outputs:
+                yield byte_outputs
+            return
+        with _RUN_LOCK.exclusive():
+            with self._isolate_global(input=input, env=env, chdir=chdir) as byte_outputs:
+                yield byte_outputs
+        return
+
+    @contextlib.contextmanager
+    def _isolate_global(self, input=None, env=None, chdir=None):
         old_cwd = os.getcwd()
         old_stdin, old_stdout, old_stderr = sys.stdin, sys.stdout, sys.stderr
         old_getpass = getpass.getpass
 
-        tmp_stdin = _make_input_stream(input, self.encoding)
-
         full_env = dict(self.base_env)
 
         chdir = chdir or self.chdir
         if env:
             full_env.update(env)
 
-        bytes_output = io.BytesIO()
-        tmp_stdin = io.TextIOWrapper(tmp_stdin, encoding=self.encoding)
-        tmp_stdout = io.TextIOWrapper(
-            bytes_output, encoding=self.encoding)
-        if self.mix_stderr:
-            tmp_stderr = tmp_stdout
-        else:
-            bytes_error = io.BytesIO()
-            tmp_stderr = io.TextIOWrapper(
-                bytes_error, encoding=self.encoding)
+        streams, byte_outputs = self._make_streams(input)
+        tmp_stdin, tmp_stdout, tmp_stderr = streams
 
         old_env = {}
         try:
@@ -242,7 +537,7 @@ class CommandChecker:
             sys.stdin, sys.stdout, sys.stderr = tmp_stdin, tmp_stdout, tmp_stderr
             getpass.getpass = _fake_getpass
 
-            yield (bytes_output, bytes_error if not self.mix_stderr else None)
+            yield byte_outputs
         finally:
             if chdir:
                 os.chdir(old_cwd)
@@ -307,8 +602,10 @@ class CommandChecker:
 
         .. note::
 
-           At this time, :meth:`run` interacts with global process
-           state, and is not designed for parallel usage.
+           By default, :meth:`run` interacts with global process
+           state, and is not designed for parallel usage. See the
+           *isolation* argument of :class:`CommandChecker` for running
+           commands concurrently from multiple threads.
 
         """
         if isinstance(input, (list, tuple)):
@@ -323,28 +620,20 @@ class CommandChecker:
                             ' exit_codes, not: %r' % (exit_code,))
         else:
             exit_codes = exit_code
-        with self._isolate(input=input, env=env, chdir=chdir) as (stdout, stderr):
-            exc_info = None
-            exit_code = 0
-
-            if isinstance(args, str):
-                args = shlex.split(args)
+        if isinstance(args, str):
+            args = shlex.split(args)
 
-            try:
-                res = self.cmd.run(args or ())
-            except SystemExit as se:
-                exc_info = sys.exc_info()
-                exit_code = se.code if se.code is not None else 0
-            except Exception:
-                if self.reraise:
-                    raise
-                exit_code = -1  # TODO: something better?
-                exc_info = sys.exc_info()
-            finally:
-                sys.stdout.flush()
-                sys.stderr.flush()
-                stdout_bytes = stdout.getvalue()
-                stderr_bytes = stderr.getvalue() if not self.mix_stderr else None
+        if self.isolation == 'fork':
+            exit_code, exc_info, stdout_bytes, stderr_bytes = self._run_forked(args, input, env, chdir)
+        else:
+            with self._isolate(input=input, env=env, chdir=chdir) as (stdout, stderr):
+                try:
+                    exit_code, exc_info = self._run_cmd(args, env=env, reraise=self.reraise)
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    stdout_bytes = stdout.getvalue()
+                    stderr_bytes = stderr.getvalue() if not self.mix_stderr else None
 
         run_res = RunResult(checker=self,
                             args=args,
@@ -359,6 +648,104 @@ class CommandChecker:
         return run_res
 
 
+    def _run_cmd(self, args, env=None, reraise=False):
+        exc_info = None
+        exit_code = 0
+        winsize = _get_check_winsize(dict(self.base_env, **(env or {})))
+        try:
+            # only context-isolated runs need a context variable
+            with _pin_winsize(winsize, per_context=self.isolation == 'context'):
+                self.cmd.run(args or ())
+        except SystemExit as se:
+            exc_info = sys.exc_info()
+            exit_code = se.code if se.code is not None else 0
+        except Exception:
+            if reraise:
+                raise
+            exit_code = -1  # TODO: something better?
+            exc_info = sys.exc_info()
+        return exit_code, exc_info
+
+    def _run_forked(self, args, input, env, chdir):
+        import pickle  # only needed for isolation='fork'
+        input_bytes = _make_input_stream(input, self.encoding).getvalue()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe() if not self.mix_stderr else (None, None)
+        res_r, res_w = os.pipe()
+
+        # don't let the child inherit (and later duplicate) buffered output
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover (coverage doesn't follow the fork)
+            try:
+                for fd in (out_r, err_r, res_r):
+                    if fd is not None:
+                        os.close(fd)
+                self._run_child(args, input_bytes, env, chdir,
+                                out_w, err_w if err_w is not None else out_w, res_w)
+            finally:
+                os._exit(70)  # never return into the parent's stack
+
+        for fd in (out_w, err_w, res_w):
+            if fd is not None:
+                os.close(fd)
+        read_fds = [fd for fd in (out_r, err_r, res_r) if fd is not None]
+        try:
+            outputs = _read_pipes(read_fds)
+        finally:
+            for fd in read_fds:
+                os.close(fd)
+            _, status = os.waitpid(pid, 0)
+        stdout_bytes, res_bytes = outputs[0], outputs[-1]
+        stderr_bytes = outputs[1] if err_r is not None else None
+
+        if res_bytes:
+            exit_code, exc_bytes = pickle.loads(res_bytes)
+            exc_info = None
+            if exc_bytes is not None:
+                exc_value = pickle.loads(exc_bytes)
+                exc_info = (type(exc_value), exc_value, None)
+        else:
+            if os.WIFSIGNALED(status):
+                exit_code = -os.WTERMSIG(status)
+                msg = f'child process killed by signal {os.WTERMSIG(status)}'
+            else:
+                exit_code = os.WEXITSTATUS(status)
+                msg = f'child process exited with status {exit_code} before reporting a result'
+            exc_value = ForkedRunError('ChildProcessError', msg)
+            exc_info = (ForkedRunError, exc_value, None)
+
+        if self.reraise and exc_info and not issubclass(exc_info[0], SystemExit):
+            raise exc_info[1]
+        return exit_code, exc_info, stdout_bytes, stderr_bytes
+
+    def _run_child(self, args, input_bytes, env, chdir, out_fd, err_fd, res_fd):  # pragma: no cover
+        import pickle
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        sys.stdin = io.TextIOWrapper(io.BytesIO(input_bytes), encoding=self.encoding)
+        sys.stdout = open(1, 'w', encoding=self.encoding, closefd=False)
+        sys.stderr = sys.stdout if self.mix_stderr else open(2, 'w', encoding=self.encoding, closefd=False)
+        getpass.getpass = _fake_getpass
+        _sync_env(os.environ, dict(self.base_env, **(env or {})))
+        chdir = chdir or self.chdir
+        if chdir:
+            os.chdir(str(chdir))
+
+        exit_code, exc_info = -1, None
+        try:
+            exit_code, exc_info = self._run_cmd(args, env=env)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            exc_bytes = _summarize_exc_info(exc_info) if exc_info else None
+            res_bytes = pickle.dumps((exit_code, exc_bytes))
+            with open(res_fd, 'wb') as res_f:
+                res_f.write(res_bytes)
+        os._exit(0)
+
+
 # syncing os.environ (as opposed to modifying a copy and setting it
 # back) takes care of cases when someone has a reference to environ
 def _sync_env(env, new, backup=None):
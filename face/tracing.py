@@ -0,0 +1,229 @@
+"""Built-in trace spans for face Commands.
+
+Profiles show where time goes in aggregate; traces show when. A
+:class:`Command` created with ``trace=True`` gets a hidden ``--trace
+PATH`` flag, which records nested spans for the run, and writes them
+to *PATH* as JSON:
+
+  * ``run``, around the whole of :meth:`Command.run()`
+  * ``parse``, around argument parsing, with a ``flag <name>`` span
+    for each flag value converted, and a ``flagfile <path>`` span for
+    each flagfile loaded
+  * ``prepare``, around compiling the middleware chain, if needed
+  * ``dispatch``, around the whole middleware chain, with a
+    ``middleware <name>`` span for each middleware in the chain
+  * ``handler <name>``, for the subcommand's handler function
+
+By default, the file is in Chrome's `trace event format`_, which can
+be opened in ``chrome://tracing`` or `Perfetto`_. Pass
+``TraceHandler(format='otlp')`` instead to write OpenTelemetry's
+`OTLP JSON`_ encoding, for loading into other tracing tools. Either
+way, no collector or extra dependencies are needed.
+
+Spans are only recorded for runs with the flag set. Middleware and
+handler spans come from a separately compiled middleware chain, so the
+chain used by untraced runs is unchanged.
+
+.. _trace event format: https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+.. _Perfetto: https://ui.perfetto.dev
+.. _OTLP JSON: https://opentelemetry.io/docs/specs/otlp/#json-protobuf-encoding
+"""
+
+import os
+import json
+import time
+import threading
+from functools import partial
+
+from face.parser import Flag, prescan_flag, _ACTIVE_TRACER
+from face.sinter import get_fb
+from face.utils import echo
+
+
+DEFAULT_TRACE_FLAG = Flag('--trace', parse_as=str, display=False,
+                          doc='trace this run, writing spans as JSON to the given path')
+FORMATS = ('chrome', 'otlp')
+
+_OTLP_SPAN_KIND_INTERNAL = 1
+
+
+def get_active_tracer():
+    "Returns the :class:`Tracer` of the traced run in progress, if any."
+    return _ACTIVE_TRACER.get()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'attrs', 'span_id', 'parent_id', 'start_ns', 'end_ns')
+
+    def __init__(self, tracer, name, cat, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.attrs = attrs
+        self.span_id = self.parent_id = None
+        self.start_ns = self.end_ns = None
+
+    def __enter__(self):
+        tracer = self.tracer
+        self.span_id = len(tracer.spans) + 1
+        self.parent_id = tracer._stack[-1].span_id if tracer._stack else None
+        tracer.spans.append(self)
+        tracer._stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.end_ns = time.perf_counter_ns()
+        self.tracer._stack.pop()
+        if exc_type is not None:
+            self.attrs = dict(self.attrs or {}, error=exc_type.__name__)
+        return False
+
+
+class Tracer:
+    """Records nested spans of a single run, and writes them to *path*
+    in the trace *format*, ``'chrome'`` or ``'otlp'``.
+    """
+    # whether to run the chain with a span for each middleware
+    trace_chain = True
+
+    def __init__(self, path, format='chrome', name='face'):
+        if format not in FORMATS:
+            raise ValueError(f'expected format to be one of {FORMATS!r}, not: {format!r}')
+        self.path = path
+        self.format = format
+        self.name = name
+        self.spans = []
+        self._stack = []
+        # for converting perf_counter_ns to wall-clock nanoseconds
+        self._epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name, cat, attrs=None):
+        """Returns a context manager which records a span named *name*,
+        in category *cat* (e.g., ``'parse'``), with an optional dict of
+        *attrs*. Spans started inside the block are its children.
+        """
+        return _Span(self, name, cat, attrs)
+
+    def run(self, func, *a, **kw):
+        token = _ACTIVE_TRACER.set(self)
+        try:
+            with self.span('run', 'command', {'command': self.name}):
+                return func(*a, **kw)
+        finally:
+            _ACTIVE_TRACER.reset(token)
+            try:
+                with open(self.path, 'w') as f:
+                    json.dump(self.to_dict(), f)
+            except OSError as ose:
+                echo.err(f'warning: failed to write trace to {self.path!r}: {ose}')
+
+    def to_dict(self):
+        "Returns the recorded spans as a JSON-serializable dict."
+        if self.format == 'otlp':
+            return self._to_otlp()
+        return self._to_chrome()
+
+    def _to_chrome(self):
+        pid, tid = os.getpid(), threading.get_ident()
+        events = []
+        for span in self.spans:
+            event = {'name': span.name, 'cat': span.cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': (span.start_ns + self._epoch_offset_ns) / 1000,
+                     'dur': (span.end_ns - span.start_ns) / 1000}
+            if span.attrs:
+                event['args'] = span.attrs
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def _to_otlp(self):
+        trace_id = os.urandom(16).hex()
+        id_prefix = os.urandom(4).hex()
+
+        def _span_id(span_id):
+            return f'{id_prefix}{span_id:08x}'
+
+        def _attrs(attrs):
+            return [{'key': k, 'value': {'stringValue': str(v)}} for k, v in attrs.items()]
+
+        spans = []
+        for span in self.spans:
+            otlp_span = {'traceId': trace_id,
+                         'spanId': _span_id(span.span_id),
+                         'name': span.name,
+                         'kind': _OTLP_SPAN_KIND_INTERNAL,
+                         'startTimeUnixNano': str(span.start_ns + self._epoch_offset_ns),
+                         'endTimeUnixNano': str(span.end_ns + self._epoch_offset_ns),
+                         'attributes': _attrs(dict(span.attrs or {}, **{'face.category': span.cat}))}
+            if span.parent_id is not None:
+                otlp_span['parentSpanId'] = _span_id(span.parent_id)
+            spans.append(otlp_span)
+        resource = {'attributes': _attrs({'service.name': self.name})}
+        return {'resourceSpans': [{'resource': resource,
+                                   'scopeSpans': [{'scope': {'name': 'face'}, 'spans': spans}]}]}
+
+    def __repr__(self):
+        cn = self.__class__.__name__
+        return f'<{cn} path={self.path!r} format={self.format!r} span_count={len(self.spans)}>'
+
+
+class SpanWrapper:
+    """Wraps a middleware or handler in the middleware chain of a
+    traced run, recording a span around each call. Shares the wrapped
+    function's signature (see sinter.get_fb), so it can be called
+    exactly as the function would.
+    """
+    def __init__(self, func, name, cat):
+        self.func = func
+        self.name = name
+        self.cat = cat
+        self._sinter_fb = get_fb(func)
+
+    def __call__(self, **kwargs):
+        __traceback_hide__ = True
+        tracer = _ACTIVE_TRACER.get()
+        if tracer is None:
+            return self.func(**kwargs)
+        with tracer.span(self.name, self.cat):
+            return self.func(**kwargs)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} name={self.name!r} func={self.func!r}>'
+
+
+class TraceHandler:
+    """Adds opt-in tracing to a :class:`Command`, via a hidden flag.
+    Pass ``trace=True`` to the :class:`Command` constructor to use the
+    defaults, or pass an instance of this type to customize.
+
+    Args:
+       flag (face.Flag): The flag which enables tracing, taking the
+          path of the trace file to write. Defaults to a hidden
+          ``--trace`` flag.
+       format (str): ``'chrome'`` (the default) for Chrome's trace
+          event format, or ``'otlp'`` for OpenTelemetry's OTLP JSON.
+    """
+    def __init__(self, flag=DEFAULT_TRACE_FLAG, format='chrome'):
+        if not isinstance(flag, Flag):
+            raise TypeError(f'expected Flag instance, not: {flag!r}')
+        if format not in FORMATS:
+            raise ValueError(f'expected format to be one of {FORMATS!r}, not: {format!r}')
+        self.flag = flag
+        self.format = format
+
+    @property
+    def flags(self):
+        return [self.flag]
+
+    def get_tracer(self, argv, name='face'):
+        """Returns a :class:`Tracer` if *argv* enables tracing, otherwise
+        ``None``. Tracers have a ``run(func, *a, **kw)`` method."""
+        path = prescan_flag(argv, self.flag)
+        if path:
+            return Tracer(path, format=self.format, name=name)
+        return None
+
+    def wrap_run(self, argv, cmd, run):
+        "Returns *run*, traced if *argv* enables tracing."
+        tracer = self.get_tracer(argv, name=cmd.name)
+        return run if tracer is None else partial(tracer.run, run)
@@ -7,6 +7,8 @@ import getpass
 import keyword
 import textwrap
 import typing
+from functools import lru_cache
+from contextvars import ContextVar
 
 from boltons.strutils import pluralize, strip_ansi
 from boltons.iterutils import split, unique
@@ -14,6 +16,12 @@ from boltons.typeutils import make_sentinel
 
 import face
 
+# the face.progress.Progress drawing a status line in this context, if
+# any. a context variable, like face.parser._ACTIVE_TRACER, so that
+# concurrent runs (as with CommandChecker's isolation='context') each
+# clear only their own status line
+_ACTIVE_PROGRESS = ContextVar('face_active_progress', default=None)
+
 raw_input = input
 
 ERROR = make_sentinel('ERROR')  # used for parse_as=ERROR
@@ -157,12 +165,16 @@ def format_flag_post_doc(flag):
     "The default positional argument label formatter, used in help formatting"
     if flag.display.post_doc is not None:
         return flag.display.post_doc
+    env_doc = f'env ${flag.env}' if getattr(flag, 'env', None) else ''
     if flag.missing is face.ERROR:
-        return '(required)'
-    if flag.missing is None or repr(flag.missing) == object.__repr__(flag.missing):
+        doc = 'required'
+    elif flag.missing is None or repr(flag.missing) == object.__repr__(flag.missing):
         # avoid displaying unhelpful defaults
-        return ''
-    return f'(defaults to {flag.missing!r})'
+        doc = ''
+    else:
+        doc = f'defaults to {flag.missing!r}'
+    doc = ', '.join([d for d in (doc, env_doc) if d])
+    return f'({doc})' if doc else ''
 
 
 def get_type_desc(parse_as):
@@ -173,6 +185,9 @@ def get_type_desc(parse_as):
         return 'as', FRIENDLY_TYPE_NAMES[parse_as]
     except KeyError:
         pass
+    display_name = getattr(parse_as, 'display_name', None)
+    if display_name:
+        return 'as', display_name
     try:
         # return the type name if it looks like a type
         return 'as', parse_as.__name__
@@ -254,7 +269,12 @@ def get_minimal_executable(executable=None, path=None, environ=None):
     path = environ.get('PATH', '') if path is None else path
     if isinstance(path, str):
         path = path.split(':')
+    return _get_minimal_executable(executable, tuple(path))
 
+
+@lru_cache(maxsize=32)
+def _get_minimal_executable(executable, path):
+    # memoized, as the result is stable for a given executable and PATH
     executable_basename = os.path.basename(executable)
     for p in path:
         if os.path.relpath(executable, p) == executable_basename:
@@ -327,12 +347,21 @@ def echo(msg: str | bytes | object, *,
     if indent:
         msg = textwrap.indent(msg, prefix=indent)
 
-    if msg:
-        if not enable_color:
-            msg = strip_ansi(msg)
-        _file.write(msg)
-
-    _file.flush()
+    if msg and not enable_color:
+        msg = strip_ansi(msg)
+
+    progress = _ACTIVE_PROGRESS.get()
+    if progress is None:
+        if msg:
+            _file.write(msg)
+        _file.flush()
+    else:
+        # clear any progress line first, it's redrawn on the next tick
+        with progress._lock:
+            progress.clear()
+            if msg:
+                _file.write(msg)
+            _file.flush()
 
     return
 
@@ -25,6 +25,7 @@ setup(name='face',
       license=__license__,
       platforms='any',
       install_requires=['boltons>=20.0.0'],
+      extras_require={'toml': ['tomli; python_version < "3.11"']},
       classifiers=[
           'Topic :: Utilities',
           'Intended Audience :: Developers',